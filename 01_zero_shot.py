@@ -1,24 +1,11 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-load_dotenv()
+from llm_client import create_response
+from instrumentation import traced
+from classifier_cascade import ClassifierCascade
 
-client = OpenAI()
+INQUIRY_CATEGORIES = ["Order Status", "Product Question", "Technical Support", "Complaint", "Return/Refund"]
 
-def zero_shot_example():
-    """
-    Example: Customer inquiry classification without any examples
-
-    📖 STORY CONTEXT - Day 3 (Feb 13, 2026):
-    Aditya Patel placed order #SM-2026-12345 on Feb 10. Today (3 days later),
-    he hasn't received shipping confirmation and is getting worried.
-    """
-
-    # Customer inquiry
-    customer_message = """
-    Hi, I'm Aditya Patel. I ordered a gaming laptop, mouse, and keyboard
-    3 days ago but haven't received any shipping confirmation yet.
-    My order number is #SM-2026-12345. Can you help me find out the status?
-    """
+def inquiry_request(customer_message):
+    """Zero-shot classification request for one inquiry"""
 
     # Zero-shot prompt - no examples provided
     prompt = f"""
@@ -34,28 +21,59 @@ def zero_shot_example():
     Classification:
     """
 
-    response = client.responses.create(
+    return dict(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.3  # Lower temperature for consistent classification
     )
 
-    print("Zero-Shot Classification:")
-    print(response.output_text)
-    print("\n" + "="*50 + "\n")
+def llm_inquiry_category(customer_message):
+    """(first of INQUIRY_CATEGORIES named in the model's answer or None, the answer)"""
+    answer = create_response(**inquiry_request(customer_message)).output_text
+    lowered = answer.lower()
+    found = [(lowered.find(name.lower()), name) for name in INQUIRY_CATEGORIES if name.lower() in lowered]
+    return (min(found)[1] if found else None), answer
 
-# Example 2: Sentiment Analysis
-def zero_shot_sentiment():
+_inquiry_cascade = None
+
+def inquiry_cascade():
+    """Cascade for zero_shot_example, created on first use (see classifier_cascade.py)"""
+    global _inquiry_cascade
+    if _inquiry_cascade is None:
+        _inquiry_cascade = ClassifierCascade("zero_shot_inquiry", INQUIRY_CATEGORIES, llm_inquiry_category,
+                                             threshold=0.9)
+    return _inquiry_cascade
+
+@traced()
+def zero_shot_example():
     """
-    Sentiment analysis without examples
+    Example: Customer inquiry classification without any examples
 
-    📖 STORY CONTEXT - Day 3 (continued):
-    Aditya is worried but remaining polite in his inquiry.
-    Analyze his sentiment to prioritize the response.
+    📖 STORY CONTEXT - Day 3 (Feb 13, 2026):
+    Aditya Patel placed order #SM-2026-12345 on Feb 10. Today (3 days later),
+    he hasn't received shipping confirmation and is getting worried.
     """
 
-    review = """I ordered 3 days ago and haven't heard anything about shipping.
-    Starting to get concerned but hoping everything is okay with my order #SM-2026-12345."""
+    # Customer inquiry
+    customer_message = """
+    Hi, I'm Aditya Patel. I ordered a gaming laptop, mouse, and keyboard
+    3 days ago but haven't received any shipping confirmation yet.
+    My order number is #SM-2026-12345. Can you help me find out the status?
+    """
+
+    # Confident inquiries are classified locally, the rest by the model
+    result = inquiry_cascade().classify(customer_message)
+
+    print("Zero-Shot Classification:")
+    if result["source"] == "llm":
+        print(result["answer"])
+    else:
+        print(f"{result['label']} (answered by the local classifier)")
+    print("\n" + "="*50 + "\n")
+
+# Example 2: Sentiment Analysis
+def sentiment_request(review):
+    """Request for one review (also used by batch_jobs.py for bulk runs)"""
 
     prompt = f"""
     Analyze the sentiment of this customer message and classify it as:
@@ -66,12 +84,27 @@ def zero_shot_sentiment():
     Sentiment:
     """
 
-    response = client.responses.create(
+    return dict(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.2
     )
 
+@traced()
+def zero_shot_sentiment():
+    """
+    Sentiment analysis without examples
+
+    📖 STORY CONTEXT - Day 3 (continued):
+    Aditya is worried but remaining polite in his inquiry.
+    Analyze his sentiment to prioritize the response.
+    """
+
+    review = """I ordered 3 days ago and haven't heard anything about shipping.
+    Starting to get concerned but hoping everything is okay with my order #SM-2026-12345."""
+
+    response = create_response(**sentiment_request(review))
+
     print("Zero-Shot Sentiment Analysis:")
     print(response.output_text)
 
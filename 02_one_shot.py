@@ -1,9 +1,7 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-load_dotenv()
-
-client = OpenAI()
+from llm_client import create_response
+from instrumentation import traced
 
+@traced()
 def one_shot_example():
     """
     Example: Email response generation with one example
@@ -45,7 +43,7 @@ def one_shot_example():
     Response:
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.7
@@ -56,6 +54,7 @@ def one_shot_example():
     print("\n" + "="*50 + "\n")
 
 # Example 2: JSON formatting
+@traced()
 def one_shot_json_format():
     """
     Extract customer data in specific JSON format with one example
@@ -91,7 +90,7 @@ def one_shot_json_format():
     JSON:
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.2
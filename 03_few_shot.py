@@ -1,10 +1,118 @@
-from openai import OpenAI
-from dotenv import load_dotenv
+import json
+import os
+from llm_client import create_response
+from instrumentation import traced
+from example_store import ExampleStore
+from prompt_templates import PromptTemplate
+
+# Example banks: each prompt gets the examples most similar to its message
+# (see example_store.py) instead of all of them. Set FEW_SHOT_EXAMPLES to a
+# directory with <bank>.jsonl files to add curated examples to a bank.
+CLASSIFICATION_EXAMPLES = [
+    {"inquiry": "My credit card was charged twice for order #111", "category": "Billing Issue",
+     "priority": "HIGH", "reason": "Financial impact, requires immediate attention"},
+    {"inquiry": "What are the dimensions of the wireless mouse?", "category": "Product Question",
+     "priority": "LOW", "reason": "General information request, no urgency"},
+    {"inquiry": "My laptop won't turn on after the update", "category": "Technical Support",
+     "priority": "HIGH", "reason": "Product unusable, immediate assistance needed"},
+    {"inquiry": "Do you ship to Canada?", "category": "Shipping Question",
+     "priority": "LOW", "reason": "Pre-purchase inquiry, not time-sensitive"},
+]
+
+RESPONSE_EXAMPLES = [
+    {"type": "Apology for delay", "input": "My order is late",
+     "output": "We sincerely apologize for the delay in your order delivery. This isn't the experience we want for you. I'm personally looking into this and will ensure expedited shipping at no extra cost. ETA: 24 hours. Thank you for your patience."},
+    {"type": "Product issue resolution", "input": "The item is damaged",
+     "output": "I'm truly sorry your item arrived damaged. That's completely unacceptable. Here's what I'll do: (1) Send a replacement via express shipping today, (2) You keep the damaged item - no return needed, (3) Apply a 15% discount to your account. You should receive your replacement within 2 days."},
+    {"type": "Feature request", "input": "Can you add dark mode?",
+     "output": "Thank you for this excellent suggestion! Dark mode is definitely on our radar. I've forwarded your request to our product team with a +1. While I can't promise a timeline, we do prioritize features based on customer feedback. I'll add you to our update list!"},
+]
+
+EXTRACTION_EXAMPLES = [
+    {"feedback": "Great laptop! Fast delivery. But the charger cable is too short.",
+     "extraction": {"product": "laptop", "positive_aspects": ["performance", "fast delivery"],
+                    "negative_aspects": ["charger cable length"], "overall_sentiment": "positive",
+                    "action_required": "review charger cable design"}},
+    {"feedback": "Mouse is okay, nothing special. Arrived a week late and packaging was damaged.",
+     "extraction": {"product": "mouse", "positive_aspects": [],
+                    "negative_aspects": ["late delivery", "damaged packaging"], "overall_sentiment": "neutral",
+                    "action_required": "investigate shipping partner"}},
+    {"feedback": "Keyboard is fantastic! Love the mechanical switches. RGB lighting is stunning!",
+     "extraction": {"product": "keyboard", "positive_aspects": ["mechanical switches", "RGB lighting"],
+                    "negative_aspects": [], "overall_sentiment": "very positive", "action_required": "none"}},
+]
+
+def load_examples(bank, examples):
+    """Built-in examples plus the ones in $FEW_SHOT_EXAMPLES/<bank>.jsonl"""
+    directory = os.getenv("FEW_SHOT_EXAMPLES")
+    path = os.path.join(directory, f"{bank}.jsonl") if directory else None
+    if path is None or not os.path.exists(path):
+        return list(examples)
+    with open(path, encoding="utf-8") as f:
+        return list(examples) + [json.loads(line) for line in f if line.strip()]
+
+classification_examples = ExampleStore(
+    load_examples("classification", CLASSIFICATION_EXAMPLES), key="inquiry",
+    render=lambda e: f'Inquiry: "{e["inquiry"]}"\nCategory: {e["category"]}\nPriority: {e["priority"]}\nReason: {e["reason"]}',
+)
+response_examples = ExampleStore(
+    load_examples("response_generation", RESPONSE_EXAMPLES), key="input",
+    render=lambda e: f'Type: {e["type"]}\nInput: "{e["input"]}"\nOutput: "{e["output"]}"',
+)
+extraction_examples = ExampleStore(
+    load_examples("data_extraction", EXTRACTION_EXAMPLES), key="feedback",
+    render=lambda e: f'Feedback: "{e["feedback"]}"\n{json.dumps(e["extraction"], indent=4)}',
+)
+
+EXAMPLES_PER_PROMPT = 4
+EXAMPLE_TOKEN_BUDGET = 600
+
+# Static instructions first, then the per-message parts (see prompt_templates.py).
+# The selected examples differ between messages, so they belong to the variable
+# part: only the instructions are shared across calls, and they are below the
+# 1,024-token prompt cache minimum. Pin a fixed example set into the prefix
+# instead when the prompt cache matters more than relevance.
+CLASSIFICATION_PROMPT = PromptTemplate("few_shot_classification", prefix="""
+    Classify customer inquiries by category and priority level.
+    """, suffix="""
+    Examples:
+
+    {examples}
+
+    ---
+
+    Now classify this inquiry:
+    Inquiry: {message}
+    Category:
+    Priority:
+    Reason:
+    """)
 
-load_dotenv()
+RESPONSE_PROMPT = PromptTemplate("few_shot_response_generation", prefix="""
+    Generate customer service responses following these examples:
+    """, suffix="""
+    {examples}
 
-client = OpenAI()
+    ---
+
+    Now generate a response:
+    Type: Product defect acknowledgment
+    Input: {message}
+    Output:
+    """)
+
+EXTRACTION_PROMPT = PromptTemplate("few_shot_data_extraction", prefix="""
+    Extract customer feedback data in structured format.
+    """, suffix="""
+    {examples}
 
+    ---
+
+    Now extract from this feedback:
+    Feedback: {message}
+    """)
+
+@traced()
 def few_shot_classification():
     """
     Example: Multi-category classification with priority levels
@@ -12,6 +120,9 @@ def few_shot_classification():
     📖 STORY CONTEXT - Day 6 (Feb 16, 2026):
     Aditya has been testing his new equipment. He discovered that both wireless
     mice have button clicking issues. He reaches out to report the problem.
+
+    The examples are the ones from classification_examples closest to the
+    inquiry, within EXAMPLE_TOKEN_BUDGET tokens.
     """
 
      # Customer inquiry
@@ -21,43 +132,12 @@ def few_shot_classification():
     The laptop and keyboard work perfectly though.
     """
 
-    prompt = f"""
-    Classify customer inquiries by category and priority level.
-
-    Examples:
-
-    Inquiry: "My credit card was charged twice for order #111"
-    Category: Billing Issue
-    Priority: HIGH
-    Reason: Financial impact, requires immediate attention
+    examples = "\n\n".join(classification_examples.render(example) for example in classification_examples.select(
+        customer_message, k=EXAMPLES_PER_PROMPT, token_budget=EXAMPLE_TOKEN_BUDGET))
 
-    Inquiry: "What are the dimensions of the wireless mouse?"
-    Category: Product Question
-    Priority: LOW
-    Reason: General information request, no urgency
-
-    Inquiry: "My laptop won't turn on after the update"
-    Category: Technical Support
-    Priority: HIGH
-    Reason: Product unusable, immediate assistance needed
-
-    Inquiry: "Do you ship to Canada?"
-    Category: Shipping Question
-    Priority: LOW
-    Reason: Pre-purchase inquiry, not time-sensitive
-
-    ---
-
-    Now classify this inquiry:
-    Inquiry: {customer_message}
-    Category:
-    Priority:
-    Reason:
-    """
-
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
-        input=[{"role": "user", "content": prompt}],
+        **CLASSIFICATION_PROMPT.params(examples=examples, message=customer_message),
         temperature=0.3
     )
 
@@ -65,12 +145,15 @@ def few_shot_classification():
     print(response.output_text)
     print("\n" + "="*50 + "\n")
 
+@traced()
 def few_shot_response_generation():
     """
     Example: Generate responses in specific tone and structure
 
     📖 STORY CONTEXT - Day 6 (continued):
     Generate an empathetic response to Aditya about his defective mice.
+
+    The examples are the most similar ones in response_examples.
     """
 
     customer_message = """
@@ -78,35 +161,11 @@ def few_shot_response_generation():
     Buttons don't register properly.
     """
 
-    prompt = f"""
-    Generate customer service responses following these examples:
+    examples = response_examples.render_selection(customer_message, k=3, token_budget=EXAMPLE_TOKEN_BUDGET)
 
-    Example 1:
-    Type: Apology for delay
-    Input: "My order is late"
-    Output: "We sincerely apologize for the delay in your order delivery. This isn't the experience we want for you. I'm personally looking into this and will ensure expedited shipping at no extra cost. ETA: 24 hours. Thank you for your patience."
-
-    Example 2:
-    Type: Product issue resolution
-    Input: "The item is damaged"
-    Output: "I'm truly sorry your item arrived damaged. That's completely unacceptable. Here's what I'll do: (1) Send a replacement via express shipping today, (2) You keep the damaged item - no return needed, (3) Apply a 15% discount to your account. You should receive your replacement within 2 days."
-
-    Example 3:
-    Type: Feature request
-    Input: "Can you add dark mode?"
-    Output: "Thank you for this excellent suggestion! Dark mode is definitely on our radar. I've forwarded your request to our product team with a +1. While I can't promise a timeline, we do prioritize features based on customer feedback. I'll add you to our update list!"
-
-    ---
-
-    Now generate a response:
-    Type: Product defect acknowledgment
-    Input: {customer_message}
-    Output:
-    """
-
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
-        input=[{"role": "user", "content": prompt}],
+        **RESPONSE_PROMPT.params(examples=examples, message=customer_message),
         temperature=0.7
     )
 
@@ -114,6 +173,21 @@ def few_shot_response_generation():
     print(response.output_text)
 
 # Example 3: Complex data extraction
+def data_extraction_request(customer_message):
+    """
+    Request for one feedback message (also used by batch_jobs.py for bulk runs),
+    with the most similar examples from extraction_examples
+    """
+
+    examples = extraction_examples.render_selection(customer_message, k=3, token_budget=EXAMPLE_TOKEN_BUDGET)
+
+    return dict(
+        model="gpt-5.2",
+        **EXTRACTION_PROMPT.params(examples=examples, message=customer_message),
+        temperature=0.2
+    )
+
+@traced()
 def few_shot_data_extraction():
     """
     Extract structured information from unstructured text
@@ -128,51 +202,7 @@ def few_shot_data_extraction():
     However, BOTH wireless mice have defective clicking buttons. Very disappointed with mice quality.
     """
 
-    prompt = """
-    Extract customer feedback data in structured format.
-
-    Example 1:
-    Feedback: "Great laptop! Fast delivery. But the charger cable is too short."
-    {
-        "product": "laptop",
-        "positive_aspects": ["performance", "fast delivery"],
-        "negative_aspects": ["charger cable length"],
-        "overall_sentiment": "positive",
-        "action_required": "review charger cable design"
-    }
-
-    Example 2:
-    Feedback: "Mouse is okay, nothing special. Arrived a week late and packaging was damaged."
-    {
-        "product": "mouse",
-        "positive_aspects": [],
-        "negative_aspects": ["late delivery", "damaged packaging"],
-        "overall_sentiment": "neutral",
-        "action_required": "investigate shipping partner"
-    }
-
-    Example 3:
-    Feedback: "Keyboard is fantastic! Love the mechanical switches. RGB lighting is stunning!"
-    {
-        "product": "keyboard",
-        "positive_aspects": ["mechanical switches", "RGB lighting"],
-        "negative_aspects": [],
-        "overall_sentiment": "very positive",
-        "action_required": "none"
-    }
-
-    ---
-
-    Now extract from this feedback:
-    """ + f"""
-    Feedback: {customer_message}
-    """
-
-    response = client.responses.create(
-        model="gpt-5.2",
-        input=[{"role": "user", "content": prompt}],
-        temperature=0.2
-    )
+    response = create_response(**data_extraction_request(customer_message))
 
     print("Few-Shot Data Extraction:")
     print(response.output_text)
@@ -1,10 +1,40 @@
-from openai import OpenAI
-from dotenv import load_dotenv
+from llm_client import create_response
+from instrumentation import traced
+from prompt_templates import PromptTemplate
 
-load_dotenv()
+# Instructions and the worked example are the static, cacheable prefix; the
+# scenario comes last (see prompt_templates.py)
+SCENARIO_ANALYSIS = PromptTemplate("cot_scenario_analysis", prefix="""
+    Analyze customer scenarios and provide step-by-step reasoning for the best resolution.
+
+    Example:
+    Scenario: Customer bought a laptop 35 days ago. Our return policy is 30 days. The laptop has a manufacturing defect. Customer is angry and threatens to leave negative review.
 
-client = OpenAI()
+    Reasoning:
+    1. Check return policy: 30 days (exceeded by 5 days)
+    2. Identify issue type: Manufacturing defect (not customer damage)
+    3. Assess customer sentiment: Angry, might churn
+    4. Consider warranty: Manufacturing defects covered beyond return period
+    5. Calculate business impact: Negative review > cost of exception
+    6. Decision factors: Customer loyalty vs strict policy
 
+    Resolution: Accept return as exception because:
+    - Manufacturing defect is our responsibility
+    - Small policy exception (5 days) worth customer retention
+    - Prevents negative PR
+    - Falls under warranty coverage anyway
+
+    Action: Approve return, apologize for defect, offer expedited refund + 10% future purchase credit
+
+    ---
+    """, suffix="""
+    Now analyze this scenario:
+    Scenario: {scenario}
+
+    Reasoning:
+    """)
+
+@traced()
 def chain_of_thought_basic():
     """
     Example: Basic CoT for logical reasoning
@@ -32,7 +62,7 @@ def chain_of_thought_basic():
     Calculate the refund amount if we refund just the mice. Think through it step by step.
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.2
@@ -42,6 +72,7 @@ def chain_of_thought_basic():
     print(response.output_text)
     print("\n" + "="*50 + "\n")
 
+@traced()
 def chain_of_thought_few_shot():
     """
     Example: Few-shot CoT for complex customer scenarios
@@ -51,39 +82,11 @@ def chain_of_thought_few_shot():
     Aditya is a new customer, order placed 7 days ago, product defect issue.
     """
 
-    prompt = """
-    Analyze customer scenarios and provide step-by-step reasoning for the best resolution.
+    scenario = "Aditya Patel ordered gaming setup 7 days ago (order #SM-2026-12345: laptop $1,299, 2x mouse $49.99 each, keyboard $89.99). Both mice have defective clicking buttons. He's polite but disappointed. This is his first order with us. Laptop and keyboard work perfectly."
 
-    Example:
-    Scenario: Customer bought a laptop 35 days ago. Our return policy is 30 days. The laptop has a manufacturing defect. Customer is angry and threatens to leave negative review.
-
-    Reasoning:
-    1. Check return policy: 30 days (exceeded by 5 days)
-    2. Identify issue type: Manufacturing defect (not customer damage)
-    3. Assess customer sentiment: Angry, might churn
-    4. Consider warranty: Manufacturing defects covered beyond return period
-    5. Calculate business impact: Negative review > cost of exception
-    6. Decision factors: Customer loyalty vs strict policy
-
-    Resolution: Accept return as exception because:
-    - Manufacturing defect is our responsibility
-    - Small policy exception (5 days) worth customer retention
-    - Prevents negative PR
-    - Falls under warranty coverage anyway
-
-    Action: Approve return, apologize for defect, offer expedited refund + 10% future purchase credit
-
-    ---
-
-    Now analyze this scenario:
-    Scenario: Aditya Patel ordered gaming setup 7 days ago (order #SM-2026-12345: laptop $1,299, 2x mouse $49.99 each, keyboard $89.99). Both mice have defective clicking buttons. He's polite but disappointed. This is his first order with us. Laptop and keyboard work perfectly.
-
-    Reasoning:
-    """
-
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
-        input=[{"role": "user", "content": prompt}],
+        **SCENARIO_ANALYSIS.params(scenario=scenario),
         temperature=0.7
     )
 
@@ -91,6 +94,7 @@ def chain_of_thought_few_shot():
     print(response.output_text)
     print("\n" + "="*50 + "\n")
 
+@traced()
 def chain_of_thought_troubleshooting():
     """
     Example: Technical troubleshooting with CoT
@@ -116,7 +120,7 @@ def chain_of_thought_troubleshooting():
     Provide step-by-step analysis.
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.6
@@ -125,6 +129,7 @@ def chain_of_thought_troubleshooting():
     print("Chain-of-Thought Troubleshooting:")
     print(response.output_text)
 
+@traced()
 def zero_shot_cot():
     """
     Example: Zero-shot CoT using "Let's think step by step"
@@ -151,7 +156,7 @@ def zero_shot_cot():
     Let's think step by step:
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.2
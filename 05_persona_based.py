@@ -1,10 +1,46 @@
-from openai import OpenAI
-from dotenv import load_dotenv
+from llm_client import create_response
+from instrumentation import traced
+from prompt_templates import PromptTemplate, print_cache_report
+
+# Personas are static developer messages compiled once (see prompt_templates.py):
+# every call sends the same persona bytes first and the customer message last.
+# These personas are far below the 1,024-token prompt cache minimum, so they
+# only start caching once a persona grows past it
+TECHNICAL_EXPERT = PromptTemplate("persona_technical_expert", suffix="{message}", developer="""
+    You are a senior technical support specialist with 10 years of experience
+    in computer peripherals and wireless devices. You explain technical concepts clearly,
+    ask diagnostic questions efficiently, and provide step-by-step solutions.
+    You're patient but professional.
+    """)
 
-load_dotenv()
+EMPATHETIC_SUPPORT = PromptTemplate("persona_empathetic_support", suffix="{message}", developer="""
+    You are an empathetic and patient customer service representative who
+    genuinely cares about solving customer problems. You always acknowledge
+    customer frustrations, apologize when appropriate, and go above and
+    beyond to help. You use positive language and make customers feel valued.
+    """)
 
-client = OpenAI()
+EFFICIENCY_EXPERT = PromptTemplate("persona_efficiency_expert", suffix="{message}", developer="""
+    You are a no-nonsense, efficient business analyst who values clarity and
+    brevity. You get straight to the point, use bullet points, and focus on
+    actionable insights. You don't use fluff or unnecessary explanations.
+    """)
+
+COMPARISON_PERSONAS = {
+    "Technical Expert": PromptTemplate("persona_payments_engineer", suffix="{query}", developer="""
+        You are a payments systems engineer who understands
+        banking infrastructure, ACH transfers, and payment processing."""),
+
+    "Customer Service": PromptTemplate("persona_customer_service", suffix="{query}", developer="""
+        You are a friendly customer service rep who explains
+        things in simple terms that any customer can understand."""),
 
+    "Account Manager": PromptTemplate("persona_account_manager", suffix="{query}", developer="""
+        You are a premium account manager for VIP clients.
+        You're professional, reassuring, and proactive."""),
+}
+
+@traced()
 def persona_technical_expert():
     """
     Example: Technical support with expert persona
@@ -13,24 +49,14 @@ def persona_technical_expert():
     Technical expert provides professional troubleshooting for Aditya's mice issue.
     """
 
-    system_message = """
-    You are a senior technical support specialist with 10 years of experience
-    in computer peripherals and wireless devices. You explain technical concepts clearly,
-    ask diagnostic questions efficiently, and provide step-by-step solutions.
-    You're patient but professional.
-    """
-
     user_message = """Hi, I'm Aditya Patel (order #SM-2026-12345). Both wireless
     mice I received have clicking issues. Buttons don't register reliably - about 50%
     failure rate. I've tried fresh batteries and different USB ports. Cursor movement
     works perfectly fine. Is this fixable or defective hardware?"""
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
-        input=[
-            {"role": "developer", "content": system_message},
-            {"role": "user", "content": user_message}
-        ],
+        **TECHNICAL_EXPERT.params(message=user_message),
         temperature=0.7
     )
 
@@ -38,6 +64,7 @@ def persona_technical_expert():
     print(response.output_text)
     print("\n" + "="*50 + "\n")
 
+@traced()
 def persona_empathetic_support():
     """
     Example: Empathetic customer service persona
@@ -46,13 +73,6 @@ def persona_empathetic_support():
     Empathetic support representative responds to Aditya's frustration.
     """
 
-    system_message = """
-    You are an empathetic and patient customer service representative who
-    genuinely cares about solving customer problems. You always acknowledge
-    customer frustrations, apologize when appropriate, and go above and
-    beyond to help. You use positive language and make customers feel valued.
-    """
-
     user_message = """
     This is Aditya Patel, order #SM-2026-12345. I was so excited to get my
    gaming setup, but both mice are defective with clicking issues. The laptop
@@ -60,12 +80,9 @@ def persona_empathetic_support():
     disappointing for a first order. Can you help?
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
-        input=[
-            {"role": "developer", "content": system_message},
-            {"role": "user", "content": user_message}
-        ],
+        **EMPATHETIC_SUPPORT.params(message=user_message),
         temperature=0.8
     )
 
@@ -73,6 +90,7 @@ def persona_empathetic_support():
     print(response.output_text)
     print("\n" + "="*50 + "\n")
 
+@traced()
 def persona_efficiency_expert():
     """
     Example: Brief, efficient business persona
@@ -81,12 +99,6 @@ def persona_efficiency_expert():
     Internal analysis of Aditya's case for quality team briefing.
     """
 
-    system_message = """
-    You are a no-nonsense, efficient business analyst who values clarity and
-    brevity. You get straight to the point, use bullet points, and focus on
-    actionable insights. You don't use fluff or unnecessary explanations.
-    """
-
     user_message = """
     Analyze this customer case:
     - Customer: Aditya Patel (first-time buyer)
@@ -97,12 +109,9 @@ def persona_efficiency_expert():
     - Mice: 2 units x $49.99 = $99.98 (after discount: ~$90)
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
-        input=[
-            {"role": "developer", "content": system_message},
-            {"role": "user", "content": user_message}
-        ],
+        **EFFICIENCY_EXPERT.params(message=user_message),
         temperature=0.6
     )
 
@@ -110,6 +119,7 @@ def persona_efficiency_expert():
     print(response.output_text)
     print("\n" + "="*50 + "\n")
 
+@traced()
 def persona_comparison():
     """
     Example: Same query, different personas
@@ -120,24 +130,10 @@ def persona_comparison():
 
     query = "Explain to Aditya Patel why his refund for the defective mice (order #SM-2026-12345) was processed 2 days ago but he hasn't received the money yet."
 
-    personas = {
-        "Technical Expert": """You are a payments systems engineer who understands
-        banking infrastructure, ACH transfers, and payment processing.""",
-
-        "Customer Service": """You are a friendly customer service rep who explains
-        things in simple terms that any customer can understand.""",
-
-        "Account Manager": """You are a premium account manager for VIP clients.
-        You're professional, reassuring, and proactive."""
-    }
-
-    for persona_name, persona_description in personas.items():
-        response = client.responses.create(
+    for persona_name, persona in COMPARISON_PERSONAS.items():
+        response = create_response(
             model="gpt-5.2",
-            input=[
-                {"role": "developer", "content": persona_description},
-                {"role": "user", "content": query}
-            ],
+            **persona.params(query=query),
             temperature=0.7,
             max_output_tokens=200
         )
@@ -151,4 +147,5 @@ if __name__ == "__main__":
     # persona_technical_expert()
     # persona_empathetic_support()
     # persona_efficiency_expert()
-    persona_comparison()
\ No newline at end of file
+    persona_comparison()
+    print_cache_report()
\ No newline at end of file
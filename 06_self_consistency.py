@@ -1,11 +1,9 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-from collections import Counter
+from sampling import sample_concurrently
+from voting import adaptive_vote
+from instrumentation import traced
 
-load_dotenv()
-client = OpenAI()
-
-def self_consistency_refund_calculation():
+@traced()
+def self_consistency_refund_calculation(max_concurrency=None):
     """
     Example: Calculate refund amount with self-consistency
 
@@ -36,24 +34,27 @@ def self_consistency_refund_calculation():
     Important: The discount was applied proportionally to all items.
     """
 
-    # Generate multiple responses
+    # Generate multiple responses (all samples in flight at once)
     num_samples = 5
-    responses = []
 
     print(f"Generating{num_samples} reasoning paths...\n")
 
-    for i in range(num_samples):
-        response = client.responses.create(
+    def print_response(i, response):
+        print(f"Response{i+1}:")
+        print(response.output_text)
+        print("\n" + "-"*50 + "\n")
+
+    samples = sample_concurrently(
+        dict(
             model="gpt-5.2",
             input=[{"role": "user", "content": prompt}],
             temperature=0.7  # Higher temperature for diverse reasoning
-        )
-
-        response_text = response.output_text
-        responses.append(response_text)
-        print(f"Response{i+1}:")
-        print(response_text)
-        print("\n" + "-"*50 + "\n")
+        ),
+        num_samples,
+        on_sample=print_response,
+        max_concurrency=max_concurrency
+    )
+    responses = [response.output_text for response in samples]
 
     # Extract final answers (simplified - in production, use regex or structured output)
     print("Analyzing for self-consistency...")
@@ -61,7 +62,24 @@ def self_consistency_refund_calculation():
 
     return responses
 
-def self_consistency_priority_classification():
+def extract_priority(response_text):
+    """Pull the priority label out of a classification (None if missing)"""
+    # Simple extraction (in production, use better parsing)
+    for priority in ["CRITICAL", "HIGH", "MEDIUM", "LOW"]:
+        if priority in response_text.upper():
+            return priority
+    return None
+
+def extract_decision(response_text):
+    """Pull YES/NO out of a 'DECISION: ...' line (None if unclear)"""
+    if "DECISION: YES" in response_text.upper():
+        return "YES"
+    elif "DECISION: NO" in response_text.upper():
+        return "NO"
+    return None
+
+@traced()
+def self_consistency_priority_classification(max_concurrency=None, confidence_threshold=None):
     """
     Example: Priority classification with voting
 
@@ -89,43 +107,41 @@ def self_consistency_priority_classification():
     Provide your classification: [LOW/MEDIUM/HIGH/CRITICAL]
     """
 
-    # Generate multiple classifications
+    # Generate classifications concurrently; stop once the vote can't change
     num_samples = 5
-    classifications = []
 
-    print(f"Generating{num_samples} classifications...\n")
+    print(f"Generating up to{num_samples} classifications...\n")
 
-    for i in range(num_samples):
-        response = client.responses.create(
+    def print_vote(i, priority):
+        print(f"Classification{i+1}:{priority or 'Could not extract'}")
+
+    result = adaptive_vote(
+        dict(
             model="gpt-5.2",
             input=[{"role": "user", "content": prompt}],
             temperature=0.7
-        )
-
-        response_text = response.output_text
-
-        # Simple extraction (in production, use better parsing)
-        for priority in ["CRITICAL", "HIGH", "MEDIUM", "LOW"]:
-            if priority in response_text.upper():
-                classifications.append(priority)
-                break
-
-        print(f"Classification{i+1}:{classifications[-1] if classifications and len(classifications) == i+1 else 'Could not extract'}")
+        ),
+        extract_priority,
+        num_samples,
+        on_vote=print_vote,
+        max_concurrency=max_concurrency,
+        confidence_threshold=confidence_threshold
+    )
 
     # Majority voting
+    classifications = result["votes"]
+    final_classification = result["answer"]
     if classifications:
-        most_common = Counter(classifications).most_common(1)[0]
-        final_classification = most_common[0]
-        confidence = most_common[1] / num_samples
-
         print(f"\n{'='*50}")
         print(f"Final Classification:{final_classification}")
-        print(f"Confidence:{confidence:.0%} ({most_common[1]}/{num_samples} votes)")
-        print(f"All votes:{Counter(classifications)}")
+        print(f"Confidence:{result['confidence']:.0%} ({classifications[final_classification]}/{result['samples_used']} votes)")
+        print(f"All votes:{classifications}")
+        print(f"Calls saved:{result['calls_saved']}/{num_samples} (stop reason:{result['stop_reason']})")
 
     return final_classification
 
-def self_consistency_decision_making():
+@traced()
+def self_consistency_decision_making(max_concurrency=None, confidence_threshold=None):
     """
     Example: Complex decision with multiple factors
 
@@ -157,37 +173,35 @@ def self_consistency_decision_making():
     """
 
     num_samples = 7  # Odd number for clear majority
-    decisions = []
 
-    print(f"Generating{num_samples} decision reasoning paths...\n")
+    print(f"Generating up to{num_samples} decision reasoning paths...\n")
+
+    def print_vote(i, decision):
+        print(f"Path{i+1}:{decision or 'Unclear'}")
 
-    for i in range(num_samples):
-        response = client.responses.create(
+    # Stops as soon as one side has an unbeatable lead (e.g. 4 matching YES votes)
+    result = adaptive_vote(
+        dict(
             model="gpt-5.2",
             input=[{"role": "user", "content": prompt}],
             temperature=0.8  # Higher temperature for diverse perspectives
-        )
-
-        response_text = response.output_text
-
-        # Extract decision
-        if "DECISION: YES" in response_text.upper():
-            decisions.append("YES")
-        elif "DECISION: NO" in response_text.upper():
-            decisions.append("NO")
-
-        print(f"Path{i+1}:{decisions[-1] if decisions and len(decisions) == i+1 else 'Unclear'}")
+        ),
+        extract_decision,
+        num_samples,
+        on_vote=print_vote,
+        max_concurrency=max_concurrency,
+        confidence_threshold=confidence_threshold
+    )
 
     # Majority vote
-    if decisions:
-        decision_counts = Counter(decisions)
-        final_decision = decision_counts.most_common(1)[0][0]
-        confidence = decision_counts[final_decision] / num_samples
-
+    decision_counts = result["votes"]
+    final_decision = result["answer"]
+    if decision_counts:
         print(f"\n{'='*50}")
         print(f"Final Decision:{final_decision}")
-        print(f"Confidence:{confidence:.0%} ({decision_counts[final_decision]}/{num_samples} votes)")
+        print(f"Confidence:{result['confidence']:.0%} ({decision_counts[final_decision]}/{result['samples_used']} votes)")
         print(f"Breakdown:{dict(decision_counts)}")
+        print(f"Calls saved:{result['calls_saved']}/{num_samples} (stop reason:{result['stop_reason']})")
 
     return final_decision
 
@@ -1,9 +1,8 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import json
-
-load_dotenv()
-client = OpenAI()
+from llm_client import create_response
+from instrumentation import traced, span
+from tools import ToolRegistry, cacheable
+from order_store import open_store
+from conversation import Conversation
 
 # Simulated tools/actions
 class CustomerServiceTools:
@@ -12,47 +11,39 @@ class CustomerServiceTools:
 
     📖 STORY CONTEXT - Day 10 (Feb 20, 2026):
     Agent uses these tools to process Aditya's return request for order #SM-2026-12345.
+
+    Lookups go to `store` (see order_store.py): the demo data in memory, or an
+    indexed SQLite store when ORDER_STORE points to one. Pass a store to use
+    another one for this instance only (agent_runtime.py wraps it in a
+    BatchingStore).
+
+    Tools marked @cacheable change rarely compared with the ticket rate, so
+    the ToolRegistry reuses their results until the TTL (seconds) runs out;
+    lookup_order is always live because order status moves with every ticket.
     """
 
-    @staticmethod
-    def lookup_order(order_id):
-        """Simulate order lookup"""
-        orders = {
-            "SM-2026-12345": {
-                "customer": "Aditya Patel",
-                "email": "aditya.p@techcorp.com",
-                "status": "delivered",
-                "items": {
-                    "Gaming Laptop": {"price": 1299.00, "qty": 1, "status": "no issues"},
-                    "Wireless Mouse": {"price": 49.99, "qty": 2, "status": "defective - reported Feb 16"},
-                    "Mechanical RGB Keyboard": {"price": 89.99, "qty": 1, "status": "no issues"}
-                },
-                "subtotal": 1488.97,
-                "discount": -148.90,
-                "shipping": 8.50,
-                "total": 1348.57,
-                "order_date": "2026-02-10",
-                "delivery_date": "2026-02-15",
-                "tracking": "TRACK-SM-12345"
-            }
-        }
-        return orders.get(order_id, {"error": "Order not found"})
+    store = open_store()
 
-    @staticmethod
-    def check_inventory(product_name):
-        """Simulate inventory check"""
-        inventory = {
-            "Gaming Laptop": {"in_stock": True, "quantity": 45, "warehouse": "East"},
-            "Wireless Mouse": {"in_stock": False, "quantity": 0, "warehouse": "West"},
-            "Mechanical RGB Keyboard": {"in_stock": True, "quantity": 67, "warehouse": "West"}
-        }
-        return inventory.get(product_name, {"error": "Product not found"})
+    def __init__(self, store=None):
+        if store is not None:
+            self.store = store
 
-    @staticmethod
-    def check_return_eligibility(order_id):
+    def lookup_order(self, order_id):
+        """Get order details, items and customer info"""
+        order = self.store.get_order(order_id)
+        return order if order is not None else {"error": "Order not found"}
+
+    @cacheable(ttl=60)
+    def check_inventory(self, product_name):
+        """Check product availability for a replacement"""
+        record = self.store.get_inventory(product_name)
+        return record if record is not None else {"error": "Product not found"}
+
+    @cacheable(ttl=300)
+    def check_return_eligibility(self, order_id):
         """Check if order is eligible for return"""
-        order = CustomerServiceTools.lookup_order(order_id)
-        if "error" in order:
+        order = self.store.get_order(order_id)
+        if order is None:
             return {"eligible": False, "reason": "Order not found"}
 
         # Simulate return policy logic
@@ -63,6 +54,7 @@ class CustomerServiceTools:
             "return_label": "Generate return label available"
         }
 
+    @cacheable(ttl=300)
     @staticmethod
     def calculate_refund(order_id, items_to_return):
         """Calculate refund amount"""
@@ -82,93 +74,115 @@ class CustomerServiceTools:
             }
         return {"error": "Unable to calculate refund"}
 
-def react_customer_inquiry():
+def invalidate_on_store_change(registry, store):
     """
-    Example: ReAct pattern for handling customer inquiry
-
-    📖 STORY CONTEXT - Day 10 (Feb 20, 2026):
-    Agent processes Aditya's return request using reasoning and actions.
+    Drop the registry's cached results for orders / products the store reports
+    as changed; returns the listener (pass it to store.remove_listener when the
+    registry is discarded), or None if the store doesn't report changes
     """
+    if not hasattr(store, "add_listener"):
+        return None
 
-    customer_message = """Hi, this is Aditya Patel. I need to process a return for
-    order #SM-2026-12345. Both wireless mice are defective with clicking issues.
-    I'd like to get a refund or replacement ASAP."""
+    def changed(table, key):
+        if table == "inventory":
+            registry.invalidate("check_inventory", product_name=key)
+        else:
+            registry.invalidate("check_return_eligibility", order_id=key)
+            registry.invalidate("calculate_refund", order_id=key)
 
-    tools_description = """
-    Available Actions:
-    - lookup_order(order_id): Get order details, items, customer info
-    - check_inventory(product_name): Check product availability for replacement
-    - check_return_eligibility(order_id): Check if return is possible
-    - calculate_refund(order_id, items): Calculate refund amount
-    """
+    store.add_listener(changed)
+    return changed
+
+# One registry for every inquiry, so the @cacheable TTLs span inquiries and its
+# cached results are dropped when the store reports a change
+tools = ToolRegistry.from_object(CustomerServiceTools())
+invalidate_on_store_change(tools, CustomerServiceTools.store)
 
-    prompt = f"""
+def react_prompt(customer_message, tools):
+    """First user message of a ReAct run (also used by agent_runtime.py)"""
+    return f"""
     You are a customer service agent. 
     Use the ReAct pattern: alternate between Thought, Action, and Observation.
 
-{tools_description}
+{tools.describe()}
 
     Customer Message:{customer_message}
 
     Use this format:
     Thought: [Your reasoning about what to do next]
-    Action: [The action to take with parameters]
+    Action: tool_name("argument", ...)
 
-    After getting results you'll Observe and continue reasoning.
+    You may request several independent actions at once, one "Action:" line each;
+    they run in parallel and you'll get all Observations together.
+    When you have everything you need, reply with "Final Answer:" and your response to the customer.
 
     Begin:
     """
 
-    messages = [{"role": "user", "content": prompt}]
+def is_final_answer(assistant_message):
+    return "Final Answer" in assistant_message or "Response to Customer" in assistant_message
+
+@traced()
+def react_customer_inquiry(token_budget=1500, chain=False):
+    """
+    Example: ReAct pattern for handling customer inquiry
+
+    📖 STORY CONTEXT - Day 10 (Feb 20, 2026):
+    Agent processes Aditya's return request using reasoning and actions.
+
+    The history is compacted as it grows (see conversation.py): observations
+    are sent as compact JSON and turns past `token_budget` are summarized.
+    chain=True links turns with previous_response_id instead of re-sending them.
+    """
+
+    customer_message = """Hi, this is Aditya Patel. I need to process a return for
+    order #SM-2026-12345. Both wireless mice are defective with clicking issues.
+    I'd like to get a refund or replacement ASAP."""
+
+    conversation = Conversation(react_prompt(customer_message, tools), token_budget=token_budget, chain=chain)
 
     max_iterations = 5
-    tools = CustomerServiceTools()
 
     print("ReAct Customer Service Agent:\n" + "="*50 + "\n")
 
     for iteration in range(max_iterations):
         # Get model's reasoning and action
-        response = client.responses.create(
-            model="gpt-5.2",
-            input=messages,
-            temperature=0.7
-        )
+        params, sent_tokens = conversation.request_params()
+        with span(f"iteration {iteration + 1}"):
+            response = create_response(
+                model="gpt-5.2",
+                temperature=0.7,
+                **params
+            )
 
         assistant_message = response.output_text
-        messages.append({"role": "assistant", "content": assistant_message})
+        conversation.add_response(response, sent_tokens)
 
         print(f"Iteration{iteration + 1}:")
         print(assistant_message)
         print("\n" + "-"*50 + "\n")
 
-        # Parse action and execute (simplified parsing)
-        if "Action: lookup_order" in assistant_message:
-            result = tools.lookup_order("SM-2026-12345")
-            observation = f"Observation: Order details:{json.dumps(result, indent=2)}"
-
-        elif "Action: check_return_eligibility" in assistant_message:
-            result = tools.check_return_eligibility("SM-2026-12345")
-            observation = f"Observation: Return eligibility:{json.dumps(result, indent=2)}"
-
-        elif "Action: check_inventory" in assistant_message:
-            result = tools.check_inventory("Wireless Mouse")
-            observation = f"Observation: Inventory check:{json.dumps(result, indent=2)}"
-
-        elif "Action: calculate_refund" in assistant_message:
-            result = tools.calculate_refund("SM-2026-12345", ["Wireless Mouse"])
-            observation = f"Observation: Refund calculation:{json.dumps(result, indent=2)}"
-
-        elif "Final Answer" in assistant_message or "Response to Customer" in assistant_message:
-            print("Agent has formulated final response.")
-            break
+        # Run every requested action in parallel, answer with one observation turn
+        calls = tools.parse_actions(assistant_message)
+        if not calls:
+            if is_final_answer(assistant_message):
+                print("Agent has formulated final response.")
+                break
+            conversation.add_message("Continue with your response.")
         else:
-            observation = "Continue with your response."
+            with span(f"iteration {iteration + 1}: {len(calls)} tool calls"):
+                results = tools.dispatch(calls)
+            # Add observations back to conversation (compact JSON, one turn)
+            conversation.add_observations(results)
 
-        # Add observation back to conversation
-        messages.append({"role": "user", "content": observation})
-        print(f"System:{observation}")
+        print(f"System:{conversation.turns[-1]['observation']}")
         print("\n" + "="*50 + "\n")
 
+    print("Tokens per iteration (estimated sent vs uncompacted history):")
+    print(conversation.report())
+    return conversation
+
+@traced()
 def react_troubleshooting():
     """
     Example: Technical troubleshooting with ReAct
@@ -198,7 +212,7 @@ def react_troubleshooting():
     Begin troubleshooting:
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.7
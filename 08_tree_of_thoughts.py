@@ -1,16 +1,17 @@
-from openai import OpenAI
-from dotenv import load_dotenv
+from llm_client import create_response, print_response
+from instrumentation import traced
 
-load_dotenv()
-client = OpenAI()
-
-def tree_of_thoughts_decision():
+@traced()
+def tree_of_thoughts_decision(stream=False):
     """
     Example: Complex customer service decision with multiple approaches
 
     📖 STORY CONTEXT - Day 11 (Feb 21, 2026):
     Explore multiple resolution strategies for Aditya's defective mice case
     to find the optimal balance of customer satisfaction and business cost.
+
+    stream=True prints the exploration as it is generated instead of after
+    all 1500 tokens are done.
     """
 
     prompt = """
@@ -60,7 +61,7 @@ def tree_of_thoughts_decision():
     [Best path and why]
     """
 
-    response = client.responses.create(
+    params = dict(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.8,  # Higher for creative exploration
@@ -68,9 +69,10 @@ def tree_of_thoughts_decision():
     )
 
     print("Tree of Thoughts - Customer Resolution:\n" + "="*50)
-    print(response.output_text)
+    print_response(params, stream)
     print("\n" + "="*50 + "\n")
 
+@traced()
 def tree_of_thoughts_product_recommendation():
     """
     Example: Product recommendation with multiple criteria
@@ -118,7 +120,7 @@ def tree_of_thoughts_product_recommendation():
     [Best strategy and product with reasoning]
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.8,
@@ -129,13 +131,16 @@ def tree_of_thoughts_product_recommendation():
     print(response.output_text)
     print("\n" + "="*50 + "\n")
 
-def tree_of_thoughts_scaling_strategy():
+@traced()
+def tree_of_thoughts_scaling_strategy(stream=False):
     """
     Example: Business planning with ToT
 
     📖 STORY CONTEXT - Day 11 (continued):
     Based on Aditya's case and similar defect issues, plan how to prevent
     and better handle product quality problems in the future.
+
+    stream=True prints the strategy as it is generated (the output is uncapped).
     """
 
     prompt = """
@@ -185,7 +190,7 @@ def tree_of_thoughts_scaling_strategy():
     [Final choice with full justification]
     """
 
-    response = client.responses.create(
+    params = dict(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.8,
@@ -193,10 +198,10 @@ def tree_of_thoughts_scaling_strategy():
     )
 
     print("Tree of Thoughts - Business Strategy:\n" + "="*50)
-    print(response.output_text)
+    print_response(params, stream)
 
 # Run examples
 if __name__ == "__main__":
     # tree_of_thoughts_decision()
     # tree_of_thoughts_product_recommendation()
-    tree_of_thoughts_scaling_strategy()
\ No newline at end of file
+    tree_of_thoughts_scaling_strategy(stream=True)
\ No newline at end of file
@@ -1,50 +1,63 @@
-from openai import OpenAI
-from dotenv import load_dotenv
+import contextlib
+import io
 import json
-
-load_dotenv()
-client = OpenAI()
-
-def prompt_chain_customer_email_processing():
-    """
-    Example: Process customer email through multiple stages
-
-    📖 STORY CONTEXT - Day 12 (Feb 22, 2026):
-    Process Aditya's entire case through a complete workflow chain from
-    initial inquiry to resolution and follow-up.
+import json_fixups
+import re
+import time
+from chains import Chain, Step
+from llm_client import response_cache
+from instrumentation import traced, last_trace, format_tree
+from prompt_templates import PromptTemplate
+
+def step_printer():
     """
-
-    customer_email = """
-    Subject: Return completed - Request for confirmation
-
-    Hi,
-
-    This is Aditya Patel (Order #SM-2026-12345). I wanted to confirm that I received
-    the replacement mice yesterday via expedited shipping - thank you!
-
-    The new mice work perfectly. I really appreciate how you handled the defect issue,
-    especially the fast replacement since I had a work deadline.
-
-    The gaming laptop and RGB keyboard from my original order are still working great.
-    I'm very happy with those products.
-
-    Could you send me confirmation that this case is fully resolved?
-    Also, I'd be interested in knowing if you have any deals on gaming headsets.
-
-    Thanks for the excellent customer service!
-
-    Aditya Patel
-    aditya.p@techcorp.com
-    Order #SM-2026-12345
+    on_step / on_delta callbacks for Chain.run that print each step under its
+    title as it finishes; streamed steps are printed live (only the first
+    variant of a mapped step, so parallel outputs don't interleave)
     """
-
-    # STEP 1: Extract structured information
-    print("STEP 1: Information Extraction\n" + "="*50)
-
-    step1_prompt = f"""
-    Extract key information from this customer email in JSON format:
-
-    Email:{customer_email}
+    streaming = set()
+
+    def header(step):
+        print(f"{step.title.upper()}\n" + "="*50)
+
+    def on_delta(step, delta, index):
+        if index:
+            return
+        if step.name not in streaming:
+            streaming.add(step.name)
+            header(step)
+            if step.map_over:
+                print("[1] ", end="")
+        print(delta, end="", flush=True)
+
+    def on_step(step, output):
+        streamed = step.name in streaming
+        if streamed:
+            print()
+        else:
+            header(step)
+        if isinstance(output, list):
+            for number, item in enumerate(output, 1):
+                if not (streamed and number == 1):
+                    print(f"\n[{number}] {item}" if len(output) > 1 else item)
+        elif isinstance(output, dict):
+            print(json.dumps(output, indent=2))
+        elif not streamed:
+            print(output)
+        print("\n" + "-"*50 + "\n")
+
+    return on_step, on_delta
+
+def split_headlines(text):
+    """Headline lines without numbering, bullets or quotes (at most 3)"""
+    lines = [re.sub(r'^\s*(?:\d+[.)]|[-*•])\s*', "", line).strip().strip('"*') for line in text.splitlines()]
+    return [line for line in lines if line][:3]
+
+# Email processing prompts: static instructions first and the email / upstream
+# outputs last, so every run shares the same prefix (see prompt_templates.py).
+# The instructions are still below the 1,024-token prompt cache minimum
+EXTRACTION_PROMPT = PromptTemplate("email_extraction", prefix="""
+    Extract key information from the customer email below in JSON format.
 
     Extract:
     - customer_name
@@ -56,26 +69,12 @@ def prompt_chain_customer_email_processing():
     - deadline (if mentioned)
 
     Respond with only valid JSON.
-    """
-
-    step1_response = client.responses.create(
-        model="gpt-5.2",
-        input=[{"role": "user", "content": step1_prompt}],
-        temperature=0.2
-    )
-
-    extracted_info = step1_response.output_text
-    print("Extracted Information:")
-    print(extracted_info)
-    print("\n" + "-"*50 + "\n")
-
-    # STEP 2: Classify and prioritize issues
-    print("STEP 2: Issue Classification & Prioritization\n" + "="*50)
-
-    step2_prompt = f"""
-    Based on this extracted customer information, classify each issue and assign priority:
+    """, suffix="""
+    Email:{customer_email}
+    """)
 
-{extracted_info}
+CLASSIFICATION_PROMPT = PromptTemplate("email_issue_classification", prefix="""
+    Classify each of the customer issues below and assign priority.
 
     For each issue, provide:
     - Issue type (product defect, billing error, service complaint, etc.)
@@ -84,28 +83,13 @@ def prompt_chain_customer_email_processing():
     - Estimated resolution time
 
     Format as JSON array.
-    """
+    """, suffix="""
+    Issues:
+    {issues}
+    """)
 
-    step2_response = client.responses.create(
-        model="gpt-5.2",
-        input=[{"role": "user", "content": step2_prompt}],
-        temperature=0.2
-    )
-
-    classified_issues = step2_response.output_text
-    print("Classified Issues:")
-    print(classified_issues)
-    print("\n" + "-"*50 + "\n")
-
-    # STEP 3: Generate action plan
-    print("STEP 3: Action Plan Generation\n" + "="*50)
-
-    step3_prompt = f"""
-    Create an action plan to resolve these customer issues:
-
-    Customer Info:{extracted_info}
-
-    Issues:{classified_issues}
+ACTION_PLAN_PROMPT = PromptTemplate("email_action_plan", prefix="""
+    Create an action plan to resolve the customer issues below.
 
     Generate a step-by-step action plan including:
     - Immediate actions (within 24 hours)
@@ -113,30 +97,14 @@ def prompt_chain_customer_email_processing():
     - Resolution plan
     - Follow-up actions
     - Who is responsible for each step
-    """
-
-    step3_response = client.responses.create(
-        model="gpt-5.2",
-        input=[{"role": "user", "content": step3_prompt}],
-        temperature=0.6
-    )
-
-    action_plan = step3_response.output_text
-    print("Action Plan:")
-    print(action_plan)
-    print("\n" + "-"*50 + "\n")
-
-    # STEP 4: Generate customer response email
-    print("STEP 4: Customer Response Generation\n" + "="*50)
-
-    step4_prompt = f"""
-    Write a professional, empathetic response email to the customer:
-
-    Customer's original email:{customer_email}
+    """, suffix="""
+    Customer Info:{extracted_info}
 
-    Issues identified:{classified_issues}
+    Issues:{classified_issues}
+    """)
 
-    Action plan:{action_plan}
+RESPONSE_EMAIL_PROMPT = PromptTemplate("email_customer_response", prefix="""
+    Write a professional, empathetic response email to the customer below.
 
     The email should:
     - Acknowledge all concerns with empathy
@@ -146,33 +114,95 @@ def prompt_chain_customer_email_processing():
     - Provide timeline
     - Offer additional compensation if appropriate
     - Include direct contact for escalation
+    """, suffix="""
+    Customer's original email:{customer_email}
+
+    Issues identified:{classified_issues}
+
+    Action plan:{action_plan}
+    """)
+
+@traced()
+def prompt_chain_customer_email_processing(stream=False, checkpoints=None, pipeline=False):
+    """
+    Example: Process customer email through multiple stages
+
+    📖 STORY CONTEXT - Day 12 (Feb 22, 2026):
+    Process Aditya's entire case through a complete workflow chain from
+    initial inquiry to resolution and follow-up.
+
+    Runs as a DAG (see chains.py): extraction -> classification -> action plan
+    -> customer email. stream=True prints the email as it is
+    generated. With checkpoints (a chains.CheckpointStore, or $CHAIN_CHECKPOINTS)
+    a rerun after a failure resumes from the steps that already finished.
+
+    Classification only reads the `issues` field of the extraction; with
+    pipeline=True the extraction is streamed and classification starts as
+    soon as that array is complete. The extraction is parsed with
+    json_fixups.loads, so a fenced or slightly malformed JSON answer is
+    repaired locally instead of failing the chain.
     """
 
-    step4_response = client.responses.create(
-        model="gpt-5.2",
-        input=[{"role": "user", "content": step4_prompt}],
-        temperature=0.7
-    )
+    customer_email = """
+    Subject: Return completed - Request for confirmation
+
+    Hi,
+
+    This is Aditya Patel (Order #SM-2026-12345). I wanted to confirm that I received
+    the replacement mice yesterday via expedited shipping - thank you!
+
+    The new mice work perfectly. I really appreciate how you handled the defect issue,
+    especially the fast replacement since I had a work deadline.
+
+    The gaming laptop and RGB keyboard from my original order are still working great.
+    I'm very happy with those products.
+
+    Could you send me confirmation that this case is fully resolved?
+    Also, I'd be interested in knowing if you have any deals on gaming headsets.
+
+    Thanks for the excellent customer service!
 
-    response_email = step4_response.output_text
-    print("Customer Response Email:")
-    print(response_email)
+    Aditya Patel
+    aditya.p@techcorp.com
+    Order #SM-2026-12345
+    """
+
+    # Each step declares its inputs (the template fields); the customer email
+    # explains the action plan, so it waits for it
+    chain = Chain([
+        Step("extracted_info", EXTRACTION_PROMPT, title="step 1: information extraction", temperature=0.2,
+             parse=json_fixups.loads),
+        Step("classified_issues", CLASSIFICATION_PROMPT, inputs={"issues": "extracted_info.issues"},
+             title="step 2: issue classification & prioritization", temperature=0.2),
+        Step("action_plan", ACTION_PLAN_PROMPT, title="step 3: action plan generation", temperature=0.6),
+        Step("response_email", RESPONSE_EMAIL_PROMPT, title="step 4: customer response generation",
+             temperature=0.7, stream=stream),
+    ], checkpoints=checkpoints, pipeline=pipeline)
+
+    on_step, on_delta = step_printer()
+    result = chain.run(on_step=on_step, on_delta=on_delta, customer_email=customer_email)
+    print(result.summary())
     print("\n" + "="*50 + "\n")
 
     return {
-        "extracted_info": extracted_info,
-        "classified_issues": classified_issues,
-        "action_plan": action_plan,
-        "response_email": response_email
+        "extracted_info": result.outputs["extracted_info"],
+        "classified_issues": result.outputs["classified_issues"],
+        "action_plan": result.outputs["action_plan"],
+        "response_email": result.outputs["response_email"]
     }
 
-def prompt_chain_product_description():
+@traced()
+def prompt_chain_product_description(stream=False, checkpoints=None):
     """
     Example: Generate product description through refinement chain
 
     📖 STORY CONTEXT - Day 12 (continued):
     Aditya expressed interest in gaming headsets. Generate a compelling
     product description through a multi-step refinement chain.
+
+    Runs as a DAG (see chains.py): features -> headlines -> one full
+    description per headline, generated in parallel. stream=True prints the
+    first description as it is generated; checkpoints as above.
     """
 
     product_specs = {
@@ -187,10 +217,8 @@ def prompt_chain_product_description():
         "price": "$149.99"
     }
 
-    # STEP 1: Generate features list
-    print("STEP 1: Feature Extraction\n" + "="*50)
-
-    step1_prompt = f"""
+    def features_prompt(product_specs):
+        return f"""
     Convert these technical specifications into customer-friendly features:
 
 {json.dumps(product_specs, indent=2)}
@@ -199,20 +227,8 @@ def prompt_chain_product_description():
     who just bought a gaming laptop and RGB keyboard.
     """
 
-    step1_response = client.responses.create(
-        model="gpt-5.2",
-        input=[{"role": "user", "content": step1_prompt}],
-        temperature=0.7
-    )
-
-    features = step1_response.output_text
-    print(features)
-    print("\n" + "-"*50 + "\n")
-
-    # STEP 2: Write compelling headline
-    print("STEP 2: Headline Generation\n" + "="*50)
-
-    step2_prompt = f"""
+    def headlines_prompt(features):
+        return f"""
     Based on these features, create 3 compelling headlines for this product:
 
 {features}
@@ -221,27 +237,17 @@ def prompt_chain_product_description():
     - Attention-grabbing
     - Benefit-focused (not feature-focused)
     - 8-12 words each
-    """
-
-    step2_response = client.responses.create(
-        model="gpt-5.2",
-        input=[{"role": "user", "content": step2_prompt}],
-        temperature=0.9
-    )
-
-    headlines = step2_response.output_text
-    print(headlines)
-    print("\n" + "-"*50 + "\n")
 
-    # STEP 3: Full product description
-    print("STEP 3: Full Description\n" + "="*50)
+    Put each headline on its own line, with nothing else.
+    """
 
-    step3_prompt = f"""
+    def description_prompt(features, headlines):
+        return f"""
     Write a compelling product description using:
 
     Features:{features}
 
-    Headline (use the best one):{headlines}
+    Headline:{headlines}
 
     Structure:
     - Engaging opening paragraph
@@ -253,21 +259,54 @@ def prompt_chain_product_description():
     Length: 150-200 words
     """
 
-    step3_response = client.responses.create(
-        model="gpt-5.2",
-        input=[{"role": "user", "content": step3_prompt}],
-        temperature=0.8
-    )
+    # One full description per headline, all expanded at once
+    chain = Chain([
+        Step("features", features_prompt, title="step 1: feature extraction", temperature=0.7),
+        Step("headlines", headlines_prompt, title="step 2: headline generation", temperature=0.9,
+             parse=split_headlines),
+        Step("descriptions", description_prompt, title="step 3: full descriptions", temperature=0.8,
+             map_over="headlines", stream=stream),
+    ], checkpoints=checkpoints)
 
-    description = step3_response.output_text
-    print(description)
+    on_step, on_delta = step_printer()
+    result = chain.run(on_step=on_step, on_delta=on_delta, product_specs=product_specs)
+    print(result.summary())
 
-    return description
+    return {
+        "features": result.outputs["features"],
+        "headlines": result.outputs["headlines"],
+        "descriptions": result.outputs["descriptions"]
+    }
+
+def compare_pipelining(runs=3):
+    """
+    End-to-end latency of the email chain with steps waiting for full
+    responses vs pipelined on streamed fields (response cache bypassed)
+    """
+    enabled, response_cache.enabled = response_cache.enabled, False
+    latencies = {False: [], True: []}
+    try:
+        for _ in range(runs):
+            for pipeline in (False, True):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    started = time.perf_counter()
+                    prompt_chain_customer_email_processing(pipeline=pipeline)
+                    latencies[pipeline].append(time.perf_counter() - started)
+    finally:
+        response_cache.enabled = enabled
+    sequential, pipelined = (sorted(latencies[mode])[len(latencies[mode]) // 2] for mode in (False, True))
+    print(f"Email chain end-to-end (median of {runs}): waiting for full responses {sequential:.2f}s, "
+          f"pipelined {pipelined:.2f}s ({1 - pipelined / sequential:.0%} faster)")
+    return {"sequential_seconds": sequential, "pipelined_seconds": pipelined}
 
 # Run examples
 if __name__ == "__main__":
     # print("\n🔗 PROMPT CHAINING EXAMPLE 1: Customer Email Processing\n")
-    # result = prompt_chain_customer_email_processing()
+    # result = prompt_chain_customer_email_processing(pipeline=True)
+    # compare_pipelining()
 
     print("\n\n🔗 PROMPT CHAINING EXAMPLE 2: Product Description\n")
-    prompt_chain_product_description()
\ No newline at end of file
+    prompt_chain_product_description(stream=True)
+
+    print("\nTiming and token usage per step:")
+    print(format_tree(last_trace()))
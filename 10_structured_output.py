@@ -1,16 +1,98 @@
-from openai import OpenAI
-from dotenv import load_dotenv
+from llm_client import create_response, response_cache
 import json
-
-load_dotenv()
-client = OpenAI()
-
+from instrumentation import traced
+from structured import schemas, strict_object, structured_stream
+from dataset_generation import DatasetGenerator
+from classifier_cascade import ClassifierCascade
+
+# Schemas for the JSON examples: sent as the JSON-schema output format and
+# compiled once into validators that check the output while it streams
+CASE_SCHEMA = strict_object({
+    "customer": strict_object({
+        "name": {"type": "string"},
+        "email": {"type": "string", "pattern": r"[^@\s]+@[^@\s]+\.[^@\s]+"},
+        "phone": {"type": "string"},
+        "lifetime_value": {"type": "number", "minimum": 0},
+        "total_orders": {"type": "integer", "minimum": 0},
+    }),
+    "order": strict_object({
+        "order_id": {"type": "string"},
+        "date": {"type": "string", "pattern": r"\d{4}-\d{2}-\d{2}"},
+        "items": {"type": "array", "minItems": 1, "items": strict_object({
+            "product": {"type": "string"},
+            "quantity": {"type": "integer", "minimum": 1},
+            "unit_price": {"type": "number", "minimum": 0},
+        })},
+        "total_amount": {"type": "number", "minimum": 0},
+    }),
+    "issue": strict_object({
+        "description": {"type": "string"},
+        "category": {"type": "string"},
+        "sentiment": {"type": "string", "enum": ["positive", "neutral", "negative"]},
+        "resolution_requested": {"type": "array", "items": {"type": "string"}},
+    }),
+})
+
+TICKET_SCHEMA = strict_object({
+    "ticket_id": {"type": "string", "pattern": r"TKT-\d{6}", "maxLength": 10},
+    "created_at": {"type": "string",
+                   "pattern": r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?"},
+    "priority": {"type": "string", "enum": ["LOW", "MEDIUM", "HIGH", "CRITICAL"]},
+    "category": {"type": "string"},
+    "subcategory": {"type": "string"},
+    "customer": strict_object({
+        "id": {"type": "string"},
+        "tier": {"type": "string", "enum": ["BASIC", "SILVER", "GOLD", "PLATINUM"]},
+    }),
+    "issue": strict_object({
+        "title": {"type": "string", "maxLength": 100},
+        "description": {"type": "string"},
+        "product_affected": {"type": "string"},
+        "impact": {"type": "string", "enum": ["MINOR", "MODERATE", "MAJOR", "CRITICAL"]},
+    }),
+    "sla": strict_object({
+        "response_time_hours": {"type": "number", "minimum": 0},
+        "resolution_time_hours": {"type": "number", "minimum": 0},
+    }),
+    "assignment": strict_object({
+        "team": {"type": "string"},
+        "agent_id": {"type": ["string", "null"]},
+    }),
+    "tags": {"type": "array", "items": {"type": "string"}},
+    "requires_escalation": {"type": "boolean"},
+})
+
+schemas.register("customer_case", CASE_SCHEMA)
+schemas.register("support_ticket", TICKET_SCHEMA)
+
+def print_section(path, value):
+    """on_value callback: print each top-level field as soon as it has fully streamed in"""
+    if len(path) == 1:
+        text = json.dumps(value, ensure_ascii=False)
+        print(f"  {path[0]}: {text if len(text) <= 80 else text[:77] + '...'}")
+
+def report_stream(result, schema):
+    stats = schemas.stats()[schema]
+    if result["repairs"]:
+        print(f"\n🔧 Repaired locally: {', '.join(result['repairs'])}")
+    print(f"\n{result['attempts']} attempt(s); {schema}: {stats['invalid_rate']:.0%} invalid outputs, "
+          f"{stats['repaired']} repaired locally, {stats['retries']} retries so far")
+    if result["error"] is None:
+        return True
+    print(f"❌ Invalid output after {result['attempts']} attempt(s): {result['error']}")
+    return False
+
+@traced()
 def structured_json_extraction():
     """
     Example: Extract customer data in strict JSON format
 
     📖 STORY CONTEXT - Day 13 (Feb 23, 2026):
     Extract Aditya's complete case data into structured JSON for system integration.
+
+    The request carries CASE_SCHEMA as its output format, and the output is
+    checked against it while it streams; an invalid answer is stopped at the
+    first bad value and re-requested once with the error.
     """
 
     customer_text = """
@@ -64,35 +146,39 @@ def structured_json_extraction():
     Output ONLY the JSON:
     """
 
-    response = client.responses.create(
+    print("Structured JSON Output:\n" + "="*50)
+    result = structured_stream(
+        "customer_case",
+        on_value=print_section,
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.1  # Very low for consistency
     )
 
-    json_output = response.output_text
-    print("Structured JSON Output:\n" + "="*50)
-    print(json_output)
-
-    # Validate it's actually valid JSON
-    try:
-        parsed = json.loads(json_output)
-        print("\n✅ Valid JSON - Successfully parsed")
+    if report_stream(result, "customer_case"):
+        parsed = result["value"]
+        print("\n✅ Valid JSON - matches the schema")
         print(f"Customer:{parsed['customer']['name']}")
         print(f"Order Total: ${parsed['order']['total_amount']}")
-    except json.JSONDecodeError:
-        print("\n❌ Invalid JSON")
 
     print("\n" + "="*50 + "\n")
 
-def structured_table_output():
+@traced()
+def structured_table_output(rows=None, csv_path=None, jsonl_path="customers.jsonl", concurrency=16, chunk_size=50):
     """
     Example: Generate data in table format
 
     📖 STORY CONTEXT - Day 13 (continued):
     Generate timeline table of Aditya's case for documentation.
+
+    With rows set, generates the customer dataset as Markdown table rows
+    instead, in parallel chunks streamed to csv_path / jsonl_path (see
+    structured_csv_output).
     """
 
+    if rows is not None:
+        return generate_customers(rows, "markdown", csv_path, jsonl_path, concurrency, chunk_size)
+
     prompt = """
     Create a timeline of Aditya Patel's case (Order #SM-2026-12345) in Markdown table format.
 
@@ -111,7 +197,7 @@ def structured_table_output():
     Output ONLY the table, no other text.
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.3
@@ -122,18 +208,18 @@ def structured_table_output():
     print(table_output)
     print("\n" + "="*50 + "\n")
 
-def structured_enum_classification():
-    """
-    Example: Force output to be from predefined options
-    """
+CATEGORIES = [
+    "ORDER_STATUS",
+    "PRODUCT_RETURN",
+    "TECHNICAL_SUPPORT",
+    "ACCOUNT_MANAGEMENT",
+    "PRODUCT_INQUIRY",
+    "BILLING_ISSUE",
+    "COMPLAINT",
+]
 
-    customer_messages = [
-        "I want to return my order, it's defective",
-        "When will my package arrive?",
-        "How do I reset my password?",
-        "Your service is terrible! I want a refund!",
-        "Do you have this in blue color?"
-    ]
+def classification_request(message):
+    """Request for one customer message (also used by batch_jobs.py for bulk runs)"""
 
     prompt_template = """
     Classify this customer message into EXACTLY ONE of these categories:
@@ -152,24 +238,70 @@ def structured_enum_classification():
     Category:
     """
 
+    return dict(
+        model="gpt-5.2",
+        input=[{"role": "user", "content": prompt_template.format(message=message)}],
+        temperature=0.0  # Deterministic
+    )
+
+def parse_category(response_text):
+    """Category name from a classification answer (None if it isn't one of CATEGORIES)"""
+    category = response_text.strip().strip(".").upper()
+    return category if category in CATEGORIES else None
+
+def llm_category(message):
+    """Category of one message from the model (None if the answer isn't one of CATEGORIES)"""
+    return parse_category(create_response(**classification_request(message)).output_text)
+
+# Local hashed n-gram classifier in front of the model, trained on its past
+# labels; they are recorded only with $CLASSIFIER_CASCADE_DIR set
+# (python classifier_cascade.py train --name enum_classification)
+category_cascade = ClassifierCascade("enum_classification", CATEGORIES, llm_category, threshold=0.9)
+
+@traced()
+def structured_enum_classification():
+    """
+    Example: Force output to be from predefined options
+
+    Messages go through category_cascade: ones the local classifier is at
+    least 90% sure about are answered without a model call, the rest are
+    classified by the model (and its labels kept as training data).
+    """
+
+    customer_messages = [
+        "I want to return my order, it's defective",
+        "When will my package arrive?",
+        "How do I reset my password?",
+        "Your service is terrible! I want a refund!",
+        "Do you have this in blue color?"
+    ]
+
     print("Structured Enum Classification:\n" + "="*50)
 
     for msg in customer_messages:
-        response = client.responses.create(
-            model="gpt-5.2",
-            input=[{"role": "user", "content": prompt_template.format(message=msg)}],
-            temperature=0.0  # Deterministic
-        )
+        result = category_cascade.classify(msg)
 
-        category = response.output_text.strip()
         print(f"Message:\"{msg[:50]}...\"")
-        print(f"Category:{category}\n")
+        print(f"Category:{result['label']} ({result['source']}, local confidence {result['confidence']:.2f})\n")
+
+    stats = category_cascade.stats()
+    agreement = f"{stats['agreement']:.0%}" if stats["agreement"] is not None else "n/a"
+    print(f"Cascade: {stats['escalation_rate']:.0%} escalated to the model, "
+          f"{agreement} agreement with the model, {stats['local_microseconds']:.0f}us per local prediction")
 
+    # temperature=0.0 calls are served from the response cache on repeat runs
+    stats = response_cache.stats()
+    print(f"Response cache: {stats['memory_hits'] + stats['disk_hits']} hits, {stats['misses']} misses")
     print("="*50 + "\n")
 
+@traced()
 def structured_with_schema_validation():
     """
     Example: Complex structured output with validation rules
+
+    The rules live in TICKET_SCHEMA, sent as the output format and checked
+    while the ticket streams, so e.g. a malformed ticket_id stops the
+    generation right there and the ticket is re-requested.
     """
 
     prompt = """
@@ -209,39 +341,84 @@ def structured_with_schema_validation():
     Generate realistic data. Output ONLY valid JSON.
     """
 
-    response = client.responses.create(
+    print("Complex Structured Ticket:\n" + "="*50)
+    result = structured_stream(
+        "support_ticket",
+        on_value=print_section,
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.3
     )
 
-    ticket = response.output_text
-    print("Complex Structured Ticket:\n" + "="*50)
-    print(ticket)
-
-    # Validate
-    try:
-        parsed = json.loads(ticket)
+    if report_stream(result, "support_ticket"):
+        parsed = result["value"]
         print("\n✅ Valid JSON Structure")
+        print(f"✅ Priority '{parsed['priority']}' is valid")
+        print(f"✅ Ticket ID format is correct:{parsed['ticket_id']}")
 
-        # Additional validation
-        valid_priorities = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
-        if parsed["priority"] in valid_priorities:
-            print(f"✅ Priority '{parsed['priority']}' is valid")
+    print("\n" + "="*50 + "\n")
 
-        if "TKT-" in parsed["ticket_id"]:
-            print(f"✅ Ticket ID format is correct:{parsed['ticket_id']}")
+# Synthetic customer records: column -> converter applied to each parsed cell
+CUSTOMER_COLUMNS = {
+    "CustomerID": str,
+    "Name": str,
+    "Email": str,
+    "TotalOrders": int,
+    "LifetimeValue": float,
+    "Status": str,
+}
+
+def customer_rows_prompt(ids, format="csv"):
+    """Prompt for one customer record per id (used by dataset_generation.py for large datasets)"""
+    if isinstance(ids, range):
+        id_rule = f"exactly {len(ids)} records, CustomerIDs CUST-{ids[0]:05d} through CUST-{ids[-1]:05d} in order"
+    else:
+        id_rule = f"exactly {len(ids)} records, one for each of these CustomerIDs: " + \
+            ", ".join(f"CUST-{number:05d}" for number in ids)
+    output = "CSV" if format == "csv" else "a Markdown table"
+    return f"""
+    Generate {id_rule}, as {output}.
+
+    Columns (in order): {", ".join(CUSTOMER_COLUMNS)}
 
-    except Exception as e:
-        print(f"\n❌ Validation failed:{e}")
+    Rules:
+    - CustomerID: format CUST-XXXXX, only the ids given above
+    - Names and emails: realistic and varied
+    - LifetimeValue: number without $ symbol
+    - Status: ACTIVE or INACTIVE
+    - One record per line, include header row
+    - Values with commas must be quoted
+
+    Output ONLY the {output}, no other text:
+    """
 
+def generate_customers(rows, format, csv_path, jsonl_path, concurrency, chunk_size):
+    """Generator mode of structured_csv_output / structured_table_output; returns the DatasetGenerator report"""
+    generator = DatasetGenerator(CUSTOMER_COLUMNS, prompt=customer_rows_prompt, chunk_size=chunk_size,
+                                 concurrency=concurrency, format=format, temperature=0.8)
+    report = generator.run(rows, csv_path=csv_path, jsonl_path=jsonl_path)
+    print("Generated Customer Dataset:\n" + "="*50)
+    print(f"{report['rows_written']} of {rows} rows written to {csv_path or jsonl_path} "
+          f"in {report['seconds']:.1f}s ({report['rows_per_second']:.0f} rows/s, "
+          f"{report['requests']} requests for {report['chunks']} chunks)")
     print("\n" + "="*50 + "\n")
+    return report
 
-def structured_csv_output():
+@traced()
+def structured_csv_output(rows=None, csv_path="customers.csv", jsonl_path=None, concurrency=16, chunk_size=50):
     """
     Example: Generate CSV format
+
+    With rows set, runs as a generator instead: the dataset is requested in
+    parallel chunks of chunk_size rows with disjoint CUST-XXXXX ranges, and
+    every row is appended to csv_path / jsonl_path as soon as it has streamed
+    in (see dataset_generation.py), so tens of thousands of rows fit neither
+    an output limit nor memory.
     """
 
+    if rows is not None:
+        return generate_customers(rows, "csv", csv_path, jsonl_path, concurrency, chunk_size)
+
     prompt = """
     Generate 5 sample customer records in CSV format.
 
@@ -257,7 +434,7 @@ def structured_csv_output():
     Output ONLY the CSV, no other text:
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": prompt}],
         temperature=0.3
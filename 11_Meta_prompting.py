@@ -1,9 +1,7 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-
-load_dotenv()
-client = OpenAI()
+from llm_client import create_response, print_response
+from instrumentation import traced
 
+@traced()
 def meta_prompt_optimizer():
     """
     Example: Use AI to improve a prompt
@@ -43,7 +41,7 @@ def meta_prompt_optimizer():
     - Follow-up actions
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": meta_prompt}],
         temperature=0.7
@@ -53,6 +51,7 @@ def meta_prompt_optimizer():
     print(response.output_text)
     print("\n" + "="*50 + "\n")
 
+@traced()
 def meta_prompt_strategy_selector():
     """
     Example: Ask AI which prompting technique to use
@@ -99,7 +98,7 @@ def meta_prompt_strategy_selector():
     Then provide a recommended approach with step-by-step implementation plan.
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": meta_prompt}],
         temperature=0.7
@@ -109,12 +108,15 @@ def meta_prompt_strategy_selector():
     print(response.output_text)
     print("\n" + "="*50 + "\n")
 
-def meta_prompt_generator():
+@traced()
+def meta_prompt_generator(stream=False):
     """
     Example: Generate a complete prompt from requirements
 
     📖 STORY CONTEXT - Day 14 (continued):
     Generate a prompt for classifying defect cases using Aditya's case as reference.
+
+    stream=True prints the generated prompt system as it is written.
     """
 
     requirements = """
@@ -159,7 +161,7 @@ def meta_prompt_generator():
     Make the prompt professional, clear, and optimized for accuracy.
     """
 
-    response = client.responses.create(
+    params = dict(
         model="gpt-5.2",
         input=[{"role": "user", "content": meta_prompt}],
         temperature=0.7,
@@ -167,9 +169,10 @@ def meta_prompt_generator():
     )
 
     print("Generated Complete Prompt System:\n" + "="*50)
-    print(response.output_text)
+    print_response(params, stream)
     print("\n" + "="*50 + "\n")
 
+@traced()
 def meta_prompt_debugger():
     """
     Example: Debug why a prompt isn't working
@@ -204,7 +207,7 @@ def meta_prompt_debugger():
     5. Recommend monitoring approach for production use
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": meta_prompt}],
         temperature=0.7
@@ -214,6 +217,7 @@ def meta_prompt_debugger():
     print(response.output_text)
     print("\n" + "="*50 + "\n")
 
+@traced()
 def meta_prompt_ab_test_design():
     """
     Example: Design A/B test for prompt variations
@@ -240,7 +244,7 @@ def meta_prompt_ab_test_design():
     5. Implementation advice: How to run this test efficiently
     """
 
-    response = client.responses.create(
+    response = create_response(
         model="gpt-5.2",
         input=[{"role": "user", "content": meta_prompt}],
         temperature=0.7,
@@ -254,6 +258,6 @@ def meta_prompt_ab_test_design():
 if __name__ == "__main__":
     # meta_prompt_optimizer()
     # meta_prompt_strategy_selector()
-    meta_prompt_generator()
+    meta_prompt_generator(stream=True)
     # meta_prompt_debugger()
     # meta_prompt_ab_test_design()
\ No newline at end of file
@@ -0,0 +1,224 @@
+"""
+Concurrent ReAct agent runtime
+
+Runs many customer-service ReAct conversations (one per ticket) at the same
+time on one event loop:
+- every agent has its own iteration cap and compacted Conversation
+- model calls from all agents share one global concurrency limit
+- all agents share one ToolRegistry over CustomerServiceTools (and its store
+  and tool result cache); with batch_window set, order / inventory lookups
+  from all agents are gathered into bulk queries (see batching.py). The
+  batching wrapper and the registry belong to the runtime: the store used by
+  07_react's own examples is left as it is
+- at most `max_agents` tickets are in progress at once
+
+    with AgentRuntime(max_model_calls=32) as runtime:
+        report = runtime.run(tickets)     # tickets: [{"id": ..., "message": ...}]
+    print(report["tickets_per_minute"], report["latency_p95"])
+
+Usage:
+    python agent_runtime.py --tickets 200 --max-model-calls 32 --fake
+"""
+import argparse
+import asyncio
+import importlib
+import random
+import time
+from collections import Counter
+
+import llm_client
+from batching import BatchingStore
+from conversation import Conversation
+from instrumentation import percentile, span
+from tools import ToolRegistry
+
+react = importlib.import_module("07_react")
+
+
+class AgentRuntime:
+    """
+    Schedules ReAct agents concurrently against shared tools
+
+    Parameters:
+    - tools: Shared ToolRegistry (default: one over a CustomerServiceTools
+      instance of this runtime; close() stops its cache invalidation)
+    - max_model_calls: Model calls in flight across all agents
+    - max_agents: Tickets in progress at once (None = all)
+    - max_iterations: Model turns per ticket before giving up
+    - token_budget, chain: Conversation compaction settings per agent
+    - model, temperature: Generation settings for every turn
+    - batch_window: Seconds to gather CustomerServiceTools store lookups into
+      one bulk query (None = one query per lookup)
+    """
+
+    def __init__(self, tools=None, max_model_calls=32, max_agents=None, max_iterations=5,
+                 token_budget=1500, chain=False, model="gpt-5.2", temperature=0.7, batch_window=0.002):
+        self.store = None
+        self._store_listener = None
+        if tools is None:
+            store = react.CustomerServiceTools.store
+            self.store = BatchingStore(store, window=batch_window) if batch_window else store
+            tools = ToolRegistry.from_object(react.CustomerServiceTools(self.store))
+            listener = react.invalidate_on_store_change(tools, store)
+            self._store_listener = (store, listener) if listener is not None else None
+        self.tools = tools
+        self.max_model_calls = max_model_calls
+        self.max_agents = max_agents
+        self.max_iterations = max_iterations
+        self.token_budget = token_budget
+        self.chain = chain
+        self.model = model
+        self.temperature = temperature
+
+    async def run_ticket(self, ticket, model_calls):
+        """Run one agent to a final answer (or its iteration cap); returns its result"""
+        started = time.perf_counter()
+        result = {"id": ticket["id"], "status": "max_iterations", "answer": None, "iterations": 0,
+                  "tool_calls": 0, "error": None}
+        conversation = Conversation(react.react_prompt(ticket["message"], self.tools),
+                                    token_budget=self.token_budget, chain=self.chain)
+        with span(f"ticket {ticket['id']}", technique="react_agent"):
+            try:
+                for iteration in range(self.max_iterations):
+                    params, sent_tokens = conversation.request_params()
+                    async with model_calls:
+                        with span(f"iteration {iteration + 1}"):
+                            response = await llm_client.acreate_response(
+                                model=self.model, temperature=self.temperature, **params
+                            )
+                    conversation.add_response(response, sent_tokens)
+                    result["iterations"] = iteration + 1
+
+                    assistant_message = response.output_text
+                    calls = self.tools.parse_actions(assistant_message)
+                    if not calls:
+                        if react.is_final_answer(assistant_message):
+                            result.update(status="resolved", answer=assistant_message)
+                            break
+                        conversation.add_message("Continue with your response.")
+                        continue
+                    result["tool_calls"] += len(calls)
+                    conversation.add_observations(await self.tools.adispatch(calls))
+            except Exception as e:
+                result.update(status="error", error=f"{type(e).__name__}: {e}")
+
+        result["latency"] = time.perf_counter() - started
+        result["sent_tokens"] = sum(row["sent_tokens"] for row in conversation.iterations)
+        result["input_tokens"] = sum(row["input_tokens"] or 0 for row in conversation.iterations)
+        return result
+
+    async def arun(self, tickets, on_result=None):
+        """
+        Run every ticket concurrently; returns a report with throughput,
+        latency percentiles, status counts and per-ticket results
+        """
+        model_calls = asyncio.Semaphore(self.max_model_calls)
+        agents = asyncio.Semaphore(self.max_agents or len(tickets) or 1)
+
+        async def run(ticket):
+            async with agents:
+                result = await self.run_ticket(ticket, model_calls)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run(ticket) for ticket in tickets))
+        elapsed = time.perf_counter() - started
+
+        latencies = [result["latency"] for result in results]
+        iterations = [result["iterations"] for result in results]
+        return {
+            "tickets": len(results),
+            "seconds": elapsed,
+            "tickets_per_minute": 60 * len(results) / elapsed if elapsed else 0.0,
+            "statuses": dict(Counter(result["status"] for result in results)),
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "latency_max": max(latencies, default=0.0),
+            "iterations_mean": sum(iterations) / len(iterations) if iterations else 0.0,
+            "tool_batching": self.batching_stats(),
+            "tool_cache": self.tools.cache.stats() if self.tools.cache is not None else {},
+            "results": results,
+        }
+
+    def batching_stats(self):
+        """Loader stats of this runtime's batched store ({} if not batched)"""
+        return self.store.stats() if isinstance(self.store, BatchingStore) else {}
+
+    def run(self, tickets, on_result=None):
+        """Sync wrapper around arun"""
+        return llm_client.run_async(self.arun(tickets, on_result))
+
+    def close(self):
+        """Stop invalidating this runtime's tool cache on store changes"""
+        if self._store_listener is not None:
+            store, listener = self._store_listener
+            store.remove_listener(listener)
+            self._store_listener = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+SAMPLE_ISSUES = [
+    "Both wireless mice are defective with clicking issues. I'd like a refund or replacement ASAP.",
+    "Where is my order? It was supposed to arrive last week.",
+    "Can I return the keyboard? It doesn't match my setup.",
+    "Is the gaming laptop back in stock? I want a second one.",
+]
+
+
+def sample_tickets(count, order_ids=("SM-2026-12345",), seed=0):
+    """Synthetic tickets spread over the given order ids"""
+    rng = random.Random(seed)
+    return [{"id": f"T-{number:05d}",
+             "message": f"Hi, I need help with order #{rng.choice(order_ids)}. {rng.choice(SAMPLE_ISSUES)}"}
+            for number in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many ReAct agents concurrently")
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--max-model-calls", type=int, default=32, help="Global limit on model calls in flight")
+    parser.add_argument("--max-agents", type=int, default=None, help="Tickets in progress at once")
+    parser.add_argument("--max-iterations", type=int, default=5)
+    parser.add_argument("--chain", action="store_true", help="Chain turns with previous_response_id")
+    parser.add_argument("--batch-window", type=float, default=0.002,
+                        help="Seconds to gather store lookups into one query (0 = no batching)")
+    parser.add_argument("--fake", action="store_true", help="Use an in-process fake server")
+    parser.add_argument("--latency", default="lognormal:0.3,0.4", help="Fake server latency spec")
+    args = parser.parse_args()
+
+    server = None
+    if args.fake:
+        import re
+        from bench_techniques import BENCH_RULES, DEFAULT_TEXT
+        from fake_responses_server import start_server
+        server = start_server(latency=args.latency, text=DEFAULT_TEXT,
+                              rules=[(re.compile(pattern), template) for pattern, template in BENCH_RULES])
+        llm_client.configure(base_url=server.base_url, api_key="fake-key",
+                             max_connections=args.max_model_calls, max_keepalive_connections=args.max_model_calls)
+
+    with AgentRuntime(max_model_calls=args.max_model_calls, max_agents=args.max_agents,
+                      max_iterations=args.max_iterations, chain=args.chain,
+                      batch_window=args.batch_window) as runtime:
+        report = runtime.run(sample_tickets(args.tickets))
+
+    print(f"{report['tickets']} tickets in {report['seconds']:.1f}s: {report['tickets_per_minute']:.0f} tickets/minute")
+    print(f"Statuses: {report['statuses']}, {report['iterations_mean']:.1f} model turns per ticket")
+    print(f"Latency per ticket: p50 {report['latency_p50']:.2f}s  p95 {report['latency_p95']:.2f}s  "
+          f"p99 {report['latency_p99']:.2f}s  max {report['latency_max']:.2f}s")
+    for loader, stats in report["tool_batching"].items():
+        print(f"Store {loader}: {stats['requests']} lookups in {stats['backend_calls']} backend queries "
+              f"({stats['calls_saved']} saved, {stats['coalesced']} coalesced), "
+              f"batch size mean {stats['mean_batch_size']:.1f} / max {stats['max_batch_size']}")
+    for tool, stats in report["tool_cache"].items():
+        print(f"Tool cache {tool}: {stats['hit_rate']:.0%} hits ({stats['hits']} of {stats['hits'] + stats['misses']})")
+
+    if server is not None:
+        server.shutdown()
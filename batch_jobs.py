@@ -0,0 +1,437 @@
+"""
+Bulk mode: run single-message techniques through the Batch API
+
+Turns a technique's per-message request (e.g. `classification_request` in
+10_structured_output.py) into Batch API JSONL files, submits them, polls until
+they finish and joins the results back to the input records by `custom_id`.
+Batch requests cost half of synchronous ones and don't count against the
+interactive rate limits, so this is the path for nightly backlogs.
+
+Every step is recorded in `<directory>/<job name>/state.json`, so a job that
+is interrupted (Ctrl-C, crash, reboot) continues where it stopped when run
+again with the same name: uploaded files and created batches are never sent
+twice, finished outputs are downloaded once, and requests that failed or
+expired are resubmitted in a retry batch.
+
+Usage:
+    python batch_jobs.py run --technique enum_classification --input messages.jsonl --job nightly
+    python batch_jobs.py status --job nightly
+    python batch_jobs.py results --job nightly --output results.jsonl
+    python batch_jobs.py run ... --fake   # against the local fake server's batch stand-in
+
+Input files are JSONL with {"id": ..., "text": ...} per line, or plain text
+with one message per line (ids are line numbers).
+"""
+import argparse
+import importlib
+import json
+import os
+import re
+import time
+
+import llm_client
+from instrumentation import estimate_cost
+
+# Technique name -> (module, request builder, answer parser)
+TECHNIQUES = {
+    "enum_classification": ("10_structured_output", "classification_request", "parse_category"),
+    "data_extraction": ("03_few_shot", "data_extraction_request", None),
+    "sentiment": ("01_zero_shot", "sentiment_request", None),
+}
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+MAX_REQUESTS_PER_BATCH = 50_000  # API limit per input file
+MAX_BYTES_PER_BATCH = 190 * 1024 * 1024  # API limit is 200 MB
+BATCH_DISCOUNT = 0.5
+
+
+def parse_json_answer(response_text):
+    """First JSON object in a response, or None"""
+    match = re.search(r"\{.*\}", response_text, re.S)
+    if match is None:
+        return None
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+
+
+def load_technique(name):
+    """Return (request builder, answer parser) for a technique name"""
+    if name not in TECHNIQUES:
+        raise ValueError(f"Unknown technique: {name} (choose from {', '.join(TECHNIQUES)})")
+    module_name, builder_name, parser_name = TECHNIQUES[name]
+    module = importlib.import_module(module_name)
+    if parser_name is not None:
+        parser = getattr(module, parser_name)
+    elif name == "data_extraction":
+        parser = parse_json_answer
+    else:
+        parser = str.strip
+    return getattr(module, builder_name), parser
+
+
+def read_records(path):
+    """Yield (id, text) from a JSONL or plain-text input file"""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                yield str(record.get("id", number)), record.get("text", record.get("message", ""))
+            else:
+                yield str(number), line
+
+
+def _output_text(body):
+    """output_text of a Response body in a batch output line"""
+    parts = []
+    for item in body.get("output", []):
+        if item.get("type") == "message":
+            parts += [part.get("text", "") for part in item.get("content", []) if part.get("type") == "output_text"]
+    return "".join(parts)
+
+
+class BatchJob:
+    """
+    A resumable batch run of one technique over many messages
+
+    Parameters:
+    - name: Job name; its state lives in `<directory>/<name>/`
+    - technique: Key of TECHNIQUES
+    - directory: Root directory for job state and files
+    - max_requests_per_batch: Requests per input file (one batch per file)
+    - completion_window: Batch completion window ("24h")
+    - max_attempts: How many times a failed/expired request is submitted in total
+    """
+
+    def __init__(self, name, technique=None, directory=".batch", max_requests_per_batch=MAX_REQUESTS_PER_BATCH,
+                 completion_window="24h", max_attempts=3):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self.max_requests_per_batch = max_requests_per_batch
+        self.completion_window = completion_window
+        self.max_attempts = max_attempts
+
+        state_path = os.path.join(self.path, "state.json")
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                self.state = json.load(f)
+            if technique and technique != self.state["technique"]:
+                raise ValueError(f"Job {name} was created for technique {self.state['technique']}")
+        else:
+            if technique is None:
+                raise ValueError(f"No job named {name} in {directory}; pass a technique to create it")
+            load_technique(technique)  # fail fast on an unknown name
+            self.state = {"technique": technique, "created_at": time.time(), "prepared": False, "shards": []}
+
+    @property
+    def shards(self):
+        return self.state["shards"]
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        temporary = os.path.join(self.path, "state.json.tmp")
+        with open(temporary, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(temporary, os.path.join(self.path, "state.json"))
+
+    def _file(self, kind, index):
+        return os.path.join(self.path, f"{kind}-{index:04d}.jsonl")
+
+    def _new_shard(self, retry_of=None, attempt=1):
+        shard = {"index": len(self.shards), "requests": 0, "file_id": None, "batch_id": None, "status": "prepared",
+                 "output_file_id": None, "error_file_id": None, "downloaded": False,
+                 "retry_of": retry_of, "attempt": attempt}
+        self.shards.append(shard)
+        return shard
+
+    # ---- Prepare -------------------------------------------------------
+
+    def prepare(self, records):
+        """
+        Write the batch input files for an iterable of (id, text)
+
+        Ids must be unique; they become the `custom_id` that joins results back.
+        Skipped if the job was already prepared (resuming).
+        """
+        if self.state["prepared"]:
+            return
+        build_request, _ = load_technique(self.state["technique"])
+        os.makedirs(self.path, exist_ok=True)
+
+        seen = set()
+        shard = requests_file = records_file = None
+        size = 0
+        try:
+            for record_id, text in records:
+                if record_id in seen:
+                    raise ValueError(f"Duplicate record id: {record_id}")
+                seen.add(record_id)
+                line = json.dumps({"custom_id": record_id, "method": "POST", "url": "/v1/responses",
+                                   "body": build_request(text)}) + "\n"
+                if shard is None or shard["requests"] >= self.max_requests_per_batch \
+                        or size + len(line) > MAX_BYTES_PER_BATCH:
+                    if shard is not None:
+                        requests_file.close()
+                        records_file.close()
+                    shard = self._new_shard()
+                    requests_file = open(self._file("requests", shard["index"]), "w", encoding="utf-8")
+                    records_file = open(self._file("records", shard["index"]), "w", encoding="utf-8")
+                    size = 0
+                requests_file.write(line)
+                records_file.write(json.dumps({"id": record_id, "text": text}) + "\n")
+                shard["requests"] += 1
+                size += len(line)
+        finally:
+            if shard is not None:
+                requests_file.close()
+                records_file.close()
+
+        self.state["prepared"] = True
+        self.save()
+
+    # ---- Submit / poll -------------------------------------------------
+
+    def submit(self):
+        """Upload and create a batch for every shard that doesn't have one yet"""
+        client = llm_client.get_client()
+        for shard in self.shards:
+            if shard["file_id"] is None:
+                with open(self._file("requests", shard["index"]), "rb") as f:
+                    shard["file_id"] = client.files.create(file=f, purpose="batch").id
+                self.save()
+            if shard["batch_id"] is None:
+                batch = client.batches.create(
+                    input_file_id=shard["file_id"],
+                    endpoint="/v1/responses",
+                    completion_window=self.completion_window,
+                    metadata={"job": self.name, "shard": str(shard["index"])},
+                )
+                shard.update(batch_id=batch.id, status=batch.status)
+                self.save()
+
+    def refresh(self):
+        """Poll unfinished batches; download outputs of the ones that finished"""
+        client = llm_client.get_client()
+        for shard in self.shards:
+            if shard["batch_id"] is None or shard["downloaded"]:
+                continue
+            batch = client.batches.retrieve(shard["batch_id"])
+            shard.update(status=batch.status, output_file_id=batch.output_file_id,
+                         error_file_id=batch.error_file_id, request_counts=batch.request_counts.to_dict()
+                         if batch.request_counts else None)
+            if batch.status in TERMINAL_STATUSES:
+                # Expired and cancelled batches still return the requests they finished
+                for kind, file_id in (("output", batch.output_file_id), ("errors", batch.error_file_id)):
+                    if file_id:
+                        self._download(client, file_id, self._file(kind, shard["index"]))
+                shard["downloaded"] = True
+            self.save()
+
+    def _download(self, client, file_id, path):
+        temporary = path + ".tmp"
+        with client.files.with_streaming_response.content(file_id) as response, open(temporary, "wb") as f:
+            for chunk in response.iter_bytes():
+                f.write(chunk)
+        os.replace(temporary, path)
+
+    def done(self):
+        return all(shard["downloaded"] for shard in self.shards)
+
+    def wait(self, poll_interval=10.0, max_poll_interval=300.0, timeout=None, on_poll=None):
+        """Poll until every batch finished, backing off up to max_poll_interval"""
+        started = time.monotonic()
+        interval = poll_interval
+        while True:
+            self.refresh()
+            if on_poll is not None:
+                on_poll(self)
+            if self.done():
+                return
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"Batch job {self.name} not finished after {timeout:.0f}s")
+            time.sleep(interval)
+            interval = min(max_poll_interval, interval * 1.5)
+
+    # ---- Retry ---------------------------------------------------------
+
+    def _outputs(self, shard):
+        """custom_id -> output line of a downloaded shard (successful requests only)"""
+        outputs = {}
+        path = self._file("output", shard["index"])
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    response = record.get("response") or {}
+                    if response.get("status_code") == 200:
+                        outputs[record["custom_id"]] = record
+        return outputs
+
+    def _family(self, shard):
+        """A shard plus the retry shards created for it"""
+        root = shard["index"]
+        return [s for s in self.shards if s["index"] == root or self._root(s) == root]
+
+    def _root(self, shard):
+        while shard["retry_of"] is not None:
+            shard = self.shards[shard["retry_of"]]
+        return shard["index"]
+
+    def retry_failed(self):
+        """
+        Create retry shards for requests with no successful output
+
+        Returns the number of requests queued for another attempt.
+        """
+        queued = 0
+        for shard in list(self.shards):
+            if not shard["downloaded"] or shard.get("retried") or shard["attempt"] >= self.max_attempts:
+                continue
+            succeeded = set(self._outputs(shard))
+            retry = None
+            with open(self._file("requests", shard["index"]), encoding="utf-8") as requests_file:
+                for line in requests_file:
+                    if json.loads(line)["custom_id"] in succeeded:
+                        continue
+                    if retry is None:
+                        retry = self._new_shard(retry_of=shard["index"], attempt=shard["attempt"] + 1)
+                        retry_file = open(self._file("requests", retry["index"]), "w", encoding="utf-8")
+                    retry_file.write(line)
+                    retry["requests"] += 1
+            if retry is not None:
+                retry_file.close()
+                queued += retry["requests"]
+            shard["retried"] = True
+            self.save()
+        return queued
+
+    # ---- Results -------------------------------------------------------
+
+    def results(self):
+        """
+        Yield one record per input message, in input order:
+        {"id", "input", "answer" (parsed), "text", "usage", "error"}
+        """
+        _, parse = load_technique(self.state["technique"])
+        for shard in self.shards:
+            if shard["retry_of"] is not None:
+                continue
+            outputs = {}
+            for member in self._family(shard):
+                outputs.update(self._outputs(member))
+            with open(self._file("records", shard["index"]), encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    output = outputs.get(record["id"])
+                    if output is None:
+                        yield {"id": record["id"], "input": record["text"], "answer": None, "text": None,
+                               "usage": None, "error": "no successful response"}
+                        continue
+                    body = output["response"]["body"]
+                    text = _output_text(body)
+                    yield {"id": record["id"], "input": record["text"], "answer": parse(text), "text": text,
+                           "usage": body.get("usage"), "error": None}
+
+    def summary(self):
+        """Request counts, tokens and estimated cost (batch vs synchronous pricing)"""
+        totals = {"requests": 0, "succeeded": 0, "failed": 0, "input_tokens": 0, "cached_tokens": 0,
+                  "output_tokens": 0, "cost_usd": 0.0, "sync_cost_usd": 0.0}
+        for result in self.results():
+            totals["requests"] += 1
+            if result["error"]:
+                totals["failed"] += 1
+                continue
+            totals["succeeded"] += 1
+            usage = result["usage"] or {}
+            input_tokens = usage.get("input_tokens", 0)
+            cached_tokens = (usage.get("input_tokens_details") or {}).get("cached_tokens", 0)
+            output_tokens = usage.get("output_tokens", 0)
+            totals["input_tokens"] += input_tokens
+            totals["cached_tokens"] += cached_tokens
+            totals["output_tokens"] += output_tokens
+            cost = estimate_cost(self._model(), input_tokens, cached_tokens, output_tokens) or 0.0
+            totals["sync_cost_usd"] += cost
+            totals["cost_usd"] += cost * BATCH_DISCOUNT
+        return totals
+
+    def _model(self):
+        if "model" not in self.state:
+            with open(self._file("requests", 0), encoding="utf-8") as f:
+                self.state["model"] = json.loads(f.readline())["body"].get("model", llm_client.DEFAULT_MODEL)
+        return self.state["model"]
+
+    # ---- Whole run -----------------------------------------------------
+
+    def run(self, records=None, poll_interval=10.0, max_poll_interval=300.0, timeout=None, on_poll=None):
+        """Prepare (unless resuming), submit, wait and retry failures until done"""
+        if not self.state["prepared"]:
+            self.prepare(records)
+        while True:
+            self.submit()
+            self.wait(poll_interval, max_poll_interval, timeout, on_poll)
+            if not self.retry_failed():
+                return self.summary()
+
+
+def print_status(job):
+    for shard in job.shards:
+        counts = shard.get("request_counts") or {}
+        retry = f" (retry of {shard['retry_of']})" if shard["retry_of"] is not None else ""
+        print(f"  shard {shard['index']}{retry}: {shard['status']:<11} {counts.get('completed', 0)}/"
+              f"{shard['requests']} done, {counts.get('failed', 0)} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a single-message technique through the Batch API")
+    parser.add_argument("command", choices=["run", "submit", "status", "results"])
+    parser.add_argument("--job", required=True, help="Job name (state kept in <directory>/<job>)")
+    parser.add_argument("--technique", choices=sorted(TECHNIQUES))
+    parser.add_argument("--input", help="Input file (.jsonl with id/text, or one message per line)")
+    parser.add_argument("--output", help="Write joined results as JSONL (default: print them)")
+    parser.add_argument("--directory", default=".batch")
+    parser.add_argument("--batch-size", type=int, default=MAX_REQUESTS_PER_BATCH, help="Requests per batch")
+    parser.add_argument("--poll-interval", type=float, default=10.0)
+    parser.add_argument("--fake", action="store_true", help="Use an in-process fake server")
+    args = parser.parse_args()
+
+    server = None
+    if args.fake:
+        from fake_responses_server import start_server
+        server = start_server(batch_delay=1.0)
+        llm_client.configure(base_url=server.base_url, api_key="fake-key")
+        args.poll_interval = min(args.poll_interval, 0.5)
+
+    job = BatchJob(args.job, args.technique, args.directory, args.batch_size)
+    if args.command in ("run", "submit") and not job.state["prepared"]:
+        if not args.input:
+            parser.error("--input is required for a new job")
+        job.prepare(read_records(args.input))
+
+    if args.command == "submit":
+        job.submit()
+        print_status(job)
+    elif args.command == "status":
+        job.refresh()
+        print_status(job)
+    elif args.command == "run":
+        summary = job.run(poll_interval=args.poll_interval, on_poll=print_status)
+        print(f"\n{summary['succeeded']}/{summary['requests']} succeeded, {summary['failed']} failed")
+        print(f"Tokens: {summary['input_tokens']:,} in / {summary['output_tokens']:,} out")
+        print(f"Estimated cost: ${summary['cost_usd']:.4f} (synchronous: ${summary['sync_cost_usd']:.4f})")
+
+    if args.command in ("run", "results"):
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                for result in job.results():
+                    f.write(json.dumps(result) + "\n")
+            print(f"Results written to {args.output}")
+        elif args.command == "results":
+            for result in job.results():
+                print(json.dumps({"id": result["id"], "answer": result["answer"], "error": result["error"]}))
+
+    if server is not None:
+        server.shutdown()
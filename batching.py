@@ -0,0 +1,189 @@
+"""
+Request batching and coalescing for tool backends (DataLoader-style)
+
+With many agents running at once, each lookup_order / check_inventory /
+check_return_eligibility call is its own backend query, even when dozens of
+agents ask for the same keys in the same instant. BatchLoader sits in front of
+a bulk lookup function:
+- keys requested within `window` seconds are gathered into one bulk call
+  (sooner if `max_batch` keys are waiting)
+- identical keys share one slot, including keys already being fetched
+- every caller blocks only for its own keys and gets its own results back
+
+The thread that opens a batch waits out the window and runs it, so there is no
+background thread; tools keep running in the ToolRegistry's worker threads.
+
+    store = BatchingStore(open_store())
+    store.get_order("SM-2026-12345")  # batched with concurrent callers
+    store.stats()  # {"orders": {"requests": ..., "backend_calls": ..., ...}}
+
+Stats are exported on the Prometheus endpoint (see instrumentation.py) as
+tool_batch_* series labelled by loader.
+"""
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import instrumentation
+
+_loaders = weakref.WeakSet()
+
+
+class BatchLoader:
+    """
+    Gathers single-key loads into bulk calls
+
+    Parameters:
+    - batch_fn: function(list of keys) -> {key: value}; missing keys load as None
+    - name: Label for stats and metrics
+    - window: Seconds to wait for more keys after the first one arrives
+    - max_batch: Run the batch early once this many distinct keys are waiting
+    """
+
+    def __init__(self, batch_fn, name="loader", window=0.002, max_batch=500):
+        self.batch_fn = batch_fn
+        self.name = name
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending = None  # {key: Future} of the batch still collecting keys
+        self._inflight = {}  # key -> Future of batches being fetched
+        self._requests = 0
+        self._coalesced = 0
+        self._backend_calls = 0
+        self._fetched = 0
+        self._largest = 0
+        _loaders.add(self)
+
+    def load(self, key):
+        return self.load_many([key])[key]
+
+    def load_many(self, keys):
+        """{key: value} for all keys, fetched together with concurrent callers"""
+        keys = list(keys)
+        futures, full, opened = {}, [], None
+        with self._lock:
+            self._requests += len(keys)
+            for key in keys:
+                if key in futures:
+                    self._coalesced += 1
+                    continue
+                future = self._inflight.get(key)
+                if future is None and self._pending is not None:
+                    future = self._pending.get(key)
+                if future is not None:
+                    self._coalesced += 1
+                    futures[key] = future
+                    continue
+                if self._pending is None:
+                    self._pending = opened = {}
+                future = futures[key] = self._pending[key] = Future()
+                if len(self._pending) >= self.max_batch:
+                    full.append(self._close())
+
+        for batch in full:
+            self._run(batch)
+        if opened is not None and not any(batch is opened for batch in full):
+            time.sleep(self.window)
+            with self._lock:
+                batch = self._close() if self._pending is opened else None
+            if batch is not None:
+                self._run(batch)
+        return {key: futures[key].result() for key in keys}
+
+    def _close(self):
+        # Called with the lock held: stop collecting, make the keys joinable while fetched
+        batch, self._pending = self._pending, None
+        self._inflight.update(batch)
+        return batch
+
+    def _run(self, batch):
+        try:
+            found = self.batch_fn(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+        else:
+            for key, future in batch.items():
+                future.set_result(found.get(key))
+        finally:
+            with self._lock:
+                self._backend_calls += 1
+                self._fetched += len(batch)
+                self._largest = max(self._largest, len(batch))
+                for key, future in batch.items():
+                    if self._inflight.get(key) is future:
+                        del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "coalesced": self._coalesced,
+                "backend_calls": self._backend_calls,
+                "calls_saved": self._requests - self._backend_calls,
+                "mean_batch_size": self._fetched / self._backend_calls if self._backend_calls else 0.0,
+                "max_batch_size": self._largest,
+            }
+
+
+class BatchingStore:
+    """
+    Order / inventory store (see order_store.py) with batched point lookups
+
+    get_order / get_inventory go through loaders over the wrapped store's bulk
+    get_orders / get_inventories; anything else is passed through.
+    """
+
+    def __init__(self, store, window=0.002, max_batch=500):
+        self.store = store
+        self.orders = BatchLoader(store.get_orders, "orders", window, max_batch)
+        self.inventory = BatchLoader(store.get_inventories, "inventory", window, max_batch)
+
+    def get_order(self, order_id):
+        return self.orders.load(order_id)
+
+    def get_orders(self, order_ids):
+        return {key: value for key, value in self.orders.load_many(order_ids).items() if value is not None}
+
+    def get_inventory(self, product_name):
+        return self.inventory.load(product_name)
+
+    def get_inventories(self, product_names):
+        return {key: value for key, value in self.inventory.load_many(product_names).items() if value is not None}
+
+    def stats(self):
+        return {"orders": self.orders.stats(), "inventory": self.inventory.stats()}
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
+def _batching_metrics():
+    # Summed per loader name: every BatchingStore (e.g. one per agent runtime) has its own loaders
+    totals = {}
+    for loader in list(_loaders):
+        s = loader.stats()
+        total = totals.setdefault(loader.name, {"requests": 0, "backend_calls": 0, "calls_saved": 0, "fetched": 0})
+        for key in ("requests", "backend_calls", "calls_saved"):
+            total[key] += s[key]
+        total["fetched"] += s["mean_batch_size"] * s["backend_calls"]
+    if not totals:
+        return []
+    for total in totals.values():
+        total["mean_batch_size"] = total["fetched"] / total["backend_calls"] if total["backend_calls"] else 0.0
+    stats = list(totals.items())
+    return [
+        ("tool_batch_requests_total", "counter", "Keys requested from batched tool backends",
+         [({"loader": name}, s["requests"]) for name, s in stats]),
+        ("tool_batch_backend_calls_total", "counter", "Bulk backend queries run",
+         [({"loader": name}, s["backend_calls"]) for name, s in stats]),
+        ("tool_batch_calls_saved_total", "counter", "Backend queries avoided by batching and coalescing",
+         [({"loader": name}, s["calls_saved"]) for name, s in stats]),
+        ("tool_batch_size_mean", "gauge", "Mean distinct keys per bulk query",
+         [({"loader": name}, s["mean_batch_size"]) for name, s in stats]),
+    ]
+
+
+instrumentation.metrics.register_collector(_batching_metrics)
@@ -0,0 +1,73 @@
+"""
+Benchmark the shared client layer against the local fake endpoint
+
+Measures requests/second at 1, 8 and 64 concurrent callers for the pooled
+sync client (thread pool) and the pooled async client (asyncio tasks).
+
+Usage:
+    python bench_client.py [--requests 512] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import llm_client
+from fake_responses_server import start_server
+
+CONCURRENCY_LEVELS = [1, 8, 64]
+
+
+def bench_sync(num_requests, concurrency):
+    def call(_):
+        llm_client.get_completion("ping", max_output_tokens=16)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(concurrency)))  # warm up the connection pool
+        start = time.perf_counter()
+        list(pool.map(call, range(num_requests)))
+    return num_requests / (time.perf_counter() - start)
+
+
+async def _bench_async(num_requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call():
+        async with semaphore:
+            await llm_client.aget_completion("ping", max_output_tokens=16)
+
+    await asyncio.gather(*(call() for _ in range(concurrency)))  # warm up the connection pool
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(num_requests)))
+    return num_requests / (time.perf_counter() - start)
+
+
+def bench_async(num_requests, concurrency):
+    return llm_client.run_async(_bench_async(num_requests, concurrency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=512, help="Requests per measurement")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated server latency (seconds)")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    llm_client.configure(
+        base_url=server.base_url,
+        api_key="fake-key",
+        max_connections=max(CONCURRENCY_LEVELS),
+        max_keepalive_connections=max(CONCURRENCY_LEVELS),
+    )
+
+    print(f"Fake endpoint: {server.base_url} (latency {args.latency * 1000:.0f} ms)")
+    print(f"{'Concurrency':>11} | {'sync req/s':>10} | {'async req/s':>11}")
+    print("-" * 38)
+    for concurrency in CONCURRENCY_LEVELS:
+        # Fewer requests at concurrency 1, otherwise it dominates the run time
+        num_requests = args.requests if concurrency > 1 else max(32, args.requests // 8)
+        sync_rps = bench_sync(num_requests, concurrency)
+        async_rps = bench_async(num_requests, concurrency)
+        print(f"{concurrency:>11} | {sync_rps:>10.1f} | {async_rps:>11.1f}")
+
+    server.shutdown()
@@ -0,0 +1,129 @@
+"""
+Micro-benchmark for the order / inventory store
+
+Bulk-loads synthetic orders and SKUs into a SQLite store, then measures point
+lookup latency (p50/p99 in microseconds) for orders, inventory and batched
+order lookups, next to the old approach of rebuilding the dict literal on
+every call.
+
+Usage:
+    python bench_order_store.py [--orders 1000000] [--inventory 100000] [--lookups 100000]
+    python bench_order_store.py --keep .cache/orders.sqlite3   # keep the file for ORDER_STORE
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from order_store import SQLiteStore, MemoryStore, bulk_load, generate_orders, generate_inventory
+
+
+def old_lookup_order(order_id):
+    """The pre-store implementation: the dict literal is rebuilt on every call"""
+    orders = {
+        "SM-2026-12345": {
+            "customer": "Aditya Patel",
+            "email": "aditya.p@techcorp.com",
+            "status": "delivered",
+            "items": {
+                "Gaming Laptop": {"price": 1299.00, "qty": 1, "status": "no issues"},
+                "Wireless Mouse": {"price": 49.99, "qty": 2, "status": "defective - reported Feb 16"},
+                "Mechanical RGB Keyboard": {"price": 89.99, "qty": 1, "status": "no issues"}
+            },
+            "subtotal": 1488.97,
+            "discount": -148.90,
+            "shipping": 8.50,
+            "total": 1348.57,
+            "order_date": "2026-02-10",
+            "delivery_date": "2026-02-15",
+            "tracking": "TRACK-SM-12345"
+        }
+    }
+    return orders.get(order_id, {"error": "Order not found"})
+
+
+def measure(function, keys):
+    """Per-call latencies in microseconds"""
+    latencies = []
+    clock = time.perf_counter_ns
+    for key in keys:
+        start = clock()
+        function(key)
+        latencies.append((clock() - start) / 1000)
+    latencies.sort()
+    return latencies
+
+
+def report(name, latencies):
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+    mean = sum(latencies) / len(latencies)
+    print(f"{name:<40} {pct(50):>8.1f} {pct(99):>8.1f} {mean:>8.1f} {1e6 / mean:>10,.0f}")
+
+
+def random_order_ids(count, num_orders, rng, miss_rate=0.1):
+    ids = []
+    for _ in range(count):
+        if rng.random() < miss_rate:
+            ids.append(f"SM-1999-{rng.randrange(10 ** 7):07d}")  # never exists
+        else:
+            number = rng.randrange(num_orders - 1)
+            ids.append(f"SM-{2020 + number % 7}-{number:07d}")
+    return ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark order store lookups")
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--inventory", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--threads", type=int, default=8, help="Threads for the throughput run")
+    parser.add_argument("--keep", help="Write the store here and keep it (default: temporary file)")
+    args = parser.parse_args()
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(), "orders.sqlite3")
+    start = time.perf_counter()
+    loaded = bulk_load(path, generate_orders(args.orders), generate_inventory(args.inventory))
+    load_seconds = time.perf_counter() - start
+    print(f"Bulk load: {loaded:,} orders + {args.inventory:,} SKUs in {load_seconds:.1f}s "
+          f"({loaded / load_seconds:,.0f} orders/s), {os.path.getsize(path) / 2 ** 20:.0f} MB")
+
+    store = SQLiteStore(path)
+    rng = random.Random(1)
+    order_ids = random_order_ids(args.lookups, args.orders, rng)
+    products = [f"SKU-{rng.randrange(args.inventory - 3):07d}" for _ in range(args.lookups)]
+    # Inventory keys carry the product name suffix; look them up exactly
+    product_names = {}
+    for name, _ in generate_inventory(args.inventory):
+        product_names[name.split(" ", 1)[0]] = name
+    products = [product_names[product] for product in products]
+
+    measure(store.get_order, order_ids[:1000])  # warm up the page cache / mmap
+
+    print(f"\n{'Lookup':<40} {'p50 us':>8} {'p99 us':>8} {'mean us':>8} {'per second':>10}")
+    print("-" * 78)
+    report("old: rebuild dict literal per call", measure(old_lookup_order, ["SM-2026-12345"] * args.lookups))
+    memory = MemoryStore()
+    report("MemoryStore.get_order (demo data)", measure(memory.get_order, ["SM-2026-12345"] * args.lookups))
+    report(f"SQLiteStore.get_order ({loaded:,} orders)", measure(store.get_order, order_ids))
+    report(f"SQLiteStore.get_inventory ({args.inventory:,} SKUs)", measure(store.get_inventory, products))
+    batches = [order_ids[i:i + 100] for i in range(0, len(order_ids), 100)]
+    batch_latencies = measure(store.get_orders, batches)
+    report("SQLiteStore.get_orders (100 ids, per id)", [latency / 100 for latency in batch_latencies])
+
+    def worker(ids):
+        for order_id in ids:
+            store.get_order(order_id)
+
+    chunks = [order_ids[i::args.threads] for i in range(args.threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(worker, chunks))
+    elapsed = time.perf_counter() - start
+    print(f"\n{args.threads} threads: {len(order_ids) / elapsed:,.0f} order lookups/s")
+
+    store.close()
+    if not args.keep:
+        os.remove(path)
@@ -0,0 +1,270 @@
+"""
+End-to-end benchmark of every prompting technique
+
+Runs each technique function against the local fake Responses API (or any
+other endpoint via --base-url, e.g. a replay server) and reports per task:
+- model calls, input tokens and output tokens
+- wall-clock latency p50/p95/p99 (one task at a time)
+- local CPU time spent outside the model (prompt building, parsing, SDK overhead)
+- throughput and latency under concurrency
+
+Results are written to a JSON file; pass a previous file with --baseline to
+flag regressions between versions (non-zero exit code).
+
+Usage:
+    python bench_techniques.py [--iterations 20] [--concurrency 16] [--only react,self_consistency]
+    python bench_techniques.py --baseline bench_results_v1.json --output bench_results_v2.json
+"""
+import argparse
+import contextlib
+import contextvars
+import importlib
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import llm_client
+from fake_responses_server import start_server
+from instrumentation import percentile
+
+# (module, function) for every technique example that is benchmarked
+TECHNIQUES = [
+    ("01_zero_shot", "zero_shot_example"),
+    ("01_zero_shot", "zero_shot_sentiment"),
+    ("02_one_shot", "one_shot_example"),
+    ("02_one_shot", "one_shot_json_format"),
+    ("03_few_shot", "few_shot_classification"),
+    ("03_few_shot", "few_shot_response_generation"),
+    ("03_few_shot", "few_shot_data_extraction"),
+    ("04_chain_of_thoughts", "chain_of_thought_basic"),
+    ("04_chain_of_thoughts", "chain_of_thought_few_shot"),
+    ("05_persona_based", "persona_technical_expert"),
+    ("05_persona_based", "persona_comparison"),
+    ("06_self_consistency", "self_consistency_refund_calculation"),
+    ("06_self_consistency", "self_consistency_priority_classification"),
+    ("06_self_consistency", "self_consistency_decision_making"),
+    ("07_react", "react_customer_inquiry"),
+    ("08_tree_of_thoughts", "tree_of_thoughts_decision"),
+    ("08_tree_of_thoughts", "tree_of_thoughts_scaling_strategy"),
+    ("09_prompt_chaining", "prompt_chain_customer_email_processing"),
+    ("09_prompt_chaining", "prompt_chain_product_description"),
+    ("10_structured_output", "structured_json_extraction"),
+    ("10_structured_output", "structured_enum_classification"),
+    ("10_structured_output", "structured_with_schema_validation"),
+    ("11_Meta_prompting", "meta_prompt_optimizer"),
+    ("11_Meta_prompting", "meta_prompt_generator"),
+]
+
+# Fake backend answers, so each technique follows its real control flow
+# (first matching regex wins; braces are doubled because templates use str.format)
+BENCH_RULES = [
+    (r"Observation:", "Thought: I have everything I need.\nFinal Answer: Your refund of $89.98 has been approved."),
+    (r"Available Actions", 'Thought: I need the order and the return policy.\nAction: lookup_order("SM-2026-12345")\n'
+                           'Action: check_return_eligibility(order_id="SM-2026-12345")'),
+    (r"DECISION: \[YES/NO\]", "The defect is our fault and the customer is new, so loyalty outweighs $35.\nDECISION: YES"),
+    (r"\[LOW/MEDIUM/HIGH/CRITICAL\]", "Deadline tomorrow and a defect: HIGH"),
+    (r"EXACTLY ONE of these categories", "ORDER_STATUS"),
+    (r"Required JSON schema",
+     '{{"customer": {{"name": "Aditya Patel", "email": "aditya.p@techcorp.com", "phone": "555-0199", '
+     '"lifetime_value": 1348.57, "total_orders": 1}}, "order": {{"order_id": "SM-2026-12345", '
+     '"date": "2026-02-10", "items": [{{"product": "Gaming Laptop", "quantity": 1, "unit_price": 1299.0}}], '
+     '"total_amount": 1348.57}}, "issue": {{"description": "Defective mice", "category": "product defect", '
+     '"sentiment": "positive", "resolution_requested": ["replacement"]}}}}'),
+    (r"ticket_id",
+     '{{"ticket_id": "TKT-123456", "created_at": "2026-02-23T10:00:00Z", "priority": "HIGH", '
+     '"category": "Hardware", "subcategory": "Display", "customer": {{"id": "C-1", "tier": "GOLD"}}, '
+     '"issue": {{"title": "Flickering screen", "description": "Screen flickers", "product_affected": "Laptop", '
+     '"impact": "MAJOR"}}, "sla": {{"response_time_hours": 4, "resolution_time_hours": 48}}, '
+     '"assignment": {{"team": "Hardware", "agent_id": null}}, "tags": ["laptop"], "requires_escalation": true}}'),
+    (r"Respond with only valid JSON",
+     '{{"customer_name": "Aditya Patel", "customer_email": "aditya.p@techcorp.com", "order_id": "SM-2026-12345", '
+     '"issues": ["confirm case resolved", "gaming headset deals"], "urgency_level": "low", '
+     '"sentiment": "positive", "deadline": null}}'),
+]
+DEFAULT_TEXT = ("Here is a thorough answer. " * 40).strip()
+
+current_task = contextvars.ContextVar("current_task", default=None)
+
+
+def record_call(params, response, seconds, cached):
+    """llm_client call listener: add the call to the running task's totals"""
+    task = current_task.get()
+    if task is None:
+        return
+    task["calls"] += 1
+    task["cached_calls"] += int(cached)
+    usage = getattr(response, "usage", None)
+    if usage is not None and not cached:
+        task["input_tokens"] += usage.input_tokens or 0
+        task["output_tokens"] += usage.output_tokens or 0
+
+
+def run_task(function):
+    """Run one technique invocation; returns its measurements"""
+    task = {"calls": 0, "cached_calls": 0, "input_tokens": 0, "output_tokens": 0, "error": None}
+    current_task.set(task)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        function()
+    except Exception as e:
+        task["error"] = f"{type(e).__name__}: {e}"
+    else:
+        if not task["calls"]:
+            # Every technique calls the model; none recorded means calls ended without a response
+            task["error"] = "no completed model calls recorded"
+    task["cpu_seconds"] = time.thread_time() - cpu_start
+    task["seconds"] = time.perf_counter() - wall_start
+    current_task.set(None)
+    return task
+
+
+def summarize(sequential, concurrent, concurrent_seconds, concurrency):
+    def mean(key, tasks):
+        return sum(task[key] for task in tasks) / len(tasks)
+
+    latencies = [task["seconds"] for task in sequential]
+    concurrent_latencies = [task["seconds"] for task in concurrent]
+    errors = [task["error"] for task in sequential + concurrent if task["error"]]
+    return {
+        "tasks": len(sequential),
+        "calls_per_task": mean("calls", sequential),
+        "cached_calls_per_task": mean("cached_calls", sequential),
+        "input_tokens_per_task": mean("input_tokens", sequential),
+        "output_tokens_per_task": mean("output_tokens", sequential),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "cpu_ms_per_task": 1000 * mean("cpu_seconds", sequential),
+        "concurrency": concurrency,
+        "throughput_tasks_per_s": len(concurrent) / concurrent_seconds if concurrent_seconds else 0.0,
+        "concurrent_latency_p50": percentile(concurrent_latencies, 50),
+        "concurrent_latency_p95": percentile(concurrent_latencies, 95),
+        "concurrent_latency_p99": percentile(concurrent_latencies, 99),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def bench_technique(function, iterations, concurrency):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        run_task(function)  # warm up: imports, connection pool, first-call setup
+        sequential = [run_task(function) for _ in range(iterations)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            concurrent = list(pool.map(lambda _: run_task(function), range(iterations)))
+        concurrent_seconds = time.perf_counter() - start
+
+    return summarize(sequential, concurrent, concurrent_seconds, concurrency)
+
+
+# Metrics where a higher value in the new run is a regression
+REGRESSION_METRICS = ["calls_per_task", "input_tokens_per_task", "output_tokens_per_task",
+                      "latency_p95", "cpu_ms_per_task", "concurrent_latency_p95"]
+
+
+def compare(results, baseline, tolerance):
+    """List (technique, metric, old, new) that got worse by more than `tolerance`"""
+    regressions = []
+    for name, metrics in results["techniques"].items():
+        old_metrics = baseline.get("techniques", {}).get(name)
+        if not old_metrics:
+            continue
+        for metric in REGRESSION_METRICS:
+            old, new = old_metrics.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > 1e-3:
+                regressions.append((name, metric, old, new))
+        old_throughput = old_metrics.get("throughput_tasks_per_s")
+        if old_throughput and metrics["throughput_tasks_per_s"] < old_throughput * (1 - tolerance):
+            regressions.append((name, "throughput_tasks_per_s", old_throughput, metrics["throughput_tasks_per_s"]))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every prompting technique")
+    parser.add_argument("--iterations", type=int, default=20, help="Tasks per technique (per phase)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent tasks in the throughput phase")
+    parser.add_argument("--only", help="Comma-separated substrings of technique names to run")
+    parser.add_argument("--base-url", help="Benchmark this endpoint instead of the built-in fake server")
+    parser.add_argument("--latency", default="lognormal:0.05,0.3", help="Fake server time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Fake server generation speed")
+    parser.add_argument("--use-cache", action="store_true", help="Keep the response cache enabled")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    server = None
+    if args.base_url:
+        llm_client.configure(base_url=args.base_url)
+    else:
+        server = start_server(
+            latency=args.latency,
+            tokens_per_second=args.tokens_per_second,
+            text=DEFAULT_TEXT,
+            rules=[(re.compile(pattern), template) for pattern, template in BENCH_RULES],
+        )
+        llm_client.configure(base_url=server.base_url, api_key="fake-key")
+    llm_client.response_cache.enabled = args.use_cache
+    llm_client.add_call_listener(record_call)
+
+    selected = [(module, name) for module, name in TECHNIQUES
+                if not args.only or any(part in name for part in args.only.split(","))]
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "backend": args.base_url or {"fake_server": True, "latency": args.latency,
+                                     "tokens_per_second": args.tokens_per_second},
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "techniques": {},
+    }
+
+    print(f"{'Technique':<42} {'calls':>5} {'in tok':>7} {'out tok':>7} {'p50 s':>6} {'p95 s':>6} "
+          f"{'p99 s':>6} {'cpu ms':>7} {'tasks/s':>8}")
+    print("-" * 102)
+    for module_name, function_name in selected:
+        function = getattr(importlib.import_module(module_name), function_name)
+        metrics = bench_technique(function, args.iterations, args.concurrency)
+        results["techniques"][function_name] = metrics
+        print(f"{function_name:<42} {metrics['calls_per_task']:>5.1f} {metrics['input_tokens_per_task']:>7.0f} "
+              f"{metrics['output_tokens_per_task']:>7.0f} {metrics['latency_p50']:>6.2f} "
+              f"{metrics['latency_p95']:>6.2f} {metrics['latency_p99']:>6.2f} "
+              f"{metrics['cpu_ms_per_task']:>7.1f} {metrics['throughput_tasks_per_s']:>8.1f}"
+              + (f"  ({metrics['errors']} errors: {metrics['first_error']})" if metrics["errors"] else ""))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if server is not None:
+        server.shutdown()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions vs {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for name, metric, old, new in regressions:
+                print(f"  {name}.{metric}: {old:.3f} -> {new:.3f}")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline}")
@@ -0,0 +1,495 @@
+"""
+Declarative prompt chains run as a DAG
+
+A chain is a list of steps; each step names the inputs its prompt needs
+(chain inputs or other steps' outputs). The executor starts every step as soon
+as its inputs exist, so independent steps run concurrently and the chain takes
+about as long as its critical path (the slowest dependency path) instead of
+the sum of all steps. With max_concurrency set, ready steps are started
+longest-remaining-path first so the critical path is never kept waiting.
+
+    chain = Chain([
+        Step("features", lambda specs: f"List features of {specs}"),
+        Step("headlines", lambda features: f"Write 3 headlines for {features}", parse=split_lines),
+        Step("description", lambda features, headlines: f"Expand {headlines} using {features}",
+             map_over="headlines"),  # one call per headline, all at once
+    ])
+    result = chain.run(specs="...")
+    result.outputs["description"], result.seconds, result.critical_path
+
+Inputs can name a top-level field of a step that answers in JSON, e.g.
+inputs={"issues": "extracted_info.issues"}. With Chain(pipeline=True) such
+steps are streamed and each referenced field is handed downstream as soon as
+it is complete in the stream (see json_stream.py), so the next step starts
+while the upstream one is still generating.
+
+Checkpoints: with a CheckpointStore (or $CHAIN_CHECKPOINTS set to a SQLite
+path) every finished step, and every item of a map_over step, is saved under a
+key hashing the step definition (prompt source, model, temperature, parse)
+together with the keys of the steps it reads and the chain inputs it depends
+on. A rerun after a failure restores the finished steps instead of paying for
+them again; editing one prompt changes its key and the keys of the steps after
+it, so only those run again (values a prompt function captures from an
+enclosing scope count as part of its definition; module globals do not).
+"""
+import asyncio
+import contextvars
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import llm_client
+from instrumentation import metrics, span
+from json_stream import JsonFieldScanner, json_fields
+
+
+def _hash(*parts):
+    data = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _source(function):
+    """
+    Source text of a function (bytecode and constants if the source is
+    unavailable) plus the values it captures from enclosing scopes
+    """
+    if function is None or isinstance(function, str):
+        return function
+    try:
+        source = inspect.getsource(function)
+    except (OSError, TypeError):
+        code = getattr(function, "__code__", None)
+        source = repr((code.co_code, code.co_consts)) if code is not None else repr(function)
+    captured = [cell.cell_contents for cell in getattr(function, "__closure__", None) or ()]
+    return [source] + [_source(value) if callable(value) else value for value in captured]
+
+
+class CheckpointStore:
+    """
+    Finished chain steps in a SQLite file, keyed by step key
+
+    Parameters:
+    - path: SQLite file (created on first use)
+    """
+
+    def __init__(self, path=".cache/chain_checkpoints.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    key TEXT PRIMARY KEY,
+                    step TEXT NOT NULL,
+                    output TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+        return self._db
+
+    def get(self, key):
+        """(True, output) for a saved step, else (False, None)"""
+        with self._lock:
+            row = self._connect().execute("SELECT output FROM checkpoints WHERE key = ?", (key,)).fetchone()
+        return (True, json.loads(row[0])) if row else (False, None)
+
+    def put(self, key, step, output):
+        with self._lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)",
+                       (key, step, json.dumps(output, ensure_ascii=False, default=str), time.time()))
+            db.commit()
+
+    def clear(self):
+        with self._lock:
+            db = self._connect()
+            db.execute("DELETE FROM checkpoints")
+            db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def default_checkpoints():
+    """CheckpointStore at $CHAIN_CHECKPOINTS, or None when unset"""
+    path = os.getenv("CHAIN_CHECKPOINTS")
+    return CheckpointStore(path) if path else None
+
+
+class Step:
+    """
+    One node of a chain
+
+    Parameters:
+    - name: Output name other steps use as an input
+    - prompt: function(**inputs) -> prompt text, a str.format template or a
+      prompt_templates.PromptTemplate (sent with its static prefix first)
+    - inputs: Names the prompt needs (default: the prompt function's parameters
+      or the template's fields), or {parameter: source} where a source is a
+      chain input, a step name or "step.field" for one top-level field of a
+      step's JSON output
+    - title: Span / display name (default: name)
+    - model, temperature: Generation settings
+    - parse: Optional function(text) -> output value (default: the text)
+    - map_over: Parameter holding a list; the step runs once per item
+      (concurrently) with it bound to the item, and outputs the list of results
+    - stream: Stream the output through the chain's on_delta callback
+    - weight: Relative expected duration, used to rank the critical path
+    """
+
+    def __init__(self, name, prompt, inputs=None, title=None, model="gpt-5.2", temperature=0.7, parse=None,
+                 map_over=None, stream=False, weight=1.0):
+        if inputs is None:
+            inputs = list(inspect.signature(prompt).parameters) if callable(prompt) else getattr(prompt, "fields", [])
+        self.name = name
+        self.prompt = prompt
+        self.inputs = dict(inputs) if isinstance(inputs, dict) else {name: name for name in inputs}
+        self.title = title or name
+        self.model = model
+        self.temperature = temperature
+        self.parse = parse
+        self.map_over = map_over
+        self.stream = stream
+        self.weight = weight
+
+    def __repr__(self):
+        return f"Step({self.name!r}, inputs={self.inputs})"
+
+    def definition_hash(self):
+        """Hash of everything that shapes this step's output except its inputs"""
+        return _hash(self.name, _source(self.prompt), self.inputs, self.model, self.temperature,
+                     _source(self.parse), self.map_over)
+
+    def render(self, values):
+        arguments = {parameter: values[source] for parameter, source in self.inputs.items()}
+        return self.prompt(**arguments) if callable(self.prompt) else self.prompt.format(**arguments)
+
+    def request(self, values):
+        """Request parameters for the rendered prompt (a PromptTemplate adds its prompt_cache_key)"""
+        if hasattr(self.prompt, "params"):
+            arguments = {parameter: values[source] for parameter, source in self.inputs.items()}
+            return dict(model=self.model, temperature=self.temperature, **self.prompt.params(**arguments))
+        return dict(model=self.model, input=[{"role": "user", "content": self.render(values)}],
+                    temperature=self.temperature)
+
+
+class ChainResult:
+    """Outputs of a chain run plus per-step timing"""
+
+    def __init__(self, outputs, timings, seconds, critical_path, critical_path_seconds, restored=()):
+        self.outputs = outputs
+        self.restored = list(restored)  # steps taken from checkpoints
+        self.timings = timings  # step name -> (start, end) in seconds from the chain start
+        self.seconds = seconds
+        self.critical_path = critical_path
+        self.critical_path_seconds = critical_path_seconds
+
+    @property
+    def sequential_seconds(self):
+        """What running the steps one after another would have taken"""
+        return sum(end - start for start, end in self.timings.values())
+
+    def summary(self):
+        text = (f"Chain latency {self.seconds:.2f}s; critical path {' -> '.join(self.critical_path)} "
+                f"{self.critical_path_seconds:.2f}s; steps one after another {self.sequential_seconds:.2f}s")
+        if self.restored:
+            text += f"; restored from checkpoints: {', '.join(self.restored)}"
+        return text
+
+
+class Chain:
+    """
+    A DAG of Steps
+
+    Parameters:
+    - steps: Steps in any order; inputs not produced by a step must be passed to run()
+    - max_concurrency: Model calls in flight at once (None = no limit)
+    - checkpoints: CheckpointStore for resuming failed runs (default: $CHAIN_CHECKPOINTS)
+    - pipeline: Stream steps whose fields are used downstream and start the
+      dependent steps as soon as those fields are complete
+    """
+
+    def __init__(self, steps, max_concurrency=None, checkpoints=None, pipeline=False):
+        self.steps = {step.name: step for step in steps}
+        if len(self.steps) != len(steps):
+            raise ValueError("Step names must be unique")
+        self.max_concurrency = max_concurrency
+        self.checkpoints = checkpoints if checkpoints is not None else default_checkpoints()
+        self.pipeline = pipeline
+        self.order = self._topological_order()
+        self.rank = self._ranks()
+
+    def _topological_order(self):
+        order, state = [], {}
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Cycle in chain: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            for dependency in self.dependencies(name):
+                visit(dependency, path + [name])
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.steps:
+            visit(name, [])
+        return order
+
+    def _ranks(self):
+        """Longest weighted path from each step to the end of the chain (itself included)"""
+        rank = {}
+        for name in reversed(self.order):
+            dependents = [other for other in self.steps if name in self.dependencies(other)]
+            rank[name] = self.steps[name].weight + max((rank[other] for other in dependents), default=0.0)
+        return rank
+
+    def source_step(self, source):
+        """Step an input source reads from ("step" or "step.field"), or None for chain inputs"""
+        name = source.split(".", 1)[0]
+        return name if name in self.steps else None
+
+    def dependencies(self, name):
+        sources = [self.source_step(source) for source in self.steps[name].inputs.values()]
+        return list(dict.fromkeys(source for source in sources if source is not None))
+
+    def external_inputs(self):
+        return sorted({source for step in self.steps.values() for source in step.inputs.values()
+                       if self.source_step(source) is None})
+
+    def fields_used(self, name):
+        """Fields of a step's JSON output that other steps read"""
+        return sorted({source.split(".", 1)[1] for step in self.steps.values() for source in step.inputs.values()
+                       if "." in source and self.source_step(source) == name})
+
+    def step_keys(self, inputs):
+        """Checkpoint key per step: its definition plus the keys / values of its inputs"""
+        keys = {}
+        for name in self.order:
+            step = self.steps[name]
+            sources = []
+            for source in step.inputs.values():
+                upstream = self.source_step(source)
+                sources.append((source, keys[upstream] if upstream else _hash(inputs.get(source))))
+            keys[name] = _hash(step.definition_hash(), sources)
+        return keys
+
+    # ---- Execution -----------------------------------------------------
+
+    async def _call(self, step, values, on_delta, index=None, publish=None):
+        params = step.request(values)
+        fields = self.fields_used(step.name) if self.pipeline and publish is not None else []
+        if fields or (step.stream and on_delta is not None):
+            scanner = JsonFieldScanner() if fields else None
+            stream = llm_client.astream_response(**params)
+            async for delta in stream:
+                if step.stream and on_delta is not None:
+                    on_delta(step, delta, index)
+                if scanner is not None:
+                    for field, value in scanner.feed(delta):
+                        if field in fields:
+                            publish(f"{step.name}.{field}", value)
+            text = stream.text
+        else:
+            text = (await llm_client.acreate_response(**params)).output_text
+        return step.parse(text) if step.parse else text
+
+    def _restore(self, key):
+        if self.checkpoints is None:
+            return False, None
+        found, output = self.checkpoints.get(key)
+        if found:
+            metrics.inc("chain_checkpoint_restores_total", 1, "Chain steps restored instead of re-run")
+        return found, output
+
+    async def _run_step(self, step, values, limit, on_delta, key, publish, checkpoint=True):
+        # checkpoint=False: the caller writes the step's checkpoint once its upstream steps are final
+        async def one(item_values, index=None, item_key=None):
+            if item_key is not None:
+                found, output = self._restore(item_key)
+                if found:
+                    return output
+            async with limit:
+                output = await self._call(step, item_values, on_delta, index, publish if index is None else None)
+            if item_key is not None and self.checkpoints is not None and checkpoint:
+                self.checkpoints.put(item_key, f"{step.name}[{index}]", output)
+            return output
+
+        with span(step.title):
+            if step.map_over is None:
+                output = await one(values)
+            else:
+                # Items are checkpointed one by one, so a partial failure keeps the finished ones
+                source = step.inputs[step.map_over]
+                output = list(await asyncio.gather(*(one(dict(values, **{source: item}), index, f"{key}/{index}")
+                                                     for index, item in enumerate(values[source]))))
+        if self.checkpoints is not None and checkpoint:
+            self.checkpoints.put(key, step.name, output)
+        return output
+
+    async def arun(self, on_step=None, on_delta=None, **inputs):
+        """
+        Run the chain; returns a ChainResult
+
+        on_step(step, output) is called as each step finishes and
+        on_delta(step, text, index) for streamed steps (index is the item
+        number of a map_over step, else None).
+
+        If a step fails, no new steps are started, the ones already running
+        finish (and are checkpointed), and the first error is raised.
+
+        A step started on a streamed field (pipeline=True) before its upstream
+        step finished is checkpointed only once every step it read from has
+        finished and been checkpointed itself: its key only covers the
+        upstream's definition, so if the upstream failed after publishing the
+        field, a rerun would otherwise restore output built on a different
+        upstream answer.
+        """
+        missing = [name for name in self.external_inputs() if name not in inputs]
+        if missing:
+            raise ValueError(f"Missing chain inputs: {', '.join(missing)}")
+
+        values = dict(inputs)
+        keys = self.step_keys(inputs)
+        limit = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else _Unlimited()
+        started = time.perf_counter()
+        timings, available, running, restored, errors = {}, {}, {}, [], []
+        # Steps whose output is final (finished with all upstream steps final, or restored);
+        # the others wait in `waiting` ({name: upstream steps}) with their output in `deferred`
+        final, waiting, deferred = set(), {}, {}
+        remaining = [name for name in self.order]
+        # Steps launched mid-stream by publish() must not nest under the streaming step's span
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+
+        def provide(source, value):
+            if source not in values:
+                values[source] = value
+                available[source] = time.perf_counter() - started
+
+        def publish(source, value):
+            provide(source, value)
+            launch()
+
+        def finish(name, output):
+            provide(name, output)
+            timings[name][1] = available[name]
+            for field in self.fields_used(name):
+                provide(f"{name}.{field}", _field(output, field))
+            if on_step is not None:
+                on_step(self.steps[name], output)
+
+        def settle(name, output):
+            """Checkpoint name (and steps waiting on it) once all its upstream steps are final"""
+            if name in waiting:
+                deferred[name] = output
+            else:
+                final.add(name)
+            settled = True
+            while settled:
+                settled = False
+                for other in [other for other in waiting if other in deferred and waiting[other] <= final]:
+                    if self.checkpoints is not None:
+                        self.checkpoints.put(keys[other], other, deferred.pop(other))
+                    del waiting[other]
+                    final.add(other)
+                    settled = True
+
+        def launch():
+            while not errors:
+                ready = [name for name in remaining
+                         if all(source in values for source in self.steps[name].inputs.values())]
+                if not ready:
+                    return
+                # Critical path first, so a concurrency limit delays the steps with the most slack
+                for name in sorted(ready, key=lambda name: -self.rank[name]):
+                    remaining.remove(name)
+                    timings[name] = [time.perf_counter() - started, None]
+                    found, output = self._restore(keys[name])
+                    if found:
+                        restored.append(name)
+                        final.add(name)
+                        finish(name, output)
+                    else:
+                        upstream = {other for other in self.dependencies(name) if other not in final}
+                        if upstream:
+                            waiting[name] = upstream
+                        coroutine = self._run_step(self.steps[name], values, limit, on_delta, keys[name], publish,
+                                                   checkpoint=not upstream)
+                        running[loop.create_task(coroutine, context=context.copy())] = name
+
+        try:
+            launch()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                    else:
+                        settle(name, task.result())
+                        finish(name, task.result())
+                launch()
+        finally:
+            for task in running:
+                task.cancel()
+        if errors:
+            raise errors[0]
+
+        timings = {name: tuple(timing) for name, timing in timings.items()}
+        path, path_seconds = self.critical_path(timings, available)
+        return ChainResult(values, timings, time.perf_counter() - started, path, path_seconds, restored)
+
+    def run(self, on_step=None, on_delta=None, **inputs):
+        """Sync wrapper around arun"""
+        return llm_client.run_async(self.arun(on_step=on_step, on_delta=on_delta, **inputs))
+
+    def critical_path(self, timings, available):
+        """
+        The chain of inputs that gated the last step to finish: ([step or
+        "step.field", ...], seconds from the chain start to its end)
+        """
+        if not timings:
+            return [], 0.0
+        name = max(timings, key=lambda name: timings[name][1])
+        path = [name]
+        while True:
+            sources = [source for source in self.steps[name].inputs.values() if self.source_step(source)]
+            if not sources:
+                break
+            source = max(sources, key=lambda source: available.get(source, 0.0))
+            name = self.source_step(source)
+            path.append(source)
+        return list(reversed(path)), timings[path[0]][1]
+
+
+def _field(output, field):
+    """Top-level field of a step's output (a dict, or text holding a JSON object)"""
+    if isinstance(output, dict):
+        return output.get(field)
+    if isinstance(output, str):
+        return json_fields(output).get(field)
+    return None
+
+
+class _Unlimited:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
@@ -0,0 +1,362 @@
+"""
+Local classifier cascade in front of LLM classification
+
+Most classification requests are easy ("When will my package arrive?") and
+don't need a model call. ClassifierCascade answers them with a small local
+model and only escalates the uncertain ones:
+- HashedLinearClassifier: word 1-2 grams and character 3-4 grams hashed into
+  a fixed number of features, and a multinomial logistic regression over them
+  (pure Python, CPU only; a prediction takes tens of microseconds)
+- every label the LLM gives is appended to a label file (with the model and
+  endpoint that produced it) and becomes training data; retrain() fits the
+  local model on it, one example per distinct message (the latest label
+  wins), and saves it next to the labels. Label files and models live in
+  `directory`, default $CLASSIFIER_CASCADE_DIR; with neither set nothing is
+  recorded or loaded, so demo, fake-server and benchmark runs don't write
+  into a real training set
+- a message is answered locally when the model's confidence is at least
+  `threshold`, otherwise it goes to the LLM; a share (`audit_rate`) of local
+  answers is checked against the LLM as well, to keep measuring agreement
+
+    cascade = ClassifierCascade("enum_classification", CATEGORIES, llm_classify, threshold=0.9)
+    cascade.classify("When will my package arrive?")  # {"label", "source", "confidence", ...}
+    cascade.retrain()  # per-threshold escalation rate / agreement on held-out labels
+    cascade.stats()    # escalation_rate, agreement, ...
+
+Stats are exported on the Prometheus endpoint (see instrumentation.py) as
+classifier_cascade_* series labelled by cascade.
+
+Usage:
+    CLASSIFIER_CASCADE_DIR=.cache/classifiers python classifier_cascade.py train --name enum_classification
+"""
+import argparse
+import contextvars
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import weakref
+import zlib
+
+import instrumentation
+import llm_client
+from instrumentation import span
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+_cascades = weakref.WeakSet()
+_llm_models = contextvars.ContextVar("classifier_cascade_models", default=None)  # models called by llm_classify
+
+DEFAULT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99)
+
+
+def normalize_text(text):
+    """Key under which labels of the same message are merged"""
+    return " ".join(text.lower().split())
+
+
+def hashed_features(text, dim=2 ** 20):
+    """{feature index: weight} of word 1-2 grams and char 3-4 grams, L2-normalised"""
+    words = _TOKEN.findall(text.lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        grams += [padded[i:i + n] for n in (3, 4) for i in range(len(padded) - n + 1)]
+    features = {}
+    for gram in grams:
+        # crc32 rather than hash(): stable across processes, so saved models stay valid
+        index = zlib.crc32(gram.encode()) % dim
+        features[index] = features.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(value * value for value in features.values())) or 1.0
+    return {index: value / norm for index, value in features.items()}
+
+
+class HashedLinearClassifier:
+    """
+    Multinomial logistic regression over hashed n-gram features
+
+    Parameters:
+    - labels: Class names
+    - dim: Number of hashed features
+    - epochs, learning_rate, l2: SGD settings for fit()
+    """
+
+    def __init__(self, labels, dim=2 ** 20, epochs=12, learning_rate=0.5, l2=1e-5):
+        self.labels = list(labels)
+        self.dim = dim
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.weights = {}  # feature index -> [weight per label]
+        self.bias = [0.0] * len(self.labels)
+
+    def fit(self, texts, labels, seed=0):
+        """Train on (text, label) pairs; labels outside self.labels are skipped"""
+        index = {label: number for number, label in enumerate(self.labels)}
+        examples = [(hashed_features(text, self.dim), index[label])
+                    for text, label in zip(texts, labels) if label in index]
+        rng = random.Random(seed)
+        self.weights, self.bias = {}, [0.0] * len(self.labels)
+        for epoch in range(self.epochs):
+            rng.shuffle(examples)
+            rate = self.learning_rate / (1 + epoch)
+            for features, target in examples:
+                probabilities = self._probabilities(features)
+                probabilities[target] -= 1.0  # gradient of the log loss w.r.t. the scores
+                for k, gradient in enumerate(probabilities):
+                    self.bias[k] -= rate * gradient
+                for feature, value in features.items():
+                    weights = self.weights.get(feature)
+                    if weights is None:
+                        weights = self.weights[feature] = [0.0] * len(self.labels)
+                    for k, gradient in enumerate(probabilities):
+                        weights[k] -= rate * (gradient * value + self.l2 * weights[k])
+        return self
+
+    def _probabilities(self, features):
+        scores = list(self.bias)
+        for feature, value in features.items():
+            weights = self.weights.get(feature)
+            if weights is not None:
+                for k, weight in enumerate(weights):
+                    scores[k] += weight * value
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return [value / total for value in exps]
+
+    def predict(self, text):
+        """(label, confidence) with the highest probability"""
+        probabilities = self._probabilities(hashed_features(text, self.dim))
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        return self.labels[best], probabilities[best]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        data = {"labels": self.labels, "dim": self.dim, "bias": self.bias,
+                "weights": {str(feature): [round(w, 6) for w in weights]
+                            for feature, weights in self.weights.items()}}
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        model = cls(data["labels"], dim=data["dim"])
+        model.bias = data["bias"]
+        model.weights = {int(feature): weights for feature, weights in data["weights"].items()}
+        return model
+
+
+def threshold_report(model, texts, labels, thresholds=DEFAULT_THRESHOLDS):
+    """
+    For each confidence threshold: the share of messages that would be
+    escalated and how often the local answers agree with the given (LLM) labels
+    """
+    predictions = [model.predict(text) for text in texts]
+    report = []
+    for threshold in thresholds:
+        answered = [(predicted, label) for (predicted, confidence), label in zip(predictions, labels)
+                    if confidence >= threshold]
+        agreed = sum(predicted == label for predicted, label in answered)
+        report.append({
+            "threshold": threshold,
+            "escalation_rate": 1 - len(answered) / len(texts) if texts else 0.0,
+            "agreement": agreed / len(answered) if answered else None,
+        })
+    return report
+
+
+class ClassifierCascade:
+    """
+    Local classifier first, LLM for the uncertain cases
+
+    Parameters:
+    - name: Cascade name (file names and metric labels)
+    - labels: Class names
+    - llm_classify: function(message) -> label (or None if the answer wasn't a
+      label), or -> (label, answer text) to get the model's answer back too
+    - threshold: Lowest local confidence that is answered without the LLM
+    - audit_rate: Share of local answers also sent to the LLM to measure agreement
+    - directory: Where the label file (<name>.labels.jsonl) and model (<name>.json)
+      live (default: $CLASSIFIER_CASCADE_DIR; None = don't record or load anything)
+    """
+
+    def __init__(self, name, labels, llm_classify, threshold=0.9, audit_rate=0.05, directory=None, seed=None):
+        directory = directory or os.getenv("CLASSIFIER_CASCADE_DIR")
+        self.name = name
+        self.labels = list(labels)
+        self.llm_classify = llm_classify
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+        self.labels_path = os.path.join(directory, f"{name}.labels.jsonl") if directory else None
+        self.model_path = os.path.join(directory, f"{name}.json") if directory else None
+        self.model = (HashedLinearClassifier.load(self.model_path)
+                      if self.model_path and os.path.exists(self.model_path) else None)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "local": 0, "escalated": 0, "audited": 0,
+                        "compared": 0, "agreed": 0, "predictions": 0, "local_seconds": 0.0}
+        _cascades.add(self)
+
+    def classify(self, message):
+        """
+        {"label", "source" ("local" / "llm"), "confidence", "local_label",
+        "answer"} where answer is the model's text when llm_classify returns it
+        (None for local answers)
+        """
+        local_label, confidence = None, 0.0
+        if self.model is not None:
+            started = time.perf_counter()
+            local_label, confidence = self.model.predict(message)
+            self._count("local_seconds", time.perf_counter() - started)
+            self._count("predictions")
+        self._count("requests")
+
+        if local_label is not None and confidence >= self.threshold:
+            self._count("local")
+            if self._rng.random() < self.audit_rate:
+                self._count("audited")
+                self._ask_llm(message, local_label)
+            return {"label": local_label, "source": "local", "confidence": confidence, "local_label": local_label,
+                    "answer": None}
+
+        self._count("escalated")
+        label, answer = self._ask_llm(message, local_label)
+        return {"label": label, "source": "llm", "confidence": confidence, "local_label": local_label,
+                "answer": answer}
+
+    def _ask_llm(self, message, local_label):
+        """(label, answer text or None) from llm_classify; valid labels are recorded"""
+        token = _llm_models.set([])
+        try:
+            with span("llm classification", technique=self.name):
+                result = self.llm_classify(message)
+            models = _llm_models.get()
+        finally:
+            _llm_models.reset(token)
+        label, answer = result if isinstance(result, tuple) else (result, None)
+        if label in self.labels:
+            self.add_label(message, label, model=models[-1] if models else None)
+            if local_label is not None:
+                self._count("compared")
+                self._count("agreed", int(local_label == label))
+        return label, answer
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counts[name] += value
+
+    def add_label(self, message, label, model=None):
+        """Record an LLM label as training data, with the model and endpoint that gave it (no-op without a directory)"""
+        if self.labels_path is None:
+            return
+        record = {"text": message, "label": label, "model": model, "base_url": llm_client.settings["base_url"]}
+        os.makedirs(os.path.dirname(self.labels_path) or ".", exist_ok=True)
+        with self._lock, open(self.labels_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def training_data(self):
+        """(texts, labels) recorded so far, one per distinct (normalised) message; the latest label wins"""
+        latest = {}
+        if self.labels_path is not None and os.path.exists(self.labels_path):
+            with open(self.labels_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        key = normalize_text(record["text"])
+                        latest.pop(key, None)  # keep the order of the latest label
+                        latest[key] = (record["text"], record["label"])
+        return [text for text, _ in latest.values()], [label for _, label in latest.values()]
+
+    def retrain(self, holdout=0.2, thresholds=DEFAULT_THRESHOLDS, min_examples=20, seed=0):
+        """
+        Fit the local model on the recorded labels and save it
+
+        A model trained on all but `holdout` of the labelled messages is scored
+        on the rest first (messages are distinct, so none is on both sides);
+        returns that threshold_report ([] if there are fewer than min_examples
+        messages or no directory, in which case nothing is trained).
+        """
+        texts, labels = self.training_data()
+        if len(texts) < min_examples or self.model_path is None:
+            return []
+        order = list(range(len(texts)))
+        random.Random(seed).shuffle(order)
+        split = int(len(order) * (1 - holdout))
+        train, test = order[:split], order[split:]
+        report = []
+        if test:
+            trial = HashedLinearClassifier(self.labels).fit([texts[i] for i in train], [labels[i] for i in train])
+            report = threshold_report(trial, [texts[i] for i in test], [labels[i] for i in test], thresholds)
+        model = HashedLinearClassifier(self.labels).fit(texts, labels)
+        model.save(self.model_path)
+        self.model = model
+        return report
+
+    def stats(self):
+        """Counts plus escalation_rate, agreement (local vs LLM label) and mean local_microseconds"""
+        with self._lock:
+            counts = dict(self._counts)
+        predicted = counts["predictions"]
+        return dict(
+            counts,
+            escalation_rate=counts["escalated"] / counts["requests"] if counts["requests"] else 0.0,
+            agreement=counts["agreed"] / counts["compared"] if counts["compared"] else None,
+            local_microseconds=1e6 * counts["local_seconds"] / predicted if predicted else 0.0,
+        )
+
+
+def _on_call(params, response, seconds, cached):
+    # Models called while a cascade waits for llm_classify, recorded with its labels
+    models = _llm_models.get()
+    if models is not None:
+        models.append(params.get("model"))
+
+
+llm_client.add_call_listener(_on_call)
+
+
+def _cascade_metrics():
+    stats = [(cascade.name, cascade.stats()) for cascade in list(_cascades)]
+    if not stats:
+        return []
+    return [
+        ("classifier_cascade_requests_total", "counter", "Classification requests by where they were answered",
+         [({"cascade": name, "source": source}, s[key]) for name, s in stats
+          for source, key in (("local", "local"), ("llm", "escalated"))]),
+        ("classifier_cascade_escalation_rate", "gauge", "Share of requests escalated to the LLM",
+         [({"cascade": name}, s["escalation_rate"]) for name, s in stats]),
+        ("classifier_cascade_agreement", "gauge", "Share of compared requests where the local label matched the LLM",
+         [({"cascade": name}, s["agreement"]) for name, s in stats if s["agreement"] is not None]),
+    ]
+
+
+instrumentation.metrics.register_collector(_cascade_metrics)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a cascade's local classifier on its recorded LLM labels")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--name", required=True, help="Cascade name, e.g. enum_classification")
+    parser.add_argument("--directory", default=os.getenv("CLASSIFIER_CASCADE_DIR"),
+                        help="Label / model directory (default: $CLASSIFIER_CASCADE_DIR)")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of labels held out for the report")
+    args = parser.parse_args()
+    if not args.directory:
+        parser.error("give --directory or set CLASSIFIER_CASCADE_DIR")
+
+    label_path = os.path.join(args.directory, f"{args.name}.labels.jsonl")
+    with open(label_path, encoding="utf-8") as f:
+        names = sorted({json.loads(line)["label"] for line in f if line.strip()})
+    cascade = ClassifierCascade(args.name, names, llm_classify=None, directory=args.directory)
+    report = cascade.retrain(holdout=args.holdout)
+    print(f"Trained on {len(cascade.training_data()[0])} labels -> {cascade.model_path}")
+    print(f"{'threshold':>9}  {'escalated':>9}  {'agreement':>9}")
+    for row in report:
+        agreement = f"{row['agreement']:.1%}" if row["agreement"] is not None else "-"
+        print(f"{row['threshold']:>9.2f}  {row['escalation_rate']:>9.1%}  {agreement:>9}")
@@ -0,0 +1,202 @@
+"""
+Context compaction for multi-turn agent loops (ReAct)
+
+A naive loop re-sends the whole history every turn: every assistant message
+plus pretty-printed tool results, so input tokens grow quadratically with
+the number of iterations. Conversation keeps the history small:
+- observations are stored as compact JSON (no indentation, nulls dropped)
+- once the history passes `token_budget`, turns older than the last
+  `keep_recent` are folded into one summary message (actions and trimmed
+  results; or pass `summarize=` to use a model for it), and the oldest
+  summaries are dropped if that is still not enough
+- with chain=True turns are linked server-side with `previous_response_id`
+  and only the new observation is sent. The model still reads (and the API
+  still bills) the stored history, but nothing is re-serialized or re-uploaded,
+  and the stored prefix is eligible for prompt caching
+
+`report()` lists the estimated tokens sent per iteration next to what the
+uncompacted loop would have sent, plus the billed input tokens from usage.
+"""
+import json
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except (ImportError, ValueError):
+    _encoding = None
+
+
+def count_tokens(text):
+    """Token count with tiktoken when installed, else ~4 characters per token"""
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def _prune(value):
+    """Drop None / empty values recursively"""
+    if isinstance(value, dict):
+        return {key: _prune(item) for key, item in value.items() if item not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [_prune(item) for item in value]
+    return value
+
+
+def _shrink(value, max_items=4, max_chars=60):
+    """Trim long strings and collections, for summaries of stale turns"""
+    if isinstance(value, dict):
+        items = list(value.items())
+        shrunk = {key: _shrink(item, max_items, max_chars) for key, item in items[:max_items]}
+        if len(items) > max_items:
+            shrunk["..."] = f"{len(items) - max_items} more"
+        return shrunk
+    if isinstance(value, list):
+        shrunk = [_shrink(item, max_items, max_chars) for item in value[:max_items]]
+        return shrunk + [f"... {len(value) - max_items} more"] if len(value) > max_items else shrunk
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + "..."
+    return value
+
+
+def compact_json(value):
+    return json.dumps(_prune(value), separators=(",", ":"), default=str)
+
+
+class Conversation:
+    """
+    History of one agent run, compacted as it grows
+
+    Parameters:
+    - prompt: The first user message (always kept verbatim)
+    - token_budget: Fold stale turns into a summary once the history is larger
+      (None = never summarize)
+    - keep_recent: Number of most recent turns never summarized
+    - chain: Send only new messages and link turns with previous_response_id
+    - summarize: Optional function(list of turn dicts) -> summary text
+    """
+
+    def __init__(self, prompt, token_budget=2000, keep_recent=2, chain=False, summarize=None):
+        self.prompt = {"role": "user", "content": prompt}
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.chain = chain
+        self.summarize = summarize
+        self.turns = []  # {"assistant": text, "results": [(call, result)], "observation": text}
+        self.summaries = []
+        self.previous_response_id = None
+        self._pending = []  # messages not yet sent (chain mode)
+        self._naive_history = count_tokens(prompt) + 4
+        self.iterations = []
+
+    # ---- Recording -----------------------------------------------------
+
+    def add_response(self, response, sent_tokens):
+        """Record a model turn and the usage of the call that produced it"""
+        text = response.output_text
+        usage = getattr(response, "usage", None)
+        self.iterations.append({
+            "iteration": len(self.iterations) + 1,
+            "sent_tokens": sent_tokens,
+            "uncompacted_tokens": self._naive_history,
+            "input_tokens": getattr(usage, "input_tokens", None),
+            "cached_tokens": getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", None),
+        })
+        self.turns.append({"assistant": text, "observation": None, "results": []})
+        self._naive_history += count_tokens(text) + 4
+        if self.chain:
+            self.previous_response_id = response.id
+            self._pending = []
+
+    def add_observations(self, results):
+        """Record tool results [(call, result)] as one compact observation message"""
+        lines = [f"Observation: {call!r} -> {compact_json(result)}" for call, result in results]
+        self._add_observation("\n".join(lines), results)
+        # What the uncompacted loop sends: pretty-printed JSON per result
+        naive = "\n\n".join(f"Observation: {call!r} returned:\n{json.dumps(result, indent=2, default=str)}"
+                            for call, result in results)
+        self._naive_history += count_tokens(naive) + 4
+
+    def add_message(self, text):
+        """Record a plain user message (e.g. "Continue with your response.")"""
+        self._add_observation(text, [])
+        self._naive_history += count_tokens(text) + 4
+
+    def _add_observation(self, text, results):
+        turn = self.turns[-1]
+        turn["observation"] = text
+        turn["results"] = results
+        self._pending.append({"role": "user", "content": text})
+
+    # ---- Request input -------------------------------------------------
+
+    def _turn_messages(self, turn):
+        messages = [{"role": "assistant", "content": turn["assistant"]}]
+        if turn["observation"] is not None:
+            messages.append({"role": "user", "content": turn["observation"]})
+        return messages
+
+    def _history(self):
+        messages = [self.prompt]
+        if self.summaries:
+            messages.append({"role": "user", "content": "Summary of earlier steps:\n" + "\n".join(self.summaries)})
+        for turn in self.turns:
+            messages += self._turn_messages(turn)
+        return messages
+
+    def _summary(self, turns):
+        if self.summarize is not None:
+            return self.summarize(turns)
+        lines = []
+        for turn in turns:
+            actions = [line.strip() for line in turn["assistant"].splitlines() if line.strip().startswith("Action")]
+            lines += actions or [turn["assistant"].strip().splitlines()[0][:120] if turn["assistant"].strip() else ""]
+            for call, result in turn["results"]:
+                lines.append(f"  {call!r} -> {json.dumps(_shrink(_prune(result)), separators=(',', ':'), default=str)}")
+        return "\n".join(line for line in lines if line)
+
+    def compact(self):
+        """Fold stale turns into summaries until the history fits the budget"""
+        if self.token_budget is None:
+            return
+        while self.tokens(self._history()) > self.token_budget:
+            if len(self.turns) > self.keep_recent:
+                stale = self.turns[:len(self.turns) - self.keep_recent]
+                self.turns = self.turns[len(stale):]
+                self.summaries.append(self._summary(stale))
+            elif len(self.summaries) > 1:
+                self.summaries.pop(0)
+            else:
+                break
+
+    def request_params(self):
+        """`input` (and previous_response_id) for the next call, plus its token estimate"""
+        if self.chain and self.previous_response_id is not None:
+            messages = self._pending
+            params = {"input": messages, "previous_response_id": self.previous_response_id, "store": True}
+        else:
+            self.compact()
+            messages = self._history()
+            params = {"input": messages}
+            if self.chain:
+                params["store"] = True
+        return params, self.tokens(messages)
+
+    @staticmethod
+    def tokens(messages):
+        # ~4 tokens of per-message framing on top of the content
+        return sum(count_tokens(message["content"]) + 4 for message in messages)
+
+    # ---- Report --------------------------------------------------------
+
+    def report(self):
+        """Per-iteration token table (sent vs uncompacted estimate vs billed input)"""
+        lines = [f"{'iter':>4} {'sent':>7} {'uncompacted':>12} {'billed input':>13} {'cached':>7}"]
+        for row in self.iterations:
+            lines.append(f"{row['iteration']:>4} {row['sent_tokens']:>7} {row['uncompacted_tokens']:>12} "
+                         f"{row['input_tokens'] if row['input_tokens'] is not None else '-':>13} "
+                         f"{row['cached_tokens'] if row['cached_tokens'] is not None else '-':>7}")
+        sent = sum(row["sent_tokens"] for row in self.iterations)
+        naive = sum(row["uncompacted_tokens"] for row in self.iterations)
+        if naive:
+            lines.append(f"total {sent} sent vs {naive} uncompacted ({1 - sent / naive:.0%} fewer)")
+        return "\n".join(lines)
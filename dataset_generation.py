@@ -0,0 +1,352 @@
+"""
+Chunked synthetic dataset generation, streamed straight to disk
+
+Asking for a whole dataset in one response stops at the output limit and
+keeps every row in memory. DatasetGenerator splits the dataset into chunks
+of `chunk_size` rows, each with its own disjoint range of ids (CUST-00001 to
+CUST-00050, CUST-00051 to ...), and requests up to `concurrency` chunks at
+once:
+- every chunk is streamed and parsed line by line (CSV or Markdown table
+  rows, see RowParser) into row records
+- each record is appended to the CSV and / or JSONL output as soon as its
+  line is complete, so memory use doesn't grow with the dataset
+- ids are checked against the chunk's range: an id outside it is replaced by
+  the next unused id of the range, extra rows are dropped, and rows the model
+  left out are requested again (up to max_retries times)
+- a chunk whose request fails is counted as failed without stopping the
+  others; the ids it didn't write are reported as missing ranges, which a
+  rerun with --start-id / --rows (and --append) fills in
+
+    generator = DatasetGenerator(CUSTOMER_COLUMNS, prompt=customer_rows_prompt, concurrency=16)
+    report = generator.run(20_000, csv_path="customers.csv", jsonl_path="customers.jsonl")
+    report["rows_written"], report["rows_per_second"]
+
+Usage:
+    python dataset_generation.py --rows 20000 --csv customers.csv --jsonl customers.jsonl --concurrency 16 --fake
+"""
+import argparse
+import asyncio
+import csv
+import importlib
+import json
+import re
+import time
+from collections import Counter
+
+import llm_client
+from instrumentation import metrics, span
+
+_SEPARATOR_CELL = re.compile(r"^:?-+:?$")
+
+
+class RowParser:
+    """
+    Incremental parser for CSV or Markdown table rows
+
+    Parameters:
+    - columns: {column name: converter} in output order, e.g. {"TotalOrders": int}
+    - format: "csv" or "markdown"
+
+    feed(delta) returns the rows ({column: value}) completed by that chunk of
+    text. Header, separator, blank and ``` lines are skipped; lines with the
+    wrong number of cells or values that don't convert are counted as
+    malformed and skipped.
+    """
+
+    def __init__(self, columns, format="csv"):
+        if format not in ("csv", "markdown"):
+            raise ValueError(f"Unknown row format: {format}")
+        self.columns = columns
+        self.format = format
+        self.malformed = 0
+        self._header = [name.lower() for name in columns]
+        self._chars = []
+        self._quoted = False
+
+    def feed(self, delta):
+        rows = []
+        for char in delta:
+            if char == "\n" and not self._quoted:
+                row = self._row("".join(self._chars))
+                self._chars = []
+                if row is not None:
+                    rows.append(row)
+                continue
+            if char == '"' and self.format == "csv":
+                self._quoted = not self._quoted
+            self._chars.append(char)
+        return rows
+
+    def close(self):
+        """Rows from a last line without a trailing newline"""
+        row = self._row("".join(self._chars))
+        self._chars, self._quoted = [], False
+        return [] if row is None else [row]
+
+    def _row(self, line):
+        line = line.strip()
+        if not line or line.startswith("```"):
+            return None
+        if self.format == "markdown":
+            if not line.startswith("|"):
+                return None
+            cells = [cell.strip() for cell in line.strip("|").split("|")]
+            if all(_SEPARATOR_CELL.match(cell) for cell in cells):
+                return None
+        else:
+            cells = [cell.strip() for cell in next(csv.reader([line]))]
+        if [cell.lower() for cell in cells] == self._header:
+            return None
+        if len(cells) != len(self.columns):
+            self.malformed += 1
+            return None
+        try:
+            return {name: convert(cell) for (name, convert), cell in zip(self.columns.items(), cells)}
+        except ValueError:
+            self.malformed += 1
+            return None
+
+
+class DatasetWriter:
+    """
+    Appends rows to a CSV and / or JSONL file (header written first); use as a context manager
+
+    With append=True existing files are extended (the CSV header is only
+    written to an empty file) instead of overwritten.
+    """
+
+    def __init__(self, columns, csv_path=None, jsonl_path=None, append=False):
+        if csv_path is None and jsonl_path is None:
+            raise ValueError("Give csv_path, jsonl_path or both")
+        self.columns = list(columns)
+        self.rows = 0
+        mode = "a" if append else "w"
+        self._csv_file = open(csv_path, mode, newline="", encoding="utf-8") if csv_path else None
+        self._jsonl_file = open(jsonl_path, mode, encoding="utf-8") if jsonl_path else None
+        self._csv = csv.writer(self._csv_file) if self._csv_file else None
+        if self._csv is not None and self._csv_file.tell() == 0:
+            self._csv.writerow(self.columns)
+
+    def write(self, row):
+        if self._csv is not None:
+            self._csv.writerow([row[name] for name in self.columns])
+        if self._jsonl_file is not None:
+            self._jsonl_file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.rows += 1
+
+    def close(self):
+        for file in (self._csv_file, self._jsonl_file):
+            if file is not None:
+                file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DatasetGenerator:
+    """
+    Generates a dataset in parallel chunks with disjoint id ranges
+
+    Parameters:
+    - columns: {column name: converter}, see RowParser
+    - prompt: function(ids, format) -> prompt text asking for one row per id
+      (ids is a range for a fresh chunk, a list when re-requesting missing rows)
+    - id_column, id_format: Column holding the id and how ids are written
+    - chunk_size: Rows requested per call
+    - concurrency: Chunks in flight at once
+    - format: "csv" or "markdown" (what the prompt asks for)
+    - max_retries: Follow-up requests per chunk for rows the model left out
+    - model, temperature: Generation settings
+    """
+
+    def __init__(self, columns, prompt, id_column="CustomerID", id_format="CUST-{:05d}", chunk_size=50,
+                 concurrency=8, format="csv", max_retries=1, model="gpt-5.2", temperature=0.7):
+        self.columns = columns
+        self.prompt = prompt
+        self.id_column = id_column
+        self.id_format = id_format
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.format = format
+        self.max_retries = max_retries
+        self.model = model
+        self.temperature = temperature
+
+    def chunks(self, rows, start_id=1):
+        """Disjoint id ranges of at most chunk_size ids"""
+        ids = range(start_id, start_id + rows)
+        if rows and len(self.id_format.format(ids[-1])) != len(self.id_format.format(ids[0])):
+            raise ValueError(f"{rows} rows from id {start_id} don't fit the id format {self.id_format!r}")
+        return [ids[offset:offset + self.chunk_size] for offset in range(0, rows, self.chunk_size)]
+
+    async def run_chunk(self, ids, writer, limit):
+        """
+        Generate and write the rows of one id range; returns (counts, error),
+        error being the exception that stopped the chunk or None. Rows
+        written before a failure are kept and the rest count as missing.
+        """
+        counts = Counter(requests=0)
+        missing = {self.id_format.format(number): number for number in ids}
+        wanted, error = ids, None
+        async with limit:
+            try:
+                with span(f"chunk {self.id_format.format(ids[0])}", technique="dataset_generation", rows=len(ids)):
+                    while missing and counts["requests"] <= self.max_retries:
+                        counts["requests"] += 1
+                        parser = RowParser(self.columns, self.format)
+                        stream = llm_client.astream_response(
+                            model=self.model, temperature=self.temperature,
+                            input=[{"role": "user", "content": self.prompt(wanted, self.format)}],
+                        )
+                        async for delta in stream:
+                            for row in parser.feed(delta):
+                                self._accept(row, missing, writer, counts)
+                        for row in parser.close():
+                            self._accept(row, missing, writer, counts)
+                        counts["malformed"] += parser.malformed
+                        wanted = sorted(missing.values())
+            except Exception as e:
+                counts["failed"] += 1
+                error = e
+                metrics.inc("dataset_chunks_failed_total", 1, "Synthetic dataset chunks stopped by an error")
+        counts["missing"] = len(missing)
+        counts["missing_ids"] = sorted(missing.values())
+        metrics.inc("dataset_rows_total", counts["written"], "Synthetic dataset rows written")
+        return counts, error
+
+    def _accept(self, row, missing, writer, counts):
+        row_id = row[self.id_column]
+        if row_id not in missing:
+            if not missing:
+                counts["extra"] += 1
+                return
+            # Keep the row but give it an id from this chunk's range, so ranges never overlap
+            row[self.id_column] = row_id = min(missing, key=missing.get)
+            counts["renumbered"] += 1
+        del missing[row_id]
+        writer.write(row)
+        counts["written"] += 1
+
+    async def arun(self, rows, csv_path=None, jsonl_path=None, start_id=1, on_chunk=None, append=False):
+        """
+        Generate `rows` rows into the output file(s); returns a report with
+        throughput and row counts. on_chunk(ids, counts) is called as each
+        chunk finishes. A failed chunk doesn't stop the others: it is counted
+        in "failed" (its error in "errors") and the ids it didn't write are
+        listed in "missing_ranges" as (start_id, rows) for a rerun with
+        append=True.
+        """
+        chunks = self.chunks(rows, start_id)
+        limit = asyncio.Semaphore(self.concurrency)
+        totals, missing_ids, errors = Counter(), [], []
+
+        async def run(ids):
+            counts, error = await self.run_chunk(ids, writer, limit)
+            missing_ids.extend(counts.pop("missing_ids"))
+            if error is not None:
+                errors.append(f"{self.id_format.format(ids[0])}: {type(error).__name__}: {error}")
+            totals.update(counts)
+            if on_chunk is not None:
+                on_chunk(ids, counts)
+
+        started = time.perf_counter()
+        with DatasetWriter(self.columns, csv_path, jsonl_path, append) as writer:
+            await asyncio.gather(*(run(ids) for ids in chunks))
+        elapsed = time.perf_counter() - started
+        return {
+            "rows_requested": rows,
+            "rows_written": totals["written"],
+            "chunks": len(chunks),
+            "requests": totals["requests"],
+            "renumbered": totals["renumbered"],
+            "extra": totals["extra"],
+            "malformed": totals["malformed"],
+            "missing": totals["missing"],
+            "missing_ranges": _ranges(sorted(missing_ids)),
+            "failed": totals["failed"],
+            "errors": errors,
+            "seconds": elapsed,
+            "rows_per_second": totals["written"] / elapsed if elapsed else 0.0,
+        }
+
+    def run(self, rows, csv_path=None, jsonl_path=None, start_id=1, on_chunk=None, append=False):
+        """Sync wrapper around arun"""
+        return llm_client.run_async(self.arun(rows, csv_path, jsonl_path, start_id, on_chunk, append))
+
+
+def _ranges(numbers):
+    """[(first, count)] for each run of consecutive numbers in a sorted list"""
+    ranges = []
+    for number in numbers:
+        if ranges and ranges[-1][0] + ranges[-1][1] == number:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + 1)
+        else:
+            ranges.append((number, 1))
+    return ranges
+
+
+def fake_rows_text(columns, rows, format="csv", id_format="CUST-{:05d}"):
+    """Header and `rows` placeholder customer rows for the fake server (their ids get renumbered)"""
+    def line(cells):
+        return ",".join(cells) if format == "csv" else "| " + " | ".join(cells) + " |"
+
+    lines = [line(columns)]
+    if format == "markdown":
+        lines.append(line(["---"] * len(columns)))
+    for number in range(1, rows + 1):
+        values = {"CustomerID": id_format.format(number), "Name": f"Customer {number}",
+                  "Email": f"customer{number}@example.com", "TotalOrders": number % 7,
+                  "LifetimeValue": f"{number * 13.5:.2f}", "Status": "ACTIVE" if number % 3 else "INACTIVE"}
+        lines.append(line([str(values.get(name, "")) for name in columns]))
+    # Doubled braces: the fake server formats rule templates with str.format
+    return "\n".join(lines).replace("{", "{{").replace("}", "}}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic customer dataset in parallel chunks")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--csv", help="CSV output file")
+    parser.add_argument("--jsonl", help="JSONL output file")
+    parser.add_argument("--chunk-size", type=int, default=50, help="Rows per request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Chunks in flight at once")
+    parser.add_argument("--format", choices=["csv", "markdown"], default="csv", help="Row format requested")
+    parser.add_argument("--start-id", type=int, default=1)
+    parser.add_argument("--append", action="store_true", help="Add to the output files instead of overwriting them")
+    parser.add_argument("--fake", action="store_true", help="Use an in-process fake server")
+    parser.add_argument("--latency", default="lognormal:0.3,0.4", help="Fake server latency spec")
+    args = parser.parse_args()
+    if not args.csv and not args.jsonl:
+        parser.error("give --csv, --jsonl or both")
+
+    structured_output = importlib.import_module("10_structured_output")
+    columns = structured_output.CUSTOMER_COLUMNS
+
+    server = None
+    if args.fake:
+        from fake_responses_server import start_server
+        server = start_server(latency=args.latency, tokens_per_second=2000,
+                              text=fake_rows_text(columns, args.chunk_size, args.format))
+        llm_client.configure(base_url=server.base_url, api_key="fake-key",
+                             max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    generator = DatasetGenerator(columns, prompt=structured_output.customer_rows_prompt,
+                                 chunk_size=args.chunk_size, concurrency=args.concurrency, format=args.format)
+    report = generator.run(args.rows, csv_path=args.csv, jsonl_path=args.jsonl, start_id=args.start_id,
+                           append=args.append)
+
+    print(f"{report['rows_written']} of {report['rows_requested']} rows in {report['seconds']:.1f}s "
+          f"({report['rows_per_second']:.0f} rows/s), {report['requests']} requests for {report['chunks']} chunks")
+    print(f"Renumbered {report['renumbered']}, dropped {report['extra']} extra and {report['malformed']} malformed "
+          f"rows, {report['missing']} missing")
+    if report["failed"]:
+        print(f"{report['failed']} chunks failed:")
+        for error in report["errors"]:
+            print(f"  {error}")
+    for first, count in report["missing_ranges"]:
+        print(f"Missing {count} rows from id {first}: rerun with --start-id {first} --rows {count} --append")
+
+    if server is not None:
+        server.shutdown()
@@ -0,0 +1,205 @@
+"""
+Dynamic few-shot example selection
+
+Hard-coding every example into every prompt doesn't scale past a handful of
+examples. ExampleStore keeps a bank of examples with a vector index and picks
+the most relevant ones for each incoming message:
+- every example's key text is embedded locally (CPU only, NumPy): word 1-2
+  grams with TF-IDF weights, hashed with random signs into `dim` dimensions,
+  L2-normalised
+- the index is stored one row per dimension, so select() scores all
+  examples by combining only the rows of the message's few non-zero
+  dimensions; argpartition then gives the top candidates, which are added
+  best first while they fit into `k` examples and `token_budget` tokens
+  (rendered example text)
+
+At 10k examples and dim=1024 the index is ~40 MB and a selection takes a
+fraction of a millisecond.
+
+    store = ExampleStore(examples, key="inquiry", render=render_example)
+    chosen = store.select(message, k=4, token_budget=600)
+    prompt = "\n\n".join(store.render(example) for example in chosen)
+
+Usage:
+    python example_store.py --examples 10000   # selection latency benchmark
+"""
+import argparse
+import math
+import random
+import re
+import time
+import zlib
+
+import numpy as np
+
+from conversation import count_tokens
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def _grams(text):
+    words = _TOKEN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class HashingTfidf:
+    """TF-IDF over word 1-2 grams, hashed (with random signs) into dim dimensions"""
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+        self.idf = {}
+        self.default_idf = 1.0  # grams not seen in fit(): as rare as the rarest
+        self._buckets = {}  # gram -> (index, sign), memoised crc32
+
+    def fit(self, texts):
+        counts = {}
+        for text in texts:
+            for gram in set(_grams(text)):
+                counts[gram] = counts.get(gram, 0) + 1
+        total = len(texts)
+        self.idf = {gram: math.log((1 + total) / (1 + count)) + 1 for gram, count in counts.items()}
+        self.default_idf = math.log(1 + total) + 1
+        return self
+
+    def _bucket(self, gram):
+        bucket = self._buckets.get(gram)
+        if bucket is None:
+            hashed = zlib.crc32(gram.encode())
+            bucket = self._buckets[gram] = (hashed % self.dim, 1.0 if hashed & 0x80000000 else -1.0)
+        return bucket
+
+    def transform_sparse(self, text):
+        """(indices, values) of the non-zero entries of transform(text)"""
+        counts = {}
+        for gram in _grams(text):
+            counts[gram] = counts.get(gram, 0) + 1
+        weights = {}
+        for gram, count in counts.items():
+            index, sign = self._bucket(gram)
+            weights[index] = weights.get(index, 0.0) + sign * (1 + math.log(count)) * self.idf.get(gram, self.default_idf)
+        norm = math.sqrt(sum(value * value for value in weights.values())) or 1.0
+        return (np.fromiter(weights, dtype=np.intp, count=len(weights)),
+                np.fromiter(weights.values(), dtype=np.float32, count=len(weights)) / norm)
+
+    def transform(self, text):
+        """Normalised float32 vector of one text"""
+        indices, values = self.transform_sparse(text)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        vector[indices] = values
+        return vector
+
+    def transform_many(self, texts):
+        """(dim, len(texts)) matrix with one column per text"""
+        matrix = np.zeros((self.dim, len(texts)), dtype=np.float32)
+        for column, text in enumerate(texts):
+            indices, values = self.transform_sparse(text)
+            matrix[indices, column] = values
+        return matrix
+
+
+class ExampleStore:
+    """
+    Few-shot examples with a nearest-neighbour index
+
+    Parameters:
+    - examples: Example dicts
+    - key: Field (or function(example) -> text) matched against incoming messages
+    - render: function(example) -> prompt text for the example (default: str)
+    - dim: Embedding dimensions
+    """
+
+    def __init__(self, examples=(), key="input", render=str, dim=1024):
+        self.key = key if callable(key) else (lambda example: example[key])
+        self.render = render
+        self.vectorizer = HashingTfidf(dim)
+        self.examples = []
+        self._tokens = []
+        self._matrix = None
+        self.add(examples)
+
+    def add(self, examples):
+        """Add examples; the index is rebuilt on the next select()"""
+        for example in examples:
+            self.examples.append(example)
+            self._tokens.append(count_tokens(self.render(example)))
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.examples)
+
+    def build(self):
+        """(Re)compute IDF weights and embed every example"""
+        texts = [self.key(example) for example in self.examples]
+        self.vectorizer.fit(texts)
+        self._matrix = self.vectorizer.transform_many(texts)
+        self._token_array = np.asarray(self._tokens)
+
+    def select(self, message, k=4, token_budget=None, min_similarity=0.0):
+        """
+        Up to k examples most similar to message, best first, whose rendered
+        text fits into token_budget tokens in total (None = no budget)
+        """
+        if not self.examples:
+            return []
+        if self._matrix is None:
+            self.build()
+        indices, values = self.vectorizer.transform_sparse(message)
+        scores = values @ self._matrix[indices]
+        # More candidates than k, so examples skipped for the budget can be replaced
+        candidates = min(len(scores), k * 4)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top = top[np.argsort(-scores[top])]
+
+        chosen, used = [], 0
+        for index in top:
+            if scores[index] < min_similarity or len(chosen) == k:
+                break
+            tokens = int(self._token_array[index])
+            if token_budget is not None and used + tokens > token_budget:
+                continue
+            chosen.append(self.examples[index])
+            used += tokens
+        return chosen
+
+    def render_selection(self, message, k=4, token_budget=None, separator="\n\n"):
+        """Rendered text of select(message, ...), numbered Example 1, 2, ..."""
+        chosen = self.select(message, k, token_budget)
+        return separator.join(f"Example {number}:\n{self.render(example)}"
+                              for number, example in enumerate(chosen, 1))
+
+
+def _synthetic_examples(count, seed=0):
+    rng = random.Random(seed)
+    products = ["laptop", "mouse", "keyboard", "headset", "monitor", "webcam", "charger", "dock"]
+    problems = ["arrived damaged", "stopped working", "is missing parts", "was charged twice", "ships late",
+                "won't connect over bluetooth", "makes a clicking noise", "has a flickering screen"]
+    openers = ["Hi,", "Hello team,", "Urgent:", "Quick question:", "Not happy -", ""]
+    return [{"input": f"{rng.choice(openers)} my {rng.choice(products)} {rng.choice(problems)} "
+                      f"(order #{rng.randint(10000, 99999)}), what can you do?",
+             "output": "..."} for _ in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark few-shot example selection")
+    parser.add_argument("--examples", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    store = ExampleStore(_synthetic_examples(args.examples), dim=args.dim,
+                         render=lambda example: f"Input: {example['input']}\nOutput: {example['output']}")
+    started = time.perf_counter()
+    store.build()
+    print(f"Indexed {len(store)} examples in {time.perf_counter() - started:.2f}s "
+          f"({store._matrix.nbytes / 1e6:.1f} MB)")
+
+    queries = [example["input"] for example in _synthetic_examples(args.queries, seed=1)]
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        store.select(query, k=args.k, token_budget=400)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"select(): p50 {1e3 * timings[len(timings) // 2]:.3f} ms  "
+          f"p99 {1e3 * timings[int(len(timings) * 0.99)]:.3f} ms")
@@ -0,0 +1,661 @@
+"""
+Local fake Responses API server for offline load testing
+
+Implements `POST /v1/responses` (plain and `stream=True`) in the same JSON /
+server-sent-event shapes as the real API, so every technique module can run
+against it by pointing the shared clients at its base URL:
+
+    python fake_responses_server.py --port 8808 --latency lognormal:0.8,0.4 --tokens-per-second 80
+    OPENAI_BASE_URL=http://127.0.0.1:8808/v1 OPENAI_API_KEY=fake python 07_react.py
+
+What it can simulate:
+- Canned or templated `output_text` (--text, or --responses-file with regex rules)
+- Time-to-first-token drawn from a latency distribution (--latency)
+- Generation speed (--tokens-per-second), applied to streamed deltas too
+- Prompt caching (--prompt-cache): the longest input prefix seen before, from
+  1,024 tokens in 128-token steps, is reported as usage cached_tokens and
+  shortens the time to first token by up to half (by the cached share)
+- Requests/tokens per minute limits answered with 429 + retry-after (--rpm, --tpm)
+- Random 429 and 5xx errors (--error-rate-429, --error-rate-5xx)
+- The Files and Batch APIs (`/v1/files`, `/v1/batches`): uploaded JSONL
+  batches are answered with the same rules after --batch-delay seconds, so
+  batch_jobs.py can be tested end to end
+
+The server is a small asyncio HTTP/1.1 implementation (keep-alive, chunked
+streaming, no thread per connection), so it stays out of the way when 64+
+callers hit it at once. `GET /stats` returns request and error counters.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+
+DEFAULT_TEXT = "This is a canned response from the local fake Responses API."
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+           429: "Too Many Requests", 500: "Internal Server Error", 502: "Bad Gateway",
+           503: "Service Unavailable"}
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def input_text(body):
+    """Flatten the `input` of a request body into plain text"""
+    value = body.get("input", "")
+    if isinstance(value, str):
+        return value
+    parts = []
+    for message in value:
+        content = message.get("content", "") if isinstance(message, dict) else ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(str(content))
+    return "\n".join(parts)
+
+
+def parse_latency(spec):
+    """
+    Turn a latency spec into a function returning seconds
+
+    Accepts a number (fixed) or "fixed:S", "uniform:LOW,HIGH", "normal:MEAN,STD",
+    "lognormal:MEDIAN,SIGMA" or "exponential:MEAN" (all in seconds).
+    """
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+
+    name, _, args = str(spec).partition(":")
+    if not args:
+        return lambda: float(name)
+    values = [float(value) for value in args.split(",")]
+    if name == "fixed":
+        return lambda: values[0]
+    if name == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if name == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if name == "lognormal":
+        return lambda: values[0] * random.lognormvariate(0.0, values[1])
+    if name == "exponential":
+        return lambda: random.expovariate(1.0 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def load_rules(path):
+    """
+    Load templated response rules from a JSON file
+
+    Format: [{"match": "<regex on the input text>", "text": "<template>"}, ...]
+    Templates may use {model}, {input}, {request_number} and {uuid}.
+    """
+    with open(path) as f:
+        return [(re.compile(rule.get("match", ""), re.S), rule["text"]) for rule in json.load(f)]
+
+
+def parse_multipart(raw_body, content_type):
+    """Split a multipart/form-data body into {field name: bytes}"""
+    boundary = re.search(r'boundary="?([^";]+)"?', content_type).group(1).encode()
+    fields = {}
+    for part in raw_body.split(b"--" + boundary)[1:]:
+        if part.startswith(b"--"):
+            break
+        head, _, value = part.partition(b"\r\n\r\n")
+        name = re.search(rb'name="([^"]*)"', head)
+        filename = re.search(rb'filename="([^"]*)"', head)
+        if name:
+            fields[name.group(1).decode()] = value[:-2] if value.endswith(b"\r\n") else value
+        if filename:
+            fields["filename"] = filename.group(1).decode()
+    return fields
+
+
+class TokenBucket:
+    """Per-minute budget that refills continuously"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def take(self, amount):
+        """Spend `amount`; returns 0 on success or the seconds to wait"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+        if amount <= self.tokens:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) * 60 / self.capacity
+
+
+def build_response(body, text, status="completed", response_id=None, message_id=None, cached_tokens=0):
+    """Build a Response object (as a dict) for a request body"""
+    input_tokens = estimate_tokens(input_text(body))
+    output_tokens = estimate_tokens(text) if text else 0
+    message = {
+        "type": "message",
+        "id": message_id or f"msg_{uuid.uuid4().hex}",
+        "status": status,
+        "role": "assistant",
+        "content": [{"type": "output_text", "text": text, "annotations": []}],
+    }
+    return {
+        "id": response_id or f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": status,
+        "error": None,
+        "model": body.get("model", "fake-model"),
+        "output": [message] if text or status == "completed" else [],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "temperature": body.get("temperature"),
+        "max_output_tokens": body.get("max_output_tokens"),
+        "previous_response_id": body.get("previous_response_id"),
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": cached_tokens},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        } if status == "completed" else None,
+    }
+
+
+class FakeResponsesServer:
+    """
+    Minimal asyncio HTTP server speaking the Responses API
+
+    Behaviour comes from `self.config` and is read on every request, so it can
+    be changed while the server is running. See `start_server` for the keys.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, **config):
+        self.host = host
+        self.port = port
+        self.config = {
+            "latency": 0.0,
+            "tokens_per_second": None,
+            "text": DEFAULT_TEXT,
+            "rules": [],
+            "rpm": None,
+            "tpm": None,
+            "error_rate_429": 0.0,
+            "error_rate_5xx": 0.0,
+            "stream_chunk_tokens": 4,
+            "batch_delay": 1.0,
+            "prompt_cache": False,
+        }
+        self.config.update(config)
+        self.stats = Counter()
+        self._prefixes = set()  # hashes of input prefixes seen (prompt cache)
+        self.routes = {("POST", "/v1/responses"): self.create_response,
+                       ("POST", "/v1/files"): self.create_file,
+                       ("GET", "/v1/files/{id}"): self.get_file,
+                       ("GET", "/v1/files/{id}/content"): self.get_file_content,
+                       ("POST", "/v1/batches"): self.create_batch,
+                       ("GET", "/v1/batches/{id}"): self.get_batch,
+                       ("POST", "/v1/batches/{id}/cancel"): self.cancel_batch,
+                       ("GET", "/stats"): self.get_stats}
+        self.files = {}  # file id -> (file object, content bytes)
+        self.batches = {}  # batch id -> batch object
+        self.loop = None
+        self.connections = set()
+        self._request_numbers = itertools.count(1)
+        self._buckets = {}
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    # ---- HTTP plumbing -------------------------------------------------
+
+    async def handle_connection(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if headers.get("transfer-encoding", "").lower() == "chunked":
+                    raw_body = b""
+                    while True:
+                        size = int((await reader.readline()).split(b";")[0], 16)
+                        chunk = await reader.readexactly(size + 2)
+                        if not size:
+                            break
+                        raw_body += chunk[:-2]
+                else:
+                    length = int(headers.get("content-length", 0))
+                    raw_body = await reader.readexactly(length) if length else b""
+
+                await self.route(method, path.split("?", 1)[0].rstrip("/"), raw_body, writer,
+                                 headers.get("content-type", ""))
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def send_json(self, writer, status, payload, extra_headers=None):
+        data = json.dumps(payload).encode()
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(data)}"]
+        for name, value in (extra_headers or {}).items():
+            head.append(f"{name}: {value}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+        await writer.drain()
+
+    async def send_bytes(self, writer, data, content_type="application/octet-stream"):
+        writer.write((f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                      f"Content-Length: {len(data)}\r\n\r\n").encode() + data)
+        await writer.drain()
+
+    async def send_error(self, writer, status, message, error_type="invalid_request_error", extra_headers=None):
+        self.stats[f"status_{status}"] += 1
+        await self.send_json(writer, status, {"error": {"message": message, "type": error_type}}, extra_headers)
+
+    async def start_event_stream(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n")
+        await writer.drain()
+
+    async def send_event(self, writer, event):
+        data = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+
+    async def end_event_stream(self, writer):
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    # ---- Routes --------------------------------------------------------
+
+    def match_route(self, method, path):
+        """Find the handler for a path; "{id}" segments are passed as keyword arguments"""
+        handler = self.routes.get((method, path))
+        if handler is not None:
+            return handler, {}, True
+        path_matched = False
+        parts = path.split("/")
+        for (route_method, route_path), route_handler in self.routes.items():
+            route_parts = route_path.split("/")
+            if len(route_parts) != len(parts):
+                continue
+            params = {}
+            for route_part, part in zip(route_parts, parts):
+                if route_part.startswith("{") and route_part.endswith("}"):
+                    params[route_part[1:-1]] = part
+                elif route_part != part:
+                    break
+            else:
+                path_matched = True
+                if route_method == method:
+                    return route_handler, params, True
+        return None, {}, path_matched
+
+    async def route(self, method, path, raw_body, writer, content_type=""):
+        handler, params, path_matched = self.match_route(method, path)
+        if handler is None:
+            if path_matched:
+                await self.send_error(writer, 405, f"{method} not supported on {path}")
+            else:
+                await self.send_error(writer, 404, f"Unknown path {path}")
+            return
+        if content_type.startswith("multipart/form-data"):
+            body = parse_multipart(raw_body, content_type)
+        else:
+            try:
+                body = json.loads(raw_body or b"{}")
+            except json.JSONDecodeError:
+                await self.send_error(writer, 400, "Request body is not valid JSON")
+                return
+        await handler(body, writer, **params)
+
+    async def get_stats(self, body, writer):
+        await self.send_json(writer, 200, dict(self.stats))
+
+    def render_text(self, body):
+        text = input_text(body)
+        template = self.config["text"]
+        for pattern, rule_template in self.config["rules"]:
+            if pattern.search(text):
+                template = rule_template
+                break
+        return template.format_map({
+            "model": body.get("model", "fake-model"),
+            "input": text[-200:],
+            "request_number": next(self._request_numbers),
+            "uuid": uuid.uuid4().hex,
+        })
+
+    def cached_prefix_tokens(self, body):
+        """Tokens of the longest cacheable input prefix seen before (remembers this input's prefixes)"""
+        if not self.config["prompt_cache"]:
+            return 0
+        # Role and cache key are part of the prefix, like the position of each message is
+        text = f"{body.get('prompt_cache_key')}\n" + json.dumps(body.get("input", ""))
+        cached = 0
+        for tokens in range(1024, estimate_tokens(text) + 1, 128):
+            key = hash(text[:tokens * 4])
+            if key in self._prefixes:
+                cached = tokens
+            else:
+                self._prefixes.add(key)
+        return min(cached, estimate_tokens(input_text(body)))
+
+    def check_limits(self, tokens):
+        """Return an error (status, message, headers) to inject, or None"""
+        config = self.config
+        for name, amount in (("rpm", 1), ("tpm", tokens)):
+            if config[name]:
+                bucket = self._buckets.get(name)
+                if bucket is None or bucket.capacity != config[name]:
+                    bucket = self._buckets[name] = TokenBucket(config[name])
+                wait = bucket.take(amount)
+                if wait:
+                    headers = {"retry-after-ms": str(int(wait * 1000)), "retry-after": str(max(1, round(wait)))}
+                    return 429, f"Rate limit reached ({name.upper()} {config[name]})", headers
+
+        if random.random() < config["error_rate_429"]:
+            return 429, "Injected rate limit error", {"retry-after-ms": "100"}
+        if random.random() < config["error_rate_5xx"]:
+            return random.choice([500, 502, 503]), "Injected server error", {}
+        return None
+
+    async def create_response(self, body, writer):
+        self.stats["requests"] += 1
+        text = self.render_text(body)
+        error = self.check_limits(estimate_tokens(input_text(body)) + estimate_tokens(text))
+        if error:
+            status, message, headers = error
+            error_type = "rate_limit_error" if status == 429 else "server_error"
+            await self.send_error(writer, status, message, error_type, headers)
+            return
+
+        cached_tokens = self.cached_prefix_tokens(body)
+        latency = parse_latency(self.config["latency"])()
+        if cached_tokens:
+            latency *= 1 - cached_tokens / estimate_tokens(input_text(body)) / 2
+        await asyncio.sleep(latency)
+        if body.get("stream"):
+            self.stats["streams"] += 1
+            await self.stream_response(body, text, writer, cached_tokens)
+        else:
+            tokens_per_second = self.config["tokens_per_second"]
+            if tokens_per_second:
+                await asyncio.sleep(estimate_tokens(text) / tokens_per_second)
+            await self.send_json(writer, 200, build_response(body, text, cached_tokens=cached_tokens))
+        self.stats["status_200"] += 1
+
+    async def stream_response(self, body, text, writer, cached_tokens=0):
+        response_id = f"resp_{uuid.uuid4().hex}"
+        message_id = f"msg_{uuid.uuid4().hex}"
+        sequence = itertools.count()
+        chunk_chars = 4 * self.config["stream_chunk_tokens"]
+        tokens_per_second = self.config["tokens_per_second"]
+
+        def event(event_type, **fields):
+            return {"type": event_type, "sequence_number": next(sequence), **fields}
+
+        in_progress = build_response(body, "", "in_progress", response_id, message_id)
+        part = {"type": "output_text", "text": "", "annotations": []}
+        item = {"type": "message", "id": message_id, "status": "in_progress", "role": "assistant", "content": []}
+        location = {"item_id": message_id, "output_index": 0, "content_index": 0}
+
+        await self.start_event_stream(writer)
+        await self.send_event(writer, event("response.created", response=in_progress))
+        await self.send_event(writer, event("response.in_progress", response=in_progress))
+        await self.send_event(writer, event("response.output_item.added", output_index=0, item=item))
+        await self.send_event(writer, event("response.content_part.added", part=part, **location))
+        for start in range(0, len(text), chunk_chars):
+            if tokens_per_second and start:
+                await asyncio.sleep(self.config["stream_chunk_tokens"] / tokens_per_second)
+            delta = text[start:start + chunk_chars]
+            await self.send_event(writer, event("response.output_text.delta", delta=delta, logprobs=[], **location))
+        await self.send_event(writer, event("response.output_text.done", text=text, logprobs=[], **location))
+        await self.send_event(writer, event("response.content_part.done", part=dict(part, text=text), **location))
+
+        completed = build_response(body, text, "completed", response_id, message_id, cached_tokens)
+        await self.send_event(writer, event("response.output_item.done", output_index=0, item=completed["output"][0]))
+        await self.send_event(writer, event("response.completed", response=completed))
+        await self.end_event_stream(writer)
+
+    # ---- Files and batches ---------------------------------------------
+
+    def add_file(self, content, filename, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        file_object = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                       "filename": filename, "purpose": purpose, "status": "processed"}
+        self.files[file_id] = (file_object, content)
+        return file_object
+
+    async def create_file(self, body, writer):
+        if "file" not in body:
+            await self.send_error(writer, 400, "Missing file")
+            return
+        purpose = body.get("purpose", b"batch")
+        purpose = purpose.decode() if isinstance(purpose, bytes) else purpose
+        await self.send_json(writer, 200, self.add_file(body["file"], body.get("filename", "upload.jsonl"), purpose))
+
+    async def get_file(self, body, writer, id):
+        if id not in self.files:
+            await self.send_error(writer, 404, f"No such file: {id}")
+            return
+        await self.send_json(writer, 200, self.files[id][0])
+
+    async def get_file_content(self, body, writer, id):
+        if id not in self.files:
+            await self.send_error(writer, 404, f"No such file: {id}")
+            return
+        await self.send_bytes(writer, self.files[id][1], "application/jsonl")
+
+    async def create_batch(self, body, writer):
+        input_file_id = body.get("input_file_id")
+        if input_file_id not in self.files:
+            await self.send_error(writer, 400, f"No such file: {input_file_id}")
+            return
+        lines = self.files[input_file_id][1].splitlines()
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}",
+            "object": "batch",
+            "endpoint": body.get("endpoint", "/v1/responses"),
+            "errors": None,
+            "input_file_id": input_file_id,
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "in_progress_at": None,
+            "finalizing_at": None,
+            "completed_at": None,
+            "cancelled_at": None,
+            "request_counts": {"total": len([line for line in lines if line.strip()]), "completed": 0, "failed": 0},
+            "metadata": body.get("metadata"),
+        }
+        self.batches[batch["id"]] = batch
+        self.stats["batches"] += 1
+        asyncio.create_task(self.run_batch(batch, lines))
+        await self.send_json(writer, 200, batch)
+
+    async def get_batch(self, body, writer, id):
+        if id not in self.batches:
+            await self.send_error(writer, 404, f"No such batch: {id}")
+            return
+        await self.send_json(writer, 200, self.batches[id])
+
+    async def cancel_batch(self, body, writer, id):
+        batch = self.batches.get(id)
+        if batch is None:
+            await self.send_error(writer, 404, f"No such batch: {id}")
+            return
+        if batch["status"] in ("validating", "in_progress"):
+            batch["status"] = "cancelling"
+        await self.send_json(writer, 200, batch)
+
+    async def run_batch(self, batch, lines):
+        """Answer every request line after `batch_delay`, then write output / error files"""
+        delay = self.config["batch_delay"]
+        await asyncio.sleep(delay / 4)
+        if batch["status"] == "cancelling":
+            batch.update(status="cancelled", cancelled_at=int(time.time()))
+            return
+        batch.update(status="in_progress", in_progress_at=int(time.time()))
+        await asyncio.sleep(delay / 2)
+
+        outputs, errors = [], []
+        for line in lines:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            request_id = f"batch_req_{uuid.uuid4().hex[:24]}"
+            if random.random() < self.config["error_rate_5xx"]:
+                errors.append({"id": request_id, "custom_id": request["custom_id"], "response": None,
+                               "error": {"code": "server_error", "message": "Injected server error"}})
+                continue
+            body = request.get("body", {})
+            response = build_response(body, self.render_text(body))
+            outputs.append({"id": request_id, "custom_id": request["custom_id"],
+                            "response": {"status_code": 200, "request_id": request_id, "body": response},
+                            "error": None})
+            self.stats["batch_requests"] += 1
+
+        if batch["status"] == "cancelling":
+            batch.update(status="cancelled", cancelled_at=int(time.time()))
+            return
+        batch.update(status="finalizing", finalizing_at=int(time.time()))
+        await asyncio.sleep(delay / 4)
+
+        def to_jsonl(records):
+            return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+        if outputs:
+            batch["output_file_id"] = self.add_file(to_jsonl(outputs), "batch_output.jsonl", "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = self.add_file(to_jsonl(errors), "batch_errors.jsonl", "batch_output")["id"]
+        batch["request_counts"].update(completed=len(outputs), failed=len(errors))
+        batch.update(status="completed", completed_at=int(time.time()))
+
+    # ---- Lifecycle -----------------------------------------------------
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    def start(self):
+        """Run the server on a background thread with its own event loop"""
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.serve())
+            ready.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    async def stop(self):
+        self._server.close()
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.sleep(0)  # let handlers see EOF and exit
+
+    def shutdown(self):
+        """Stop a server started with start()"""
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result(timeout=5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+
+
+def start_server(host="127.0.0.1", port=0, **config):
+    """
+    Start the fake server on a background thread
+
+    Parameters:
+    - host, port: Address to bind (port 0 = pick a free port)
+    - latency: Time to first token; seconds or a spec such as "lognormal:0.8,0.4"
+    - tokens_per_second: Generation speed added on top of latency (None = instant)
+    - text: Template for `output_text` (default: a canned sentence)
+    - rules: [(compiled regex, template)] tried against the input first (see load_rules)
+    - rpm, tpm: Requests / tokens per minute before answering 429
+    - error_rate_429, error_rate_5xx: Probability of injecting each error
+      (5xx errors also fail individual batch requests)
+    - batch_delay: Seconds a batch takes from creation to "completed"
+    - prompt_cache: Report previously seen input prefixes as cached_tokens
+
+    Returns the server; `server.base_url` is ready to pass to llm_client.configure
+    and `server.shutdown()` stops it.
+    """
+    return FakeResponsesServer(host, port, **config).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake Responses API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency", default="0", help='Seconds, or e.g. "uniform:0.2,0.6", "lognormal:0.8,0.4"')
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Simulated generation speed")
+    parser.add_argument("--text", default=DEFAULT_TEXT, help="output_text template for every request")
+    parser.add_argument("--responses-file", help="JSON list of {match, text} templated response rules")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute before 429")
+    parser.add_argument("--tpm", type=int, default=None, help="Tokens per minute before 429")
+    parser.add_argument("--error-rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0)
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="Seconds until a batch completes")
+    parser.add_argument("--prompt-cache", action="store_true", help="Report repeated input prefixes as cached")
+    args = parser.parse_args()
+
+    parse_latency(args.latency)  # fail fast on a bad spec
+    server = FakeResponsesServer(
+        args.host, args.port,
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        text=args.text,
+        rules=load_rules(args.responses_file) if args.responses_file else [],
+        rpm=args.rpm,
+        tpm=args.tpm,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        batch_delay=args.batch_delay,
+        prompt_cache=args.prompt_cache,
+    )
+
+    async def main():
+        await server.serve()
+        print(f"Fake Responses API listening on {server.base_url}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
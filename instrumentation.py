@@ -0,0 +1,452 @@
+"""
+Per-call instrumentation: nested timing spans, token usage and cost
+
+Every `responses.create` made through llm_client.py runs inside an "llm"
+span that records the model, latency, time to first token, input / cached /
+output / reasoning tokens and an estimated cost. Spans nest through a
+ContextVar, so a technique decorated with @traced and its steps wrapped in
+`with span("step 1"):` show up as a tree:
+
+    prompt_chain_customer_email_processing     2.31s  4 calls  3,120 tok  $0.0312
+      step 1: extraction                       0.52s
+        responses.create                       0.52s  gpt-5.2  in 410 / out 95
+      ...
+
+Finished spans go to:
+- exporters: callables receiving each finished span, e.g. JsonlExporter (one
+  JSON object per span with trace_id / span_id / parent_id)
+- metrics: Prometheus counters and histograms per technique and model,
+  rendered by render_prometheus() or served by start_metrics_server()
+
+Settings (environment variables):
+- LLM_TRACE_FILE: Append every span to this JSONL file
+- LLM_METRICS_PORT: Serve Prometheus metrics on this port (/metrics)
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# USD per 1M tokens: (input, cached input, output). Estimates, edit to match your contract.
+PRICES = {
+    "gpt-5.2": (1.75, 0.175, 14.00),
+    "gpt-5.2-mini": (0.25, 0.025, 2.00),
+    "gpt-5": (1.25, 0.125, 10.00),
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_span = ContextVar("current_span", default=None)
+exporters = []
+_last_trace = None
+
+
+def estimate_cost(model, input_tokens, cached_tokens, output_tokens):
+    """Estimated USD cost of one call (None for models missing from PRICES)"""
+    price = PRICES.get(model)
+    if price is None:
+        # Dated snapshots ("gpt-5.2-2025-12-11") are priced like their base model
+        price = next((PRICES[name] for name in sorted(PRICES, key=len, reverse=True)
+                      if model.startswith(name + "-")), None)
+    if price is None:
+        return None
+    input_price, cached_price, output_price = price
+    return ((input_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + output_tokens * output_price) / 1_000_000
+
+
+class Span:
+    """One timed operation; `children` holds the spans opened inside it"""
+
+    def __init__(self, name, parent=None, **attributes):
+        self.name = name
+        self.parent = parent
+        self.attributes = attributes
+        self.children = []
+        self.trace_id = parent.trace_id if parent else os.urandom(8).hex()
+        self.span_id = os.urandom(8).hex()
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.time_to_first_token = None
+        self.status = "ok"
+        self.error = None
+        if parent is not None:
+            parent.children.append(self)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def mark_first_token(self):
+        """Record time to first token (first streamed delta); later calls are ignored"""
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self._started
+
+    @property
+    def technique(self):
+        """Name of the outermost span, or an explicit `technique` attribute"""
+        span = self
+        while span is not None:
+            if "technique" in span.attributes:
+                return span.attributes["technique"]
+            if span.parent is None:
+                return span.name
+            span = span.parent
+
+    @property
+    def step(self):
+        """Name of the enclosing span (the chain step or loop iteration)"""
+        return self.parent.name if self.parent is not None else None
+
+    def llm_spans(self):
+        """This span and all descendants that are model calls"""
+        if self.attributes.get("kind") == "llm":
+            yield self
+        for child in self.children:
+            yield from child.llm_spans()
+
+    def totals(self):
+        """Calls, tokens and cost summed over the subtree"""
+        totals = {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0,
+                  "reasoning_tokens": 0, "cost_usd": 0.0}
+        for span in self.llm_spans():
+            totals["calls"] += 1
+            for key in ("input_tokens", "cached_tokens", "output_tokens", "reasoning_tokens"):
+                totals[key] += span.attributes.get(key, 0)
+            totals["cost_usd"] += span.attributes.get("cost_usd") or 0.0
+        return totals
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "technique": self.technique,
+            "step": self.step,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "time_to_first_token": self.time_to_first_token,
+            "status": self.status,
+            "error": self.error,
+            **self.attributes,
+        }
+
+    def fail(self, error):
+        cancelled = isinstance(error, GeneratorExit) or type(error).__name__ == "CancelledError"
+        self.status = "cancelled" if cancelled else "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def finish(self):
+        global _last_trace
+
+        self.duration = time.perf_counter() - self._started
+        metrics.observe_span(self)
+        for exporter in list(exporters):
+            exporter(self)
+        if self.parent is None:
+            _last_trace = self
+
+
+def current_span():
+    return _current_span.get()
+
+
+def start_span(name, **attributes):
+    """
+    Create a child of the current span without making it current
+
+    For work that outlives the calling frame, such as a stream consumed by a
+    generator; the caller must call fail()/finish() on it.
+    """
+    return Span(name, _current_span.get(), **attributes)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Open a span as a child of the current one for the duration of the block"""
+    new_span = start_span(name, **attributes)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.finish()
+
+
+def traced(name=None, **attributes):
+    """Decorator running a (sync or async) function inside a span named after it"""
+    def decorator(function):
+        span_name = name or function.__name__
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def last_trace():
+    """The most recently finished root span"""
+    return _last_trace
+
+
+def _get(value, name, default=None):
+    # Cached responses may hold plain dicts where the SDK would build models
+    if value is None:
+        return default
+    if isinstance(value, dict):
+        return value.get(name, default)
+    return getattr(value, name, default)
+
+
+def record_response(llm_span, response, cached=False):
+    """Copy usage and estimated cost from a Response onto an llm span"""
+    usage = _get(response, "usage")
+    input_tokens = _get(usage, "input_tokens", 0) or 0
+    output_tokens = _get(usage, "output_tokens", 0) or 0
+    cached_tokens = _get(_get(usage, "input_tokens_details"), "cached_tokens", 0) or 0
+    reasoning_tokens = _get(_get(usage, "output_tokens_details"), "reasoning_tokens", 0) or 0
+    model = llm_span.attributes.get("model") or _get(response, "model", "")
+    if cached:
+        # Served from the local response cache: nothing was billed
+        cost = 0.0
+    else:
+        cost = estimate_cost(model, input_tokens, cached_tokens, output_tokens)
+    llm_span.set(
+        response_cached=cached,
+        input_tokens=input_tokens,
+        cached_tokens=cached_tokens,
+        output_tokens=output_tokens,
+        reasoning_tokens=reasoning_tokens,
+        cost_usd=cost,
+    )
+    llm_span.mark_first_token()  # no-op if streaming already marked the first delta
+
+
+def format_tree(root):
+    """Render a span tree as indented text (durations, calls, tokens, cost)"""
+    lines = []
+
+    def visit(node, depth):
+        label = ("  " * depth + node.name)[:48]
+        line = f"{label:<48} {node.duration or 0:>6.2f}s"
+        if node.attributes.get("kind") == "llm":
+            a = node.attributes
+            line += (f"  {a.get('model')}  in {a.get('input_tokens', 0)} (cached {a.get('cached_tokens', 0)})"
+                     f" / out {a.get('output_tokens', 0)}")
+            if a.get("streamed") and node.time_to_first_token is not None:
+                line += f"  ttft {node.time_to_first_token:.2f}s"
+            if a.get("response_cached"):
+                line += "  [response cache]"
+        else:
+            totals = node.totals()
+            line += f"  {totals['calls']} calls  {totals['input_tokens'] + totals['output_tokens']:,} tok" \
+                    f"  ${totals['cost_usd']:.4f}"
+        if node.status != "ok":
+            line += f"  {node.status}: {node.error}"
+        lines.append(line)
+        for child in node.children:
+            visit(child, depth + 1)
+
+    visit(root, 0)
+    return "\n".join(lines)
+
+
+# ---- Exporters -----------------------------------------------------------
+
+class JsonlExporter:
+    """Append each finished span as one JSON line"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __call__(self, finished_span):
+        line = json.dumps(finished_span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def add_exporter(exporter):
+    exporters.append(exporter)
+    return exporter
+
+
+def remove_exporter(exporter):
+    exporters.remove(exporter)
+
+
+# ---- Prometheus metrics --------------------------------------------------
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metrics:
+    """Thread-safe counters and histograms in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: [bucket counts..., sum, count]}
+        self._help = {}
+        self._collectors = []
+
+    def inc(self, name, value=1, help="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, help="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def register_collector(self, collector):
+        """
+        Add a function called at render time, returning (name, type, help,
+        [(labels dict, value), ...]) tuples, e.g. for cache hit rates
+        """
+        self._collectors.append(collector)
+
+    def observe_span(self, finished_span):
+        attributes = finished_span.attributes
+        technique = finished_span.technique
+        if attributes.get("kind") != "llm":
+            self.observe("llm_span_duration_seconds", finished_span.duration,
+                         "Duration of technique / step spans", technique=technique, span=finished_span.name)
+            return
+
+        labels = dict(technique=technique, model=attributes.get("model", ""))
+        source = "response_cache" if attributes.get("response_cached") else "api"
+        self.inc("llm_calls_total", 1, "Model calls", status=finished_span.status, source=source, **labels)
+        if finished_span.status != "ok":
+            return
+        for kind in ("input", "cached", "output", "reasoning"):
+            tokens = attributes.get(f"{kind}_tokens", 0)
+            if tokens:
+                self.inc("llm_tokens_total", tokens, "Tokens by kind (cached/reasoning are subsets)",
+                         kind=kind, **labels)
+        if attributes.get("cost_usd"):
+            self.inc("llm_cost_usd_total", attributes["cost_usd"], "Estimated cost in USD", **labels)
+        if source == "api":
+            self.observe("llm_call_duration_seconds", finished_span.duration, "Model call latency", **labels)
+            if finished_span.time_to_first_token is not None:
+                self.observe("llm_time_to_first_token_seconds", finished_span.time_to_first_token,
+                             "Time to first output token", **labels)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(key)} {value:g}" for key, value in series.items()]
+            for name, series in sorted(self._histograms.items()):
+                lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} histogram"]
+                for key, state in series.items():
+                    for bound, count in zip(LATENCY_BUCKETS, state):
+                        lines.append(f"{name}_bucket{_labels(key + (('le', f'{bound:g}'),))} {count}")
+                    lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {state[-1]}")
+                    lines.append(f"{name}_sum{_labels(key)} {state[-2]:g}")
+                    lines.append(f"{name}_count{_labels(key)} {state[-1]}")
+            collectors = list(self._collectors)
+        for collector in collectors:
+            for name, metric_type, help, samples in collector():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {metric_type}"]
+                lines += [f"{name}{_labels(sorted(labels.items()))} {value:g}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = Metrics()
+
+
+def render_prometheus():
+    return metrics.render()
+
+
+def start_metrics_server(port=9464, host="127.0.0.1"):
+    """Serve render_prometheus() at http://host:port/metrics from a daemon thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+if os.getenv("LLM_TRACE_FILE"):
+    add_exporter(JsonlExporter(os.environ["LLM_TRACE_FILE"]))
+if os.getenv("LLM_METRICS_PORT"):
+    start_metrics_server(int(os.environ["LLM_METRICS_PORT"]))
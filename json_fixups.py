@@ -0,0 +1,228 @@
+"""
+Local repair of near-valid JSON model output
+
+Models asked for "only JSON" still often wrap it in a ``` fence, put a
+sentence before or after it, or make small syntax slips. Each of those fails
+json.loads, and re-requesting costs a full model call. repair_json() fixes
+the common cases locally first:
+- code fences and prose around the JSON object / array
+- trailing commas before } or ]
+- // and /* */ comments
+- single-quoted and curly-quoted strings, unquoted keys
+- Python literals (True / False / None)
+- raw newlines and tabs inside strings
+
+Anything else (missing commas, truncated output) is left to a re-request, as
+is an answer holding more than one JSON value ('{"a": 1}{"b": 2}'), which
+can't be reduced to one without guessing.
+
+    value, fixes = repair_json(text)   # fixes == [] if the text was valid JSON
+    value = loads(text)                # value only, e.g. as a chains.Step parse
+
+Outcomes are counted (see stats()) and exported on the Prometheus endpoint
+(see instrumentation.py) as json_repair_* series, so the share of outputs
+that were repaired instead of re-requested can be followed.
+"""
+import json
+import re
+import threading
+from collections import Counter
+
+import instrumentation
+
+_FENCE = re.compile(r"^[ \t]*```[\w+-]*[ \t]*$", re.MULTILINE)
+_WORD = re.compile(r"[A-Za-z_$][\w$-]*")
+_KEY_FOLLOWS = re.compile(r"\s*:")
+_LITERALS = {"True": "true", "False": "false", "None": "null", "true": "true", "false": "false", "null": "null"}
+_QUOTES = {'"': '"', "'": "'", "“": "”", "‘": "’"}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+_lock = threading.Lock()
+_outcomes = Counter()  # parsed (valid as-is) / repaired / failed
+_fixes = Counter()
+
+
+def repair_json(text):
+    """
+    Parse model output as JSON, repairing it if needed
+
+    Returns (value, fixes) where fixes names the repairs applied ([] if the
+    text parsed as-is). Raises ValueError if it can't be repaired.
+    """
+    try:
+        value = json.loads(text)
+    except ValueError:
+        pass
+    else:
+        _record("parsed")
+        return value, []
+
+    fixes = []
+    unfenced = _FENCE.sub("", text)
+    if unfenced != text:
+        fixes.append("code_fence")
+        text = unfenced
+    try:
+        value, start, end = _first_value(text, 0, fixes)
+        if _has_value(text, end):
+            raise ValueError("more than one JSON value")
+    except ValueError as e:
+        _record("failed")
+        raise ValueError(f"Unrepairable JSON: {e}") from None
+    if text[:start].strip() or text[end:].strip():
+        fixes.append("surrounding_text")
+    fixes = list(dict.fromkeys(fixes))
+    _record("repaired", fixes)
+    return value, fixes
+
+
+def loads(text):
+    """json.loads with repair_json's fallback"""
+    return repair_json(text)[0]
+
+
+def stats():
+    """{"parsed", "repaired", "failed", "repair_rate", "fixes": {fix: count}}"""
+    with _lock:
+        outcomes, fixes = dict(_outcomes), dict(_fixes)
+    for outcome in ("parsed", "repaired", "failed"):
+        outcomes.setdefault(outcome, 0)
+    needed = outcomes["repaired"] + outcomes["failed"]
+    return dict(outcomes, repair_rate=outcomes["repaired"] / needed if needed else 0.0, fixes=fixes)
+
+
+def _record(outcome, fixes=()):
+    with _lock:
+        _outcomes[outcome] += 1
+        _fixes.update(fixes)
+
+
+def _first_value(text, position, fixes):
+    """
+    (value, start, end) of the first JSON object / array in text[position:]
+    that parses once normalized
+
+    A candidate that closes but doesn't parse ("[see below]" in a sentence) is
+    skipped for the next one after it; one that never closes (truncated
+    output) ends the search. Text without any { or [ is parsed as it is.
+    """
+    error = None
+    while True:
+        starts = [index for index in (text.find("{", position), text.find("[", position)) if index >= 0]
+        if not starts:
+            if error is not None:
+                raise error
+            if position:
+                raise ValueError("no JSON object or array")
+            return json.loads(text), 0, len(text)
+        start = min(starts)
+        attempt = []
+        normalized, end = _normalize(text, start, attempt)
+        try:
+            value = json.loads(normalized)
+        except ValueError as e:
+            if end is None:
+                raise
+            error, position = e, end
+            continue
+        fixes.extend(attempt)
+        return value, start, end
+
+
+def _has_value(text, position):
+    """Whether another JSON object / array follows text[:position]"""
+    try:
+        _first_value(text, position, [])
+    except ValueError:
+        return False
+    return True
+
+
+def _normalize(text, start, fixes):
+    """
+    Rewrite the JSON object / array starting at text[start] as strict JSON
+    (best effort); returns (json_text, index after it or None if it never closes)
+    """
+    out, depth, i = [], 0, start
+    while i < len(text):
+        char = text[i]
+        if char in _QUOTES:
+            i = _string(text, i, out, fixes)
+            continue
+        if char == "/" and text.startswith(("//", "/*"), i):
+            end = text.find("\n" if text[i + 1] == "/" else "*/", i + 2)
+            i = len(text) if end < 0 else end + (0 if text[i + 1] == "/" else 2)
+            fixes.append("comment")
+            continue
+        if char in "{[":
+            depth += 1
+        elif char in "}]":
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+                fixes.append("trailing_comma")
+            depth -= 1
+        elif char.isalpha() or char in "_$":
+            word = _WORD.match(text, i).group()
+            i += len(word)
+            if _KEY_FOLLOWS.match(text, i):
+                out.append(json.dumps(word))
+                fixes.append("unquoted_key")
+            elif word in _LITERALS:
+                out.append(_LITERALS[word])
+                if _LITERALS[word] != word:
+                    fixes.append("python_literal")
+            else:
+                out.append(word)
+            continue
+        out.append(char)
+        i += 1
+        if depth == 0:
+            return "".join(out), i
+    return "".join(out), None
+
+
+def _string(text, start, out, fixes):
+    """Copy the string starting at text[start] to out as a JSON string; returns the index after it"""
+    quote = text[start]
+    close = _QUOTES[quote]
+    if quote != '"':
+        fixes.append("single_quotes" if quote == "'" else "smart_quotes")
+    chars, i = ['"'], start + 1
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and i + 1 < len(text):
+            escaped = text[i + 1]
+            # \' is not a JSON escape; everything else is kept as written
+            chars.append("'" if escaped == "'" else char + escaped)
+            i += 2
+            continue
+        if char == close or (quote == "“" and char == '"'):
+            i += 1
+            break
+        if char == '"':
+            chars.append('\\"')
+        elif char in _ESCAPES:
+            chars.append(_ESCAPES[char])
+            fixes.append("control_character")
+        else:
+            chars.append(char)
+        i += 1
+    out.append("".join(chars) + '"')
+    return i
+
+
+def _repair_metrics():
+    report = stats()
+    if not report["parsed"] + report["repaired"] + report["failed"]:
+        return []
+    return [
+        ("json_repair_outputs_total", "counter", "Model outputs parsed as JSON, by outcome",
+         [({"outcome": outcome}, report[outcome]) for outcome in ("parsed", "repaired", "failed")]),
+        ("json_repair_fixes_total", "counter", "Repairs applied to near-valid JSON, by kind",
+         [({"fix": fix}, count) for fix, count in sorted(report["fixes"].items())]),
+    ]
+
+
+instrumentation.metrics.register_collector(_repair_metrics)
@@ -0,0 +1,569 @@
+"""
+Incremental JSON parsing and validation for streamed model output
+
+A model asked for JSON streams it a few characters at a time. These helpers
+read the deltas as they arrive instead of waiting for the whole text:
+- StreamingJsonParser parses incrementally and reports every value (object
+  field, array element, the root) as soon as it is complete, with its path,
+  e.g. (("order", "items", 0), {...}); malformed JSON raises at the first bad
+  character. Prose or a ``` fence before the JSON is skipped.
+- compile_schema() turns a JSON Schema subset into a validator the parser
+  calls on the fly: a wrong type is reported when a value starts, an enum or
+  maxLength violation while a string is still streaming, unknown or missing
+  fields when an object closes.
+- parse_stream() drives a stream through both and stops reading (closing the
+  stream, so generation stops and no more output tokens are paid for) as soon
+  as the output is provably invalid (optionally falling back to json_fixups
+  on syntax errors).
+- JsonFieldScanner reports only the top-level fields and never raises (used
+  by chains.py to start downstream steps early).
+
+    validator = compile_schema({"type": "object", "properties": {...}, "required": [...]})
+    result = parse_stream(stream_response(**params), validator, on_value=print)
+    result["value"], result["error"], result["aborted"]
+"""
+import json
+import re
+
+import json_fixups
+
+_WHITESPACE = " \t\r\n"
+_SCALAR_CHARS = set("0123456789+-.eEtrufalsn")
+_TYPES = {
+    "object": dict, "array": list, "string": str, "boolean": bool, "null": type(None),
+}
+_PYTHON_TYPES = {
+    "object": (dict,), "array": (list,), "string": (str,), "number": (int, float), "integer": (int, float),
+    "boolean": (bool,), "null": (type(None),),
+}
+
+
+class JsonStreamError(ValueError):
+    """The streamed text is not valid JSON"""
+
+
+class SchemaError(ValueError):
+    """A streamed value breaks the schema"""
+
+    def __init__(self, path, message):
+        self.path = path
+        location = "/".join(str(part) for part in path) or "(root)"
+        super().__init__(f"{location}: {message}")
+
+
+# ---- Schema -------------------------------------------------------------
+
+class _Node:
+    """One compiled schema node (the subset: type, enum, properties, required,
+    additionalProperties, items, pattern, min/maxLength, minimum/maximum,
+    min/maxItems)"""
+
+    def __init__(self, schema):
+        kinds = schema.get("type")
+        self.types = [kinds] if isinstance(kinds, str) else list(kinds or [])
+        self.enum = schema.get("enum")
+        self.properties = {key: _Node(child) for key, child in schema.get("properties", {}).items()}
+        self.required = list(schema.get("required", []))
+        self.additional = schema.get("additionalProperties", True)
+        self.items = _Node(schema["items"]) if "items" in schema else None
+        self.pattern = re.compile(schema["pattern"]) if "pattern" in schema else None
+        self.min_length = schema.get("minLength")
+        self.max_length = schema.get("maxLength")
+        self.minimum = schema.get("minimum")
+        self.maximum = schema.get("maximum")
+        self.min_items = schema.get("minItems")
+        self.max_items = schema.get("maxItems")
+        self.string_enum = [value for value in self.enum or [] if isinstance(value, str)]
+
+    def child(self, key):
+        if isinstance(key, int):
+            return self.items
+        node = self.properties.get(key)
+        if node is None and isinstance(self.additional, dict):
+            return _Node(self.additional)
+        return node
+
+    def allows(self, kind):
+        if not self.types:
+            return True
+        if kind == "number":
+            return "number" in self.types or "integer" in self.types
+        return kind in self.types
+
+
+class SchemaValidator:
+    """Validator compiled from a JSON Schema (see compile_schema)"""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.root = _Node(schema)
+        self._nodes = {(): self.root}
+        self._check = _compile(self.root)
+
+    def node(self, path):
+        """Schema node for a path (array indices share one node), or None if unconstrained"""
+        key = tuple(-1 if isinstance(part, int) else part for part in path)
+        if key not in self._nodes:
+            parent = self.node(path[:-1])
+            self._nodes[key] = parent.child(path[-1]) if parent is not None else None
+        return self._nodes[key]
+
+    def start(self, path, kind):
+        """A value of `kind` (object/array/string/number/boolean/null) begins at path"""
+        if path:
+            parent = self.node(path[:-1])
+            key = path[-1]
+            if (parent is not None and isinstance(key, str) and key not in parent.properties
+                    and parent.additional is False):
+                raise SchemaError(path, "unexpected field")
+            if parent is not None and isinstance(key, int) and parent.max_items is not None \
+                    and key >= parent.max_items:
+                raise SchemaError(path[:-1], f"more than {parent.max_items} items")
+        node = self.node(path)
+        if node is not None and not node.allows(kind):
+            raise SchemaError(path, f"expected {'/'.join(node.types)}, got {kind}")
+
+    def partial_string(self, path, text):
+        """A string value at path has streamed this far"""
+        node = self.node(path)
+        if node is None:
+            return
+        if node.max_length is not None and len(text) > node.max_length:
+            raise SchemaError(path, f"longer than {node.max_length} characters")
+        if node.enum is not None and not any(value.startswith(text) for value in node.string_enum):
+            raise SchemaError(path, f"not one of {node.enum}")
+
+    def complete(self, path, value):
+        """A value at path is complete"""
+        node = self.node(path)
+        if node is None:
+            return
+        if node.enum is not None and value not in node.enum:
+            raise SchemaError(path, f"{value!r} is not one of {node.enum}")
+        if "integer" in node.types and "number" not in node.types and isinstance(value, float) \
+                and not value.is_integer():
+            raise SchemaError(path, f"{value!r} is not an integer")
+        if isinstance(value, str):
+            if node.min_length is not None and len(value) < node.min_length:
+                raise SchemaError(path, f"shorter than {node.min_length} characters")
+            if node.pattern is not None and not node.pattern.fullmatch(value):
+                raise SchemaError(path, f"{value!r} does not match {node.pattern.pattern}")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if node.minimum is not None and value < node.minimum:
+                raise SchemaError(path, f"{value!r} is below {node.minimum}")
+            if node.maximum is not None and value > node.maximum:
+                raise SchemaError(path, f"{value!r} is above {node.maximum}")
+        elif isinstance(value, dict):
+            missing = [key for key in node.required if key not in value]
+            if missing:
+                raise SchemaError(path, f"missing required {', '.join(missing)}")
+        elif isinstance(value, list) and node.min_items is not None and len(value) < node.min_items:
+            raise SchemaError(path, f"fewer than {node.min_items} items")
+
+    def validate(self, value):
+        """Check a complete (non-streamed) value; raises SchemaError"""
+        try:
+            self._check(value)
+        except _Invalid as error:
+            raise SchemaError(tuple(reversed(error.path)), error.message) from None
+
+
+class _Invalid(Exception):
+    """Raised by compiled checks; the path is collected while unwinding"""
+
+    def __init__(self, message):
+        self.message = message
+        self.path = []
+
+
+def _compile(node):
+    """
+    Turn a schema node into one closure that checks a whole parsed value
+    (no path bookkeeping unless something is wrong)
+    """
+    kinds = node.types
+    allowed = tuple({python_type for kind in kinds for python_type in _PYTHON_TYPES[kind]}) or None
+    exclude_bool = bool(kinds) and "boolean" not in kinds
+    enum = node.enum
+    properties = {key: _compile(child) for key, child in node.properties.items()}
+    required = node.required
+    additional = node.additional
+    extra = _compile(_Node(additional)) if isinstance(additional, dict) else None
+    items = _compile(node.items) if node.items is not None else None
+    integer_only = "integer" in kinds and "number" not in kinds
+    node_check = _scalar_check(node)
+
+    def check(value):
+        if allowed is not None and (not isinstance(value, allowed) or exclude_bool and isinstance(value, bool)):
+            raise _Invalid(f"expected {'/'.join(kinds)}, got {_kind(value)}")
+        if enum is not None and value not in enum:
+            raise _Invalid(f"{value!r} is not one of {enum}")
+        if isinstance(value, dict):
+            for key, item in value.items():
+                child = properties.get(key)
+                if child is None:
+                    if additional is False:
+                        error = _Invalid("unexpected field")
+                        error.path.append(key)
+                        raise error
+                    if extra is None:
+                        continue
+                    child = extra
+                try:
+                    child(item)
+                except _Invalid as error:
+                    error.path.append(key)
+                    raise
+            for key in required:
+                if key not in value:
+                    raise _Invalid(f"missing required {', '.join(k for k in required if k not in value)}")
+        elif isinstance(value, list):
+            if items is not None:
+                for index, item in enumerate(value):
+                    try:
+                        items(item)
+                    except _Invalid as error:
+                        error.path.append(index)
+                        raise
+        elif integer_only and isinstance(value, float) and not value.is_integer():
+            raise _Invalid(f"{value!r} is not an integer")
+        if node_check is not None:
+            node_check(value)
+
+    return check
+
+
+def _scalar_check(node):
+    """Length / pattern / bound / size rules of a node, or None if it has none"""
+    rules = (node.min_length, node.max_length, node.pattern, node.minimum, node.maximum, node.min_items,
+             node.max_items)
+    if all(rule is None for rule in rules):
+        return None
+
+    def check(value):
+        if isinstance(value, str):
+            if node.max_length is not None and len(value) > node.max_length:
+                raise _Invalid(f"longer than {node.max_length} characters")
+            if node.min_length is not None and len(value) < node.min_length:
+                raise _Invalid(f"shorter than {node.min_length} characters")
+            if node.pattern is not None and not node.pattern.fullmatch(value):
+                raise _Invalid(f"{value!r} does not match {node.pattern.pattern}")
+        elif isinstance(value, list):
+            if node.max_items is not None and len(value) > node.max_items:
+                raise _Invalid(f"more than {node.max_items} items")
+            if node.min_items is not None and len(value) < node.min_items:
+                raise _Invalid(f"fewer than {node.min_items} items")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if node.minimum is not None and value < node.minimum:
+                raise _Invalid(f"{value!r} is below {node.minimum}")
+            if node.maximum is not None and value > node.maximum:
+                raise _Invalid(f"{value!r} is above {node.maximum}")
+
+    return check
+
+
+def compile_schema(schema):
+    return SchemaValidator(schema)
+
+
+def _kind(value):
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    for kind, python_type in _TYPES.items():
+        if isinstance(value, python_type):
+            return kind
+    raise TypeError(f"Not a JSON value: {value!r}")
+
+
+# ---- Parser -------------------------------------------------------------
+
+class StreamingJsonParser:
+    """
+    Incremental JSON parser
+
+    Parameters:
+    - validator: Optional SchemaValidator checked as values start and complete
+
+    feed(delta) returns [(path, value)] for the values completed by that
+    chunk, innermost first. After the root value closes, `done` is True and
+    `value` holds it; anything after it is ignored.
+    """
+
+    def __init__(self, validator=None):
+        self.validator = validator
+        self.value = None
+        self.done = False
+        self.position = 0  # characters consumed
+        self._stack = []  # [container, path, expecting, current key] per open object / array
+        self._started = False
+        self._string = None  # characters of the string being read
+        self._string_is_key = False
+        self._escape = None  # None, "" after a backslash, or the hex digits of \uXXXX
+        self._scalar = None  # characters of the number / literal being read
+
+    def feed(self, delta):
+        completed = []
+        for char in delta:
+            if self.done:
+                break
+            self._char(char, completed)
+            self.position += 1
+        if self._string is not None and not self._string_is_key and self.validator is not None:
+            self.validator.partial_string(self._path(), "".join(self._string))
+        return completed
+
+    def close(self):
+        """Finish the stream; returns the root value or raises if it is incomplete"""
+        if not self.done and self._scalar is not None and not self._stack:
+            self._finish_scalar([])
+        if not self.done:
+            raise JsonStreamError("Unexpected end of JSON" if self._started else "No JSON value found")
+        return self.value
+
+    # Path of the value being read: the parent's path plus the key / next index
+    def _path(self):
+        if not self._stack:
+            return ()
+        container, path, _, key = self._stack[-1]
+        return path + ((key,) if isinstance(container, dict) else (len(container),))
+
+    def _error(self, char):
+        raise JsonStreamError(f"Unexpected {char!r} at position {self.position}")
+
+    def _char(self, char, completed):
+        if self._string is not None:
+            self._string_char(char, completed)
+            return
+        if self._scalar is not None:
+            if char in _SCALAR_CHARS:
+                self._scalar.append(char)
+                return
+            self._finish_scalar(completed)
+        if not self._started:
+            if char in "{[":
+                self._started = True
+                self._begin_value(char, completed)
+            return
+        if char in _WHITESPACE:
+            return
+
+        expecting = self._stack[-1][2]
+        if expecting == "key":
+            if char == '"':
+                self._string, self._string_is_key = [], True
+            elif char == "}" and not self._stack[-1][0]:
+                self._close(completed)
+            else:
+                self._error(char)
+        elif expecting == "colon":
+            if char != ":":
+                self._error(char)
+            self._stack[-1][2] = "value"
+        elif expecting == "value":
+            if char == "]" and isinstance(self._stack[-1][0], list) and not self._stack[-1][0]:
+                self._close(completed)
+            else:
+                self._begin_value(char, completed)
+        elif expecting == "comma":
+            container = self._stack[-1][0]
+            if char == ",":
+                self._stack[-1][2] = "key" if isinstance(container, dict) else "value"
+            elif char == ("}" if isinstance(container, dict) else "]"):
+                self._close(completed)
+            else:
+                self._error(char)
+
+    def _begin_value(self, char, completed):
+        path = self._path()
+        if char == "{":
+            kind = "object"
+        elif char == "[":
+            kind = "array"
+        elif char == '"':
+            kind = "string"
+        elif char in "-0123456789":
+            kind = "number"
+        elif char in "tf":
+            kind = "boolean"
+        elif char == "n":
+            kind = "null"
+        else:
+            self._error(char)
+        if self.validator is not None:
+            self.validator.start(path, kind)
+        if kind == "object":
+            self._stack.append([{}, path, "key", None])
+        elif kind == "array":
+            self._stack.append([[], path, "value", None])
+        elif kind == "string":
+            self._string, self._string_is_key = [], False
+        else:
+            self._scalar = [char]
+
+    def _string_char(self, char, completed):
+        if self._escape is not None:
+            if self._escape == "":
+                if char == "u":
+                    self._escape = "u"
+                    return
+                if char not in '"\\/bfnrt':
+                    self._error(char)
+                self._string.append(json.loads(f'"\\{char}"'))
+                self._escape = None
+            else:
+                self._escape += char
+                if len(self._escape) == 5:
+                    self._string.append(chr(int(self._escape[1:], 16)))
+                    self._escape = None
+            return
+        if char == "\\":
+            self._escape = ""
+        elif char == '"':
+            text, self._string = "".join(self._string), None
+            if any("\ud800" <= part <= "\udfff" for part in text):
+                # Join \uXXXX surrogate pairs
+                text = text.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+            if self._string_is_key:
+                self._stack[-1][2:] = ["colon", text]
+            else:
+                self._complete(text, completed)
+        elif char < " ":
+            self._error(char)
+        else:
+            self._string.append(char)
+
+    def _finish_scalar(self, completed):
+        text, self._scalar = "".join(self._scalar), None
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            raise JsonStreamError(f"Invalid literal {text!r} before position {self.position}") from None
+        self._complete(value, completed)
+
+    def _close(self, completed):
+        container, path, _, _ = self._stack.pop()
+        if self.validator is not None:
+            self.validator.complete(path, container)
+        completed.append((path, container))
+        self._attach(container)
+
+    def _complete(self, value, completed):
+        path = self._path()
+        if self.validator is not None:
+            self.validator.complete(path, value)
+        completed.append((path, value))
+        self._attach(value)
+
+    def _attach(self, value):
+        if not self._stack:
+            self.value = value
+            self.done = True
+            return
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict):
+            frame[0][frame[3]] = value
+        else:
+            frame[0].append(value)
+        frame[2] = "comma"
+
+
+def parse_stream(deltas, validator=None, on_value=None, repair=False):
+    """
+    Parse (and validate) an iterable of text deltas, e.g. a ResponseStream
+
+    on_value(path, value) is called for every completed value. Reading stops
+    at the first syntax or schema error, and the stream is closed so the
+    generation stops there. Text after the root value (a closing fence, a
+    trailing sentence) is read but not parsed, so a valid stream runs to its
+    end and the call is recorded, cached and reported like any other. With
+    repair=True a syntax error doesn't stop the stream: the rest is read and
+    the whole text goes through json_fixups.repair_json and the validator
+    instead (on_value sees only the values completed before the error).
+
+    Returns {"value", "error", "aborted", "text", "chars_read", "repairs"};
+    aborted is True when the stream was cut short, repairs lists the fixes
+    applied by json_fixups.repair_json ([] if none were needed).
+    """
+    parser = StreamingJsonParser(validator)
+    iterator = iter(deltas)
+    text, error, aborted, repairs = [], None, False, []
+    try:
+        for delta in iterator:
+            text.append(delta)
+            for path, value in parser.feed(delta):
+                if on_value is not None:
+                    on_value(path, value)
+            if parser.done:
+                # Drain (without parsing) the text after the root value
+                text.extend(iterator)
+                break
+        else:
+            parser.close()
+    except JsonStreamError as e:
+        if repair:
+            text.extend(iterator)
+            value, repairs, error = _repair("".join(text), validator, e)
+        else:
+            error, aborted = e, True
+    except SchemaError as e:
+        error, aborted = e, True
+    else:
+        value = parser.value
+    finally:
+        # Only cuts the stream short on errors: otherwise it has been read to the end
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+    text = "".join(text)
+    return {"value": value if error is None else None, "error": error, "aborted": aborted,
+            "text": text, "chars_read": len(text), "repairs": repairs}
+
+
+def _repair(text, validator, error):
+    """(value, repairs, error) for a complete text that failed to parse"""
+    try:
+        value, repairs = json_fixups.repair_json(text)
+    except ValueError:
+        return None, [], error
+    try:
+        if validator is not None:
+            validator.validate(value)
+    except SchemaError as e:
+        return None, repairs, e
+    return value, repairs, None
+
+
+# ---- Top-level fields ------------------------------------------------------
+
+class JsonFieldScanner:
+    """Reports the top-level fields of a streamed JSON object as they complete; never raises"""
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+        self.done = False  # the object closed (or the text turned out not to be JSON)
+        self._parser = StreamingJsonParser()
+
+    def feed(self, delta):
+        """Add a chunk of text; returns [(key, value)] for fields completed by it"""
+        self.text += delta
+        if self.done:
+            return []
+        try:
+            completed = self._parser.feed(delta)
+        except JsonStreamError:
+            self.done = True
+            return []
+        self.done = self._parser.done
+        fields = [(path[0], value) for path, value in completed if len(path) == 1]
+        self.fields.update(fields)
+        return fields
+
+
+def json_fields(text):
+    """Top-level fields of the first JSON object in a text ({} if there is none)"""
+    scanner = JsonFieldScanner()
+    scanner.feed(text)
+    return scanner.fields
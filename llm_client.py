@@ -0,0 +1,448 @@
+"""
+Shared OpenAI client layer
+
+Every technique module goes through this file instead of building its own
+`OpenAI()` client at import time. One pooled sync client and one pooled async
+client (per event loop) are shared by the whole process, so keep-alive
+connections and TLS sessions are reused across techniques and callers.
+
+Connection settings can be tuned with environment variables or `configure()`:
+- OPENAI_BASE_URL: Send requests to another endpoint (e.g. fake_responses_server.py)
+- LLM_MAX_CONNECTIONS: Maximum open connections per client (default: 100)
+- LLM_MAX_KEEPALIVE_CONNECTIONS: Idle connections kept for reuse (default: 20)
+- LLM_KEEPALIVE_EXPIRY: Seconds an idle connection stays in the pool (default: 30)
+- LLM_TIMEOUT: Request timeout in seconds (default: 60)
+- LLM_MAX_RETRIES: Automatic retries on 429/5xx responses (default: 2)
+- LLM_ASYNC_BACKEND: "aiohttp", "httpx" or "auto" (default: auto = aiohttp when installed)
+
+Low-temperature calls are served from `response_cache` (see response_cache.py
+for its LLM_CACHE_* settings); `response_cache.stats()` shows the savings.
+
+stream_response() / astream_response() yield text deltas as they are generated
+(with time to first token) for long outputs.
+
+Every call is recorded as an "llm" span with latency, token usage and cost
+(see instrumentation.py for the span tree, JSONL and Prometheus exports).
+
+The async front end prefers the aiohttp transport (`pip install openai[aiohttp]`):
+httpx's async pool scans every connection on each request and falls over well
+below 64 concurrent callers, see bench_client.py.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, DefaultAioHttpClient
+
+import instrumentation
+from response_cache import ResponseCache
+
+try:
+    import httpx_aiohttp  # noqa: F401  (installed by the openai[aiohttp] extra)
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+load_dotenv()
+
+DEFAULT_MODEL = "gpt-5.2"
+
+settings = {
+    "api_key": None,  # None = read OPENAI_API_KEY
+    "base_url": os.getenv("OPENAI_BASE_URL"),
+    "max_connections": int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+    "max_keepalive_connections": int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+    "keepalive_expiry": float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+    "timeout": float(os.getenv("LLM_TIMEOUT", "60")),
+    "max_retries": int(os.getenv("LLM_MAX_RETRIES", "2")),
+    "async_backend": os.getenv("LLM_ASYNC_BACKEND", "auto"),
+}
+
+response_cache = ResponseCache.from_env()
+call_listeners = []
+
+
+def _response_cache_metrics():
+    stats = response_cache.stats()
+    return [
+        ("llm_response_cache_lookups_total", "counter", "Response cache lookups by result",
+         [({"result": result}, stats[result]) for result in ("memory_hits", "disk_hits", "misses", "bypassed")]),
+        ("llm_response_cache_hit_rate", "gauge", "Response cache hit rate", [({}, stats["hit_rate"])]),
+    ]
+
+
+instrumentation.metrics.register_collector(_response_cache_metrics)
+
+_lock = threading.Lock()
+_sync_client = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+
+
+def configure(**overrides):
+    """
+    Change connection settings for the shared clients
+
+    Existing clients are dropped so the next call rebuilds them with the new
+    settings. Accepts any key of `settings`, e.g.
+    configure(base_url="http://127.0.0.1:8808/v1", max_connections=64)
+    """
+    global _sync_client
+
+    unknown = set(overrides) - set(settings)
+    if unknown:
+        raise ValueError(f"Unknown client settings: {', '.join(sorted(unknown))}")
+
+    with _lock:
+        settings.update(overrides)
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
+        _async_clients.clear()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=settings["max_connections"],
+        max_keepalive_connections=settings["max_keepalive_connections"],
+        keepalive_expiry=settings["keepalive_expiry"],
+    )
+
+
+def _async_http_client():
+    backend = settings["async_backend"]
+    if backend == "auto":
+        backend = "aiohttp" if HAS_AIOHTTP else "httpx"
+    if backend == "aiohttp":
+        return DefaultAioHttpClient(limits=_limits(), timeout=settings["timeout"])
+    if backend == "httpx":
+        return DefaultAsyncHttpxClient(limits=_limits(), timeout=settings["timeout"])
+    raise ValueError(f"Unknown async backend: {backend}")
+
+
+def get_client():
+    """Return the process-wide pooled sync client (created on first use)"""
+    global _sync_client
+
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = OpenAI(
+                    api_key=settings["api_key"],
+                    base_url=settings["base_url"],
+                    max_retries=settings["max_retries"],
+                    timeout=settings["timeout"],
+                    http_client=DefaultHttpxClient(limits=_limits(), timeout=settings["timeout"]),
+                )
+    return _sync_client
+
+
+def get_async_client():
+    """
+    Return the pooled async client for the running event loop
+
+    httpx async connections are bound to the loop that opened them, so one
+    client is kept per loop (e.g. one per asyncio.run call).
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=settings["api_key"],
+            base_url=settings["base_url"],
+            max_retries=settings["max_retries"],
+            timeout=settings["timeout"],
+            http_client=_async_http_client(),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose_async_client():
+    """Close the pooled async client of the running event loop (if any)"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def run_async(coro):
+    """
+    Run a coroutine from sync code with asyncio.run, closing the loop's
+    pooled async client before the loop goes away
+    """
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await aclose_async_client()
+
+    return asyncio.run(runner())
+
+
+def add_call_listener(listener):
+    """
+    Register listener(params, response, seconds, cached) to be called after
+    every create_response/acreate_response call (used by the benchmarks)
+    """
+    call_listeners.append(listener)
+
+
+def remove_call_listener(listener):
+    call_listeners.remove(listener)
+
+
+def _notify(params, response, started, cached):
+    if call_listeners:
+        seconds = time.perf_counter() - started
+        for listener in list(call_listeners):
+            listener(params, response, seconds, cached)
+
+
+def create_response(**params):
+    """
+    Single entry point for `responses.create` calls (sync)
+
+    Takes the same keyword arguments as `client.responses.create` and returns
+    the Response object. `model` defaults to DEFAULT_MODEL. Cacheable calls
+    are answered from `response_cache` when possible.
+    """
+    started = time.perf_counter()
+    params.setdefault("model", DEFAULT_MODEL)
+    with instrumentation.span("responses.create", kind="llm", model=params["model"]) as llm_span:
+        cache_key = response_cache.key_for(params)
+        if cache_key is not None:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                instrumentation.record_response(llm_span, cached, cached=True)
+                _notify(params, cached, started, cached=True)
+                return cached
+
+        response = get_client().responses.create(**params)
+        instrumentation.record_response(llm_span, response)
+        # Incomplete (max_output_tokens, content filter) or failed responses are not replayed
+        if cache_key is not None and response.status == "completed":
+            response_cache.put(cache_key, response)
+    _notify(params, response, started, cached=False)
+    return response
+
+
+async def acreate_response(**params):
+    """Async version of create_response, using the shared AsyncOpenAI client"""
+    started = time.perf_counter()
+    params.setdefault("model", DEFAULT_MODEL)
+    with instrumentation.span("responses.create", kind="llm", model=params["model"]) as llm_span:
+        cache_key = response_cache.key_for(params)
+        if cache_key is not None:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                instrumentation.record_response(llm_span, cached, cached=True)
+                _notify(params, cached, started, cached=True)
+                return cached
+
+        response = await get_async_client().responses.create(**params)
+        instrumentation.record_response(llm_span, response)
+        # Incomplete (max_output_tokens, content filter) or failed responses are not replayed
+        if cache_key is not None and response.status == "completed":
+            response_cache.put(cache_key, response)
+    _notify(params, response, started, cached=False)
+    return response
+
+
+class _ResponseStreamBase:
+    """Shared state of ResponseStream / AsyncResponseStream"""
+
+    def __init__(self, params):
+        params.setdefault("model", DEFAULT_MODEL)
+        params.pop("stream", None)
+        self.params = params
+        self.response = None
+        self.time_to_first_token = None
+        self._parts = []
+        self._started = None
+        self._consumed = False
+
+    @property
+    def text(self):
+        """Output text received so far"""
+        return "".join(self._parts)
+
+    def _begin(self):
+        if self._consumed:
+            raise RuntimeError("A response stream can only be iterated once")
+        self._consumed = True
+        self._started = time.perf_counter()
+        llm_span = instrumentation.start_span("responses.create", kind="llm", model=self.params["model"],
+                                              streamed=True)
+        # Streamed and plain calls share cache entries: the stream flag isn't part of the key
+        cache_key = response_cache.key_for(self.params)
+        cached = response_cache.get(cache_key) if cache_key is not None else None
+        return llm_span, cache_key, cached
+
+    def _delta(self, delta, llm_span):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self._started
+            llm_span.mark_first_token()
+        self._parts.append(delta)
+        return delta
+
+    def _handle(self, event, llm_span):
+        """Return the text delta carried by an event (None for other events)"""
+        if event.type == "response.output_text.delta":
+            return self._delta(event.delta, llm_span)
+        if event.type in ("response.completed", "response.incomplete", "response.failed"):
+            self.response = event.response
+        elif event.type == "error":
+            raise RuntimeError(f"Streaming error: {event.message}")
+        return None
+
+    def _end(self, llm_span, cache_key, cached):
+        response = cached if cached is not None else self.response
+        if response is not None:
+            instrumentation.record_response(llm_span, response, cached=cached is not None)
+        if cache_key is not None and cached is None and response is not None and response.status == "completed":
+            response_cache.put(cache_key, response)
+        llm_span.finish()
+        if response is not None:
+            _notify(self.params, response, self._started, cached=cached is not None)
+
+
+class ResponseStream(_ResponseStreamBase):
+    """
+    Text deltas of a streamed `responses.create` call
+
+    Iterate to receive the output text as it is generated. Afterwards
+    `response` holds the final Response, `text` the full output and
+    `time_to_first_token` the seconds from the request to the first delta.
+    """
+
+    def __iter__(self):
+        llm_span, cache_key, cached = self._begin()
+        try:
+            if cached is not None:
+                yield self._delta(cached.output_text, llm_span)
+            else:
+                with get_client().responses.create(**self.params, stream=True) as events:
+                    for event in events:
+                        delta = self._handle(event, llm_span)
+                        if delta:
+                            yield delta
+        except BaseException as e:
+            llm_span.fail(e)
+            llm_span.finish()
+            raise
+        self._end(llm_span, cache_key, cached)
+
+    def read(self):
+        """Consume the rest of the stream and return the full text"""
+        if not self._consumed:
+            for _ in self:
+                pass
+        return self.text
+
+
+class AsyncResponseStream(_ResponseStreamBase):
+    """Async version of ResponseStream (use `async for`)"""
+
+    async def __aiter__(self):
+        llm_span, cache_key, cached = self._begin()
+        try:
+            if cached is not None:
+                yield self._delta(cached.output_text, llm_span)
+            else:
+                events = await get_async_client().responses.create(**self.params, stream=True)
+                async with events:
+                    async for event in events:
+                        delta = self._handle(event, llm_span)
+                        if delta:
+                            yield delta
+        except BaseException as e:
+            llm_span.fail(e)
+            llm_span.finish()
+            raise
+        self._end(llm_span, cache_key, cached)
+
+    async def read(self):
+        """Consume the rest of the stream and return the full text"""
+        if not self._consumed:
+            async for _ in self:
+                pass
+        return self.text
+
+
+def stream_response(**params):
+    """
+    Streaming version of create_response
+
+    Returns a ResponseStream yielding text deltas as they arrive, e.g.
+    for delta in stream_response(model="gpt-5.2", input="..."): print(delta, end="")
+    """
+    return ResponseStream(params)
+
+
+def astream_response(**params):
+    """Async version of stream_response (iterate with `async for`)"""
+    return AsyncResponseStream(params)
+
+
+def print_stream(stream):
+    """Print a ResponseStream as it arrives; returns the full text"""
+    for delta in stream:
+        print(delta, end="", flush=True)
+    print()
+    return stream.text
+
+
+def print_response(params, stream=False):
+    """
+    Print the answer to a request: streamed as it arrives (followed by the time
+    to first token, when a token arrived) or all at once; returns the text
+    """
+    if not stream:
+        text = create_response(**params).output_text
+        print(text)
+        return text
+    generation = stream_response(**params)
+    text = print_stream(generation)
+    if generation.time_to_first_token is not None:
+        print(f"(first token after {generation.time_to_first_token:.2f}s)")
+    return text
+
+
+def _completion_params(prompt, model, temperature, max_output_tokens, params):
+    if isinstance(prompt, str):
+        prompt = [{"role": "user", "content": prompt}]
+    params.update(model=model, input=prompt)
+    if temperature is not None:
+        params["temperature"] = temperature
+    if max_output_tokens is not None:
+        params["max_output_tokens"] = max_output_tokens
+    return params
+
+
+def get_completion(prompt, model=DEFAULT_MODEL, temperature=None, max_output_tokens=500, **params):
+    """
+    Helper function to get completions from OpenAI
+
+    Parameters:
+    - prompt: The input prompt (a string, or a list of role/content messages)
+    - model: Model to use (default: gpt-5.2)
+    - temperature: Controls randomness (0=deterministic, 1=creative); None = model default
+    - max_output_tokens: Maximum length of response
+    - params: Any other `responses.create` arguments
+    """
+    response = create_response(**_completion_params(prompt, model, temperature, max_output_tokens, params))
+    return response.output_text
+
+
+async def aget_completion(prompt, model=DEFAULT_MODEL, temperature=None, max_output_tokens=500, **params):
+    """Async version of get_completion"""
+    response = await acreate_response(**_completion_params(prompt, model, temperature, max_output_tokens, params))
+    return response.output_text
+
+
+def stream_completion(prompt, model=DEFAULT_MODEL, temperature=None, max_output_tokens=500, **params):
+    """Streaming version of get_completion: returns a ResponseStream of text deltas"""
+    return ResponseStream(_completion_params(prompt, model, temperature, max_output_tokens, params))
@@ -0,0 +1,315 @@
+"""
+Order / inventory data layer behind CustomerServiceTools
+
+Two interchangeable stores with the same lookup methods:
+- MemoryStore: dicts built once (the demo data, or anything small)
+- SQLiteStore: an embedded, indexed SQLite file for millions of orders and a
+  large SKU catalog. Each order is one row keyed by order_id (a WITHOUT ROWID
+  primary-key B-tree) holding the order as JSON, so a lookup is a single index
+  probe; the file is memory-mapped and every thread gets its own read
+  connection.
+
+Both have update_order / update_inventory, which notify listeners added with
+add_listener(function(table, key)), e.g. to invalidate cached tool results
+(remove_listener drops one again). Only updates made through the store object
+are reported: rows another process writes into a SQLite file are not, so tool
+results derived from them are bounded by their cache TTL alone.
+
+Build a store with bulk_load() (one transaction, indexes created after the
+data) and point 07_react.py at it with the ORDER_STORE environment variable:
+
+    python bench_order_store.py --orders 1000000 --keep .cache/orders.sqlite3
+    ORDER_STORE=.cache/orders.sqlite3 python 07_react.py
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+
+# Demo data for Aditya's case (order #SM-2026-12345)
+SAMPLE_ORDERS = {
+    "SM-2026-12345": {
+        "customer": "Aditya Patel",
+        "email": "aditya.p@techcorp.com",
+        "status": "delivered",
+        "items": {
+            "Gaming Laptop": {"price": 1299.00, "qty": 1, "status": "no issues"},
+            "Wireless Mouse": {"price": 49.99, "qty": 2, "status": "defective - reported Feb 16"},
+            "Mechanical RGB Keyboard": {"price": 89.99, "qty": 1, "status": "no issues"}
+        },
+        "subtotal": 1488.97,
+        "discount": -148.90,
+        "shipping": 8.50,
+        "total": 1348.57,
+        "order_date": "2026-02-10",
+        "delivery_date": "2026-02-15",
+        "tracking": "TRACK-SM-12345"
+    }
+}
+
+SAMPLE_INVENTORY = {
+    "Gaming Laptop": {"in_stock": True, "quantity": 45, "warehouse": "East"},
+    "Wireless Mouse": {"in_stock": False, "quantity": 0, "warehouse": "West"},
+    "Mechanical RGB Keyboard": {"in_stock": True, "quantity": 67, "warehouse": "West"}
+}
+
+
+class _ChangeListeners:
+    """add_listener / remove_listener and change notification shared by both stores"""
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def _changed(self, table, key):
+        for listener in list(self.listeners):
+            listener(table, key)
+
+
+class MemoryStore(_ChangeListeners):
+    """Orders and inventory held in dicts"""
+
+    def __init__(self, orders=None, inventory=None):
+        self.orders = dict(SAMPLE_ORDERS if orders is None else orders)
+        self.inventory = dict(SAMPLE_INVENTORY if inventory is None else inventory)
+        self.listeners = []
+
+    def update_order(self, order_id, order):
+        self.orders[order_id] = order
+        self._changed("orders", order_id)
+
+    def update_inventory(self, product_name, record):
+        self.inventory[product_name] = record
+        self._changed("inventory", product_name)
+
+    def get_order(self, order_id):
+        """Order dict, or None if unknown"""
+        return self.orders.get(order_id)
+
+    def get_orders(self, order_ids):
+        """{order_id: order} for the ids that exist"""
+        return {order_id: self.orders[order_id] for order_id in order_ids if order_id in self.orders}
+
+    def get_inventory(self, product_name):
+        """Inventory record for a product, or None if unknown"""
+        return self.inventory.get(product_name)
+
+    def get_inventories(self, product_names):
+        return {name: self.inventory[name] for name in product_names if name in self.inventory}
+
+    def orders_for_customer(self, email):
+        return [dict(order, order_id=order_id) for order_id, order in self.orders.items() if order.get("email") == email]
+
+
+class SQLiteStore(_ChangeListeners):
+    """
+    Read-optimized SQLite store
+
+    Parameters:
+    - path: Database file (created by bulk_load)
+    - mmap_bytes: How much of the file to memory-map for reads
+
+    Reads use per-thread read-only connections; the (rare) updates open a
+    short-lived write connection.
+    """
+
+    def __init__(self, path, mmap_bytes=1 << 30):
+        self.path = path
+        self.mmap_bytes = mmap_bytes
+        self.listeners = []
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False,
+                                 cached_statements=64)
+            db.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+            db.execute("PRAGMA query_only=ON")
+            self._local.db = db
+        return db
+
+    def get_order(self, order_id):
+        row = self._db().execute("SELECT data FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_orders(self, order_ids):
+        order_ids = list(dict.fromkeys(order_ids))
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            rows = self._db().execute(
+                f"SELECT order_id, data FROM orders WHERE order_id IN ({','.join('?' * len(chunk))})", chunk
+            )
+            found.update((order_id, json.loads(data)) for order_id, data in rows)
+        return found
+
+    def get_inventory(self, product_name):
+        row = self._db().execute(
+            "SELECT in_stock, quantity, warehouse FROM inventory WHERE product = ?", (product_name,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"in_stock": bool(row[0]), "quantity": row[1], "warehouse": row[2]}
+
+    def get_inventories(self, product_names):
+        product_names = list(dict.fromkeys(product_names))
+        found = {}
+        for start in range(0, len(product_names), 500):
+            chunk = product_names[start:start + 500]
+            rows = self._db().execute(
+                "SELECT product, in_stock, quantity, warehouse FROM inventory "
+                f"WHERE product IN ({','.join('?' * len(chunk))})", chunk
+            )
+            found.update((product, {"in_stock": bool(in_stock), "quantity": quantity, "warehouse": warehouse})
+                         for product, in_stock, quantity, warehouse in rows)
+        return found
+
+    def orders_for_customer(self, email):
+        rows = self._db().execute("SELECT order_id, data FROM orders WHERE email = ? ORDER BY order_date", (email,))
+        return [dict(json.loads(data), order_id=order_id) for order_id, data in rows]
+
+    def _write(self, sql, parameters):
+        with self._write_lock:
+            db = sqlite3.connect(self.path)
+            try:
+                with db:
+                    db.execute(sql, parameters)
+            finally:
+                db.close()
+
+    def update_order(self, order_id, order):
+        self._write("INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?)",
+                    (order_id, order.get("email"), order.get("status"), order.get("order_date"),
+                     json.dumps(order, separators=(",", ":"))))
+        self._changed("orders", order_id)
+
+    def update_inventory(self, product_name, record):
+        self._write("INSERT OR REPLACE INTO inventory VALUES (?, ?, ?, ?)",
+                    (product_name, int(record["in_stock"]), record["quantity"], record.get("warehouse")))
+        self._changed("inventory", product_name)
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+def bulk_load(path, orders, inventory=(), batch_size=10_000):
+    """
+    Create (or replace) a SQLite store from iterables of (order_id, order) and
+    (product_name, record) pairs
+
+    Loads in a single transaction with journaling off and builds the secondary
+    index afterwards, which is several times faster than indexing row by row.
+    Returns the number of orders loaded.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = path + ".loading"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+
+    db = sqlite3.connect(temporary)
+    db.execute("PRAGMA journal_mode=OFF")
+    db.execute("PRAGMA synchronous=OFF")
+    db.execute("PRAGMA page_size=8192")
+    db.execute("""
+        CREATE TABLE orders (
+            order_id TEXT PRIMARY KEY,
+            email TEXT,
+            status TEXT,
+            order_date TEXT,
+            data TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    db.execute("""
+        CREATE TABLE inventory (
+            product TEXT PRIMARY KEY,
+            in_stock INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            warehouse TEXT
+        ) WITHOUT ROWID
+    """)
+
+    def order_rows():
+        for order_id, order in orders:
+            yield (order_id, order.get("email"), order.get("status"), order.get("order_date"),
+                   json.dumps(order, separators=(",", ":")))
+
+    count = 0
+    with db:
+        rows = order_rows()
+        while True:
+            batch = [row for _, row in zip(range(batch_size), rows)]
+            if not batch:
+                break
+            db.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?)", batch)
+            count += len(batch)
+        db.executemany(
+            "INSERT INTO inventory VALUES (?, ?, ?, ?)",
+            ((name, int(record["in_stock"]), record["quantity"], record.get("warehouse"))
+             for name, record in inventory),
+        )
+        db.execute("CREATE INDEX orders_email ON orders (email, order_date)")
+    db.execute("ANALYZE")
+    db.close()
+    os.replace(temporary, path)
+    return count
+
+
+PRODUCTS = ["Gaming Laptop", "Wireless Mouse", "Mechanical RGB Keyboard", "Gaming Headset", "4K Monitor",
+            "USB-C Dock", "Webcam", "Laptop Stand", "External SSD", "Mouse Pad"]
+
+
+def generate_orders(count, seed=0, customers=None):
+    """Yield `count` synthetic (order_id, order) pairs; SM-2026-12345 is the demo order"""
+    rng = random.Random(seed)
+    customers = customers or max(1, count // 5)
+    yield from SAMPLE_ORDERS.items()
+    for number in range(count - len(SAMPLE_ORDERS)):
+        order_id = f"SM-{2020 + number % 7}-{number:07d}"
+        customer = rng.randrange(customers)
+        items = {}
+        for product in rng.sample(PRODUCTS, rng.randint(1, 4)):
+            items[product] = {"price": round(rng.uniform(9.99, 1999.0), 2), "qty": rng.randint(1, 3),
+                              "status": "no issues"}
+        subtotal = round(sum(item["price"] * item["qty"] for item in items.values()), 2)
+        month, day = rng.randint(1, 12), rng.randint(1, 28)
+        yield order_id, {
+            "customer": f"Customer {customer}",
+            "email": f"customer{customer}@example.com",
+            "status": rng.choice(["processing", "shipped", "delivered", "delivered", "delivered"]),
+            "items": items,
+            "subtotal": subtotal,
+            "discount": 0.0,
+            "shipping": 8.50,
+            "total": round(subtotal + 8.50, 2),
+            "order_date": f"{2020 + number % 7}-{month:02d}-{day:02d}",
+            "delivery_date": None,
+            "tracking": f"TRACK-{number:07d}",
+        }
+
+
+def generate_inventory(count, seed=0):
+    """Yield synthetic (product_name, record) pairs, starting with the demo catalog"""
+    rng = random.Random(seed)
+    yield from SAMPLE_INVENTORY.items()
+    for number in range(count - len(SAMPLE_INVENTORY)):
+        quantity = rng.choice([0, rng.randint(1, 500)])
+        yield f"SKU-{number:07d} {rng.choice(PRODUCTS)}", {
+            "in_stock": quantity > 0, "quantity": quantity, "warehouse": rng.choice(["East", "West", "Central"]),
+        }
+
+
+def open_store(path=None):
+    """SQLiteStore for `path` (or $ORDER_STORE); the in-memory demo data if neither is set"""
+    path = path or os.getenv("ORDER_STORE")
+    return SQLiteStore(path) if path else MemoryStore()
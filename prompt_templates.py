@@ -0,0 +1,220 @@
+"""
+Prompt-cache-aware prompt templates
+
+Providers cache the longest previously seen prefix of a prompt (OpenAI from
+1,024 tokens, in 128-token steps) and bill it at the cached-input price with
+a faster time to first token. That only helps when the prefix is
+byte-identical, i.e. when everything static comes before everything that
+varies. PromptTemplate compiles a prompt into:
+- a static prefix: optional developer message (persona) plus the static
+  instructions / examples, dedented once at compile time so every request
+  sends exactly the same bytes
+- a variable suffix: a str.format template filled in per request and sent
+  last (non-string values are inserted as JSON)
+
+A template written with placeholders in the middle still works, but only the
+text before its first placeholder is cacheable; `static_tokens_after_variables`
+shows how much static text the template loses to the cache.
+
+    template = PromptTemplate("cot_few_shot", prefix=INSTRUCTIONS_AND_EXAMPLES, suffix="Scenario: {scenario}")
+    create_response(model="gpt-5.2", **template.params(scenario=text))
+    template.text(scenario=text)   # the user message only, e.g. for chains.Step
+
+Only a static part of at least 1,024 tokens can be cached. The migrated
+prompts (the CoT worked example in 04, the personas in 05, the few-shot
+instructions in 03 and the email chain steps in 09) are ordered cache-first
+but all below that minimum, so they gain nothing yet; print_cache_report()
+says so for each of them, and starts reporting a cached share as soon as a
+prefix grows past it.
+
+Requests carry `prompt_cache_key` (template name + prefix hash) so requests
+sharing a prefix are routed to the same cache. Usage of every call, plain or
+streamed, made with a template's params is collected (cache_report(); prompt_template_* metrics):
+input and cached tokens, the cached share, latency of calls with and without
+a cache hit, and the estimated cost saved by cached tokens.
+"""
+import hashlib
+import json
+import string
+import textwrap
+import threading
+import weakref
+
+import instrumentation
+import llm_client
+from conversation import count_tokens
+from instrumentation import estimate_cost
+
+MIN_CACHED_PREFIX_TOKENS = 1024  # shorter prompts are never served from the prompt cache
+
+_templates = weakref.WeakValueDictionary()  # prompt_cache_key -> template
+
+
+def _dedent(text):
+    return textwrap.dedent(text or "").strip()
+
+
+def _escape(text):
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def _fields(template):
+    return [field for _, field, _, _ in string.Formatter().parse(template) if field]
+
+
+class PromptTemplate:
+    """
+    A prompt compiled into a static prefix and a variable suffix
+
+    Parameters:
+    - name: Template name (cache key and report label)
+    - prefix: Static instructions and examples; literal text, no placeholders
+    - suffix: str.format template with the per-request parts
+    - developer: Optional static developer message sent before the prompt
+    - separator: Text between prefix and suffix
+    """
+
+    def __init__(self, name, prefix="", suffix="", developer=None, separator="\n\n"):
+        self.name = name
+        self.developer = _dedent(developer) or None
+        self.prefix = _dedent(prefix)
+        self.suffix = _dedent(suffix)
+        self.fields = list(dict.fromkeys(_fields(self.suffix)))
+        self.static_tokens_after_variables = count_tokens(
+            "".join(literal for literal, _, _, _ in list(string.Formatter().parse(self.suffix))[1:])
+        )
+
+        # Precomputed once: the static messages and the start of the user message
+        self._static_messages = [{"role": "developer", "content": self.developer}] if self.developer else []
+        self._user_prefix = self.prefix + separator if self.prefix and self.suffix else self.prefix
+        static = json.dumps([self.developer, self.prefix])
+        self.static_tokens = count_tokens(static) if self.developer or self.prefix else 0
+        self.prefix_hash = hashlib.sha256(static.encode()).hexdigest()[:12]
+        self.cache_key = f"{name}-{self.prefix_hash}"
+
+        self._lock = threading.Lock()
+        self._usage = {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "cache_hits": 0,
+                       "seconds": 0.0, "hit_seconds": 0.0, "saved_usd": 0.0}
+        _templates[self.cache_key] = self
+
+    @classmethod
+    def compile(cls, name, template, developer=None):
+        """
+        Template text with placeholders anywhere: the text before the first
+        placeholder becomes the static prefix, the rest the variable suffix
+        """
+        pieces = list(string.Formatter().parse(_dedent(template)))
+        if not any(field is not None for _, field, _, _ in pieces):
+            return cls(name, prefix="".join(literal for literal, _, _, _ in pieces), developer=developer)
+        suffix = ""
+        for number, (literal, field, spec, conversion) in enumerate(pieces):
+            suffix += _escape(literal) if number else ""
+            if field is not None:
+                suffix += "{" + field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}"
+        prefix = pieces[0][0].rstrip()
+        return cls(name, prefix=prefix, suffix=suffix, developer=developer, separator=pieces[0][0][len(prefix):])
+
+    def __repr__(self):
+        # Stable across runs (used in chain checkpoint keys)
+        return f"PromptTemplate({self.name!r}, prefix={self.prefix_hash}, suffix={self.suffix!r})"
+
+    def text(self, **values):
+        """The user message: static prefix followed by the filled-in suffix"""
+        values = {key: value if isinstance(value, str) else json.dumps(value, indent=2, ensure_ascii=False)
+                  for key, value in values.items()}
+        return self._user_prefix + self.suffix.format(**values)
+
+    # Step.render calls prompt.format(**inputs) on non-callable prompts
+    format = text
+
+    def input(self, **values):
+        """Messages for `input`: static developer message first, then the user message"""
+        return self._static_messages + [{"role": "user", "content": self.text(**values)}]
+
+    def params(self, **values):
+        """`input` and `prompt_cache_key` request parameters"""
+        return {"input": self.input(**values), "prompt_cache_key": self.cache_key}
+
+    def record(self, model, response, seconds):
+        """Add the usage of one API call made with this template"""
+        usage = getattr(response, "usage", None)
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        cached_tokens = getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", 0) or 0
+        saved = ((estimate_cost(model, input_tokens, 0, 0) or 0.0)
+                 - (estimate_cost(model, input_tokens, cached_tokens, 0) or 0.0))
+        with self._lock:
+            usage = self._usage
+            usage["calls"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["cached_tokens"] += cached_tokens
+            usage["seconds"] += seconds
+            usage["saved_usd"] += saved
+            if cached_tokens:
+                usage["cache_hits"] += 1
+                usage["hit_seconds"] += seconds
+
+    def stats(self):
+        """
+        {"calls", "input_tokens", "cached_tokens", "cached_share", "cache_hits",
+        "mean_seconds_hit", "mean_seconds_miss", "saved_usd", "static_tokens",
+        "static_tokens_after_variables"}
+        """
+        with self._lock:
+            usage = dict(self._usage)
+        misses = usage["calls"] - usage["cache_hits"]
+        return {
+            "calls": usage["calls"],
+            "input_tokens": usage["input_tokens"],
+            "cached_tokens": usage["cached_tokens"],
+            "cached_share": usage["cached_tokens"] / usage["input_tokens"] if usage["input_tokens"] else 0.0,
+            "cache_hits": usage["cache_hits"],
+            "mean_seconds_hit": usage["hit_seconds"] / usage["cache_hits"] if usage["cache_hits"] else None,
+            "mean_seconds_miss": (usage["seconds"] - usage["hit_seconds"]) / misses if misses else None,
+            "saved_usd": usage["saved_usd"],
+            "static_tokens": self.static_tokens,
+            "static_tokens_after_variables": self.static_tokens_after_variables,
+        }
+
+
+def _on_call(params, response, seconds, cached):
+    # Only calls that reached the API: local response-cache hits say nothing about the prompt cache
+    template = _templates.get(params.get("prompt_cache_key"))
+    if template is not None and not cached:
+        template.record(params.get("model"), response, seconds)
+
+
+llm_client.add_call_listener(_on_call)
+
+
+def cache_report():
+    """{template name: stats()} for every template that made calls"""
+    return {template.name: template.stats() for template in list(_templates.values())
+            if template.stats()["calls"]}
+
+
+def print_cache_report():
+    for name, stats in cache_report().items():
+        hit, miss = stats["mean_seconds_hit"], stats["mean_seconds_miss"]
+        latency = f", {hit:.2f}s with a cache hit vs {miss:.2f}s without" if hit is not None and miss is not None else ""
+        short = (f" (static prefix of {stats['static_tokens']} tokens is below the {MIN_CACHED_PREFIX_TOKENS}-token "
+                 f"cache minimum)" if stats["static_tokens"] < MIN_CACHED_PREFIX_TOKENS else "")
+        print(f"{name}: {stats['cached_share']:.0%} of {stats['input_tokens']} input tokens cached over "
+              f"{stats['calls']} calls{latency}, ~${stats['saved_usd']:.4f} saved{short}")
+
+
+def _template_metrics():
+    report = cache_report()
+    if not report:
+        return []
+    return [
+        ("prompt_template_input_tokens_total", "counter", "Input tokens of templated calls by kind (cached is a subset)",
+         [({"template": name, "kind": kind}, s[f"{kind}_tokens"]) for name, s in report.items()
+          for kind in ("input", "cached")]),
+        ("prompt_template_cached_share", "gauge", "Share of templated input tokens served from the prompt cache",
+         [({"template": name}, s["cached_share"]) for name, s in report.items()]),
+        ("prompt_template_saved_usd_total", "counter", "Estimated cost saved by cached input tokens",
+         [({"template": name}, s["saved_usd"]) for name, s in report.items()]),
+    ]
+
+
+instrumentation.metrics.register_collector(_template_metrics)
@@ -0,0 +1,237 @@
+"""
+Tiered response cache for `responses.create`
+
+A bounded in-process LRU sits in front of a persistent SQLite store. Entries
+are content-addressed: the key is a SHA-256 of the canonical JSON of the
+request (model, input messages, temperature, max_output_tokens and any other
+generation parameters), so identical requests hit no matter which technique
+sends them.
+
+Only deterministic or low-temperature calls are cached (temperature <=
+max_temperature); sampling calls such as self-consistency votes always go to
+the API.
+
+Settings (environment variables, read by llm_client.py):
+- LLM_CACHE: "0" disables the cache (default: enabled)
+- LLM_CACHE_PATH: SQLite file (default: .cache/responses.sqlite3)
+- LLM_CACHE_TTL: Seconds before an entry expires (default: 86400)
+- LLM_CACHE_MAX_TEMPERATURE: Highest temperature that is cached (default: 0.3)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from openai.types.responses import Response
+
+# Parameters that don't change the generated output, or make a call uncacheable
+IGNORED_PARAMS = {"metadata", "user", "safety_identifier", "timeout", "extra_headers", "prompt_cache_key"}
+UNCACHEABLE_PARAMS = {"stream", "previous_response_id", "background", "conversation"}
+
+
+def canonical_key(params):
+    """SHA-256 of the request parameters serialized as canonical JSON"""
+    relevant = {name: value for name, value in params.items() if name not in IGNORED_PARAMS}
+    data = json.dumps(relevant, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache: in-memory LRU + on-disk SQLite store
+
+    Parameters:
+    - path: SQLite file for the disk tier (None = memory only)
+    - max_memory_entries: LRU capacity (entries)
+    - max_memory_bytes: LRU capacity (serialized response bytes)
+    - max_disk_bytes: Disk tier capacity; least recently used rows are evicted
+    - ttl: Default time-to-live in seconds
+    - max_temperature: Calls above this temperature (or with no temperature,
+      i.e. the model default) are never cached
+    """
+
+    def __init__(self, path=".cache/responses.sqlite3", max_memory_entries=1024,
+                 max_memory_bytes=64 * 1024 * 1024, max_disk_bytes=512 * 1024 * 1024,
+                 ttl=24 * 3600, max_temperature=0.3):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.enabled = True
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (response, size, expires_at)
+        self._memory_bytes = 0
+        self._db = None
+        self._disk_bytes = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0,
+                         "stores": 0, "evictions": 0, "expired": 0}
+
+    @classmethod
+    def from_env(cls):
+        cache = cls(
+            path=os.getenv("LLM_CACHE_PATH", ".cache/responses.sqlite3"),
+            ttl=float(os.getenv("LLM_CACHE_TTL", 24 * 3600)),
+            max_temperature=float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.3")),
+        )
+        cache.enabled = os.getenv("LLM_CACHE", "1") != "0"
+        return cache
+
+    # ---- Policy --------------------------------------------------------
+
+    def key_for(self, params):
+        """Cache key for a request, or None if the call must not be cached"""
+        temperature = params.get("temperature")
+        if (not self.enabled or UNCACHEABLE_PARAMS & params.keys()
+                or temperature is None or temperature > self.max_temperature):
+            with self._lock:
+                self.counters["bypassed"] += 1
+            return None
+        return canonical_key(params)
+
+    # ---- Lookup / store ------------------------------------------------
+
+    def get(self, key):
+        """Return the cached Response for a key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, size, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return response
+                self._drop_memory(key)
+                self.counters["expired"] += 1
+
+            row = self._disk_get(key, now)
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+
+            data, expires_at = row
+            # construct() rebuilds nested models without validation, like the SDK does
+            response = Response.construct(**json.loads(data))
+            self._memory_put(key, response, len(data), expires_at)
+            self.counters["disk_hits"] += 1
+            return response
+
+    def put(self, key, response, ttl=None):
+        """Store a Response in both tiers"""
+        data = response.to_json(indent=None, warnings=False)
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._memory_put(key, response, len(data), expires_at)
+            self._disk_put(key, data, expires_at)
+            self.counters["stores"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._connect() is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+                self._disk_bytes = 0
+
+    def stats(self):
+        """Hit/miss counters plus current tier sizes"""
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        return dict(
+            self.counters,
+            hit_rate=hits / lookups if lookups else 0.0,
+            memory_entries=len(self._memory),
+            memory_bytes=self._memory_bytes,
+            disk_bytes=self._disk_bytes,
+        )
+
+    # ---- Memory tier ---------------------------------------------------
+
+    def _memory_put(self, key, response, size, expires_at):
+        if key in self._memory:
+            self._drop_memory(key)
+        self._memory[key] = (response, size, expires_at)
+        self._memory_bytes += size
+        while self._memory and (len(self._memory) > self.max_memory_entries
+                                or self._memory_bytes > self.max_memory_bytes):
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+            self.counters["evictions"] += 1
+
+    def _drop_memory(self, key):
+        _, size, _ = self._memory.pop(key)
+        self._memory_bytes -= size
+
+    # ---- Disk tier -----------------------------------------------------
+
+    def _connect(self):
+        if self._db is None and self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")  # no fsync per commit; it's only a cache
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._db
+
+    def _disk_get(self, key, now):
+        if self._connect() is None:
+            return None
+        row = self._db.execute("SELECT data, size, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        data, size, expires_at = row
+        if expires_at <= now:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            self._disk_bytes -= size
+            self.counters["expired"] += 1
+            return None
+        self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        return data, expires_at
+
+    def _disk_put(self, key, data, expires_at):
+        if self._connect() is None:
+            return
+        old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, data, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, data, len(data), expires_at, time.time()),
+        )
+        self._disk_bytes += len(data) - (old[0] if old else 0)
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+        self._db.commit()
+
+    def _evict_disk(self):
+        # Drop expired rows first, then least recently used until 90% full
+        now = time.time()
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        target = self.max_disk_bytes * 0.9
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            if total <= target:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.counters["evictions"] += 1
+        self._disk_bytes = total
@@ -0,0 +1,75 @@
+"""
+Concurrent sampling for self-consistency
+
+Sends N independent samples of the same request at once (under a concurrency
+cap) through the shared async client, and hands each response to a callback
+as soon as it lands. Wall-clock time is close to the slowest single sample
+instead of N times a single call.
+"""
+import asyncio
+
+import llm_client
+
+
+async def asample_concurrently(params, num_samples, on_sample=None, max_concurrency=None, stats=None,
+                               wanted=None):
+    """
+    Run `num_samples` copies of one request concurrently
+
+    Parameters:
+    - params: `responses.create` arguments shared by every sample
+    - num_samples: How many samples to draw
+    - on_sample: Called as on_sample(index, response) in completion order;
+      returning True stops sampling and cancels the requests still in flight
+    - max_concurrency: Maximum requests in flight (None = all at once)
+    - stats: Optional dict, filled with "sent", "completed" and "cancelled" counts
+    - wanted: Optional function returning how many samples are worth having in
+      flight right now (used by voting.py to avoid sending votes that can't matter)
+
+    Returns the responses in sample order (None for samples that were stopped).
+    """
+    limit = max_concurrency or num_samples
+    if stats is None:
+        stats = {}
+    stats.update(sent=0, completed=0, cancelled=0)
+
+    async def draw(index):
+        response = await llm_client.acreate_response(**params)
+        stats["completed"] += 1
+        return index, response
+
+    responses = [None] * num_samples
+    pending = set()
+    next_index = 0
+
+    def launch():
+        # Top up to `limit` requests in flight. New samples are only sent after
+        # on_sample has seen the previous results, so a stop never races them.
+        nonlocal next_index
+        target = limit if wanted is None else min(limit, wanted())
+        while next_index < num_samples and len(pending) < target:
+            pending.add(asyncio.create_task(draw(next_index)))
+            stats["sent"] += 1
+            next_index += 1
+
+    try:
+        launch()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index, response = task.result()
+                responses[index] = response
+                if on_sample is not None and on_sample(index, response):
+                    return responses
+            launch()
+    finally:
+        # On early stop or error, don't leave the other samples running
+        for task in pending:
+            task.cancel()
+        stats["cancelled"] = stats["sent"] - stats["completed"]
+    return responses
+
+
+def sample_concurrently(params, num_samples, on_sample=None, max_concurrency=None, stats=None, wanted=None):
+    """Sync wrapper around asample_concurrently (same parameters)"""
+    return llm_client.run_async(asample_concurrently(params, num_samples, on_sample, max_concurrency, stats, wanted))
@@ -0,0 +1,238 @@
+"""
+Schema-constrained structured outputs
+
+Instead of asking for "ONLY valid JSON" in the prompt and hoping, requests
+carry the Responses API JSON-schema output format
+(text={"format": {"type": "json_schema", "strict": True, ...}}), so the model
+is constrained to the schema while it generates. Every schema is registered
+once in a SchemaRegistry, which:
+- compiles it into a validator (json_stream.compile_schema) that is reused for
+  every response, so checking an output is a single walk over the parsed value
+- derives the schema sent to the API (keywords strict mode doesn't accept,
+  such as maxLength, are only checked locally)
+- counts requests, invalid outputs, local repairs and retries per schema,
+  exported as structured_output_* metrics
+
+Output that is almost JSON (fenced, wrapped in prose, trailing commas, ...)
+is repaired locally (see json_fixups.py) before a retry is considered; every
+repair is a model call saved.
+
+If a model rejects the JSON-schema format, the schema falls back to prompt-only
+requests for that model and the output is still validated.
+
+    schemas.register("support_ticket", TICKET_SCHEMA)
+    result = structured_response("support_ticket", model="gpt-5.2", input=[...])
+    result["value"], result["attempts"], result["repairs"], result["error"]
+"""
+import threading
+
+import openai
+
+import instrumentation
+import llm_client
+from json_fixups import repair_json
+from json_stream import compile_schema, parse_stream
+
+# Validated locally but not accepted by strict JSON-schema mode
+LOCAL_ONLY_KEYWORDS = {"maxLength", "minLength"}
+
+
+def strict_object(properties):
+    """Object schema where every property is required and nothing else is allowed"""
+    return {"type": "object", "properties": properties, "required": list(properties),
+            "additionalProperties": False}
+
+
+def api_schema(schema):
+    """The schema as sent to the API (local-only keywords removed)"""
+    if isinstance(schema, dict):
+        return {key: api_schema(value) for key, value in schema.items() if key not in LOCAL_ONLY_KEYWORDS}
+    if isinstance(schema, list):
+        return [api_schema(value) for value in schema]
+    return schema
+
+
+class SchemaRegistry:
+    """Named schemas with compiled validators and per-schema outcome counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.schemas = {}
+        self.unsupported_models = set()  # models that rejected the JSON-schema format
+
+    def register(self, name, schema, strict=True):
+        """Compile and store a schema (registering the same name again replaces it)"""
+        entry = {
+            "schema": schema,
+            "validator": compile_schema(schema),
+            "format": {"type": "json_schema", "name": name, "schema": api_schema(schema), "strict": strict},
+            "stats": {"requests": 0, "valid": 0, "invalid": 0, "repaired": 0, "retries": 0},
+        }
+        with self._lock:
+            self.schemas[name] = entry
+        return entry["validator"]
+
+    def validator(self, name):
+        return self.schemas[name]["validator"]
+
+    def text_param(self, name, model):
+        """`text` request parameter for a schema, or None if the model can't take it"""
+        if model in self.unsupported_models:
+            return None
+        return {"format": self.schemas[name]["format"]}
+
+    def record(self, name, outcome, value=1):
+        """Count a request / valid / invalid / repaired output / retry for a schema"""
+        with self._lock:
+            self.schemas[name]["stats"][outcome] += value
+
+    def validate_text(self, name, text):
+        """
+        Parse (repairing if needed) and validate a complete output; returns
+        (value, repairs), raises ValueError
+        """
+        value, repairs = repair_json(text)
+        self.validator(name).validate(value)
+        return value, repairs
+
+    def stats(self):
+        """
+        {schema: {"requests", "valid", "invalid", "repaired", "retries", "invalid_rate"}}
+
+        Repaired outputs are counted as valid as well; repaired is the number
+        of retries saved by local repair.
+        """
+        with self._lock:
+            report = {}
+            for name, entry in self.schemas.items():
+                stats = entry["stats"]
+                outputs = stats["valid"] + stats["invalid"]
+                report[name] = dict(stats, invalid_rate=stats["invalid"] / outputs if outputs else 0.0)
+            return report
+
+
+schemas = SchemaRegistry()
+
+
+def _structured_metrics():
+    stats = schemas.stats()
+    if not stats:
+        return []
+    return [
+        ("structured_output_requests_total", "counter", "Structured-output requests by schema",
+         [({"schema": name}, s["requests"]) for name, s in stats.items()]),
+        ("structured_output_results_total", "counter", "Model outputs by schema and validation result",
+         [({"schema": name, "result": result}, s[result]) for name, s in stats.items()
+          for result in ("valid", "invalid")]),
+        ("structured_output_repairs_total", "counter", "Outputs repaired locally instead of re-requested",
+         [({"schema": name}, s["repaired"]) for name, s in stats.items()]),
+        ("structured_output_retries_total", "counter", "Re-requests after an invalid output",
+         [({"schema": name}, s["retries"]) for name, s in stats.items()]),
+        ("structured_output_invalid_rate", "gauge", "Share of outputs that failed validation",
+         [({"schema": name}, s["invalid_rate"]) for name, s in stats.items()]),
+    ]
+
+
+instrumentation.metrics.register_collector(_structured_metrics)
+
+
+def _request(name, params, registry):
+    params = dict(params)
+    params.setdefault("model", llm_client.DEFAULT_MODEL)
+    text = registry.text_param(name, params["model"])
+    if text is not None:
+        params["text"] = text
+    return params
+
+
+def _is_format_rejection(error):
+    return isinstance(error, openai.BadRequestError) and "format" in str(error).lower()
+
+
+def _retry_input(params, output, error):
+    """Conversation for the next attempt: the invalid output plus what was wrong with it"""
+    messages = params["input"] if isinstance(params["input"], list) else [{"role": "user", "content": params["input"]}]
+    return messages + [
+        {"role": "assistant", "content": output},
+        {"role": "user", "content": f"That output is invalid ({error}). Reply with the corrected JSON only."},
+    ]
+
+
+def structured_response(name, registry=None, max_retries=1, **params):
+    """
+    responses.create constrained to a registered schema, validated locally
+
+    Near-valid JSON is repaired locally; an output that is still invalid is
+    re-requested up to max_retries times with the validation error. Returns
+    {"value", "text", "attempts", "repairs", "error", "response"}; value is
+    None (and error set) if every attempt failed.
+    """
+    registry = registry or schemas
+    result = {"value": None, "text": None, "attempts": 0, "repairs": [], "error": None, "response": None}
+    registry.record(name, "requests")
+    request = _request(name, params, registry)
+    while result["attempts"] <= max_retries:
+        if result["attempts"]:
+            registry.record(name, "retries")
+        result["attempts"] += 1
+        try:
+            response = llm_client.create_response(**request)
+        except openai.BadRequestError as e:
+            if not _is_format_rejection(e) or "text" not in request:
+                raise
+            registry.unsupported_models.add(request["model"])
+            request.pop("text")
+            response = llm_client.create_response(**request)
+        result.update(response=response, text=response.output_text)
+        try:
+            value, repairs = registry.validate_text(name, response.output_text)
+        except ValueError as e:
+            registry.record(name, "invalid")
+            result["error"] = e
+            request = dict(request, input=_retry_input(request, response.output_text, e))
+            continue
+        result.update(value=value, repairs=repairs, error=None)
+        registry.record(name, "valid")
+        if repairs:
+            registry.record(name, "repaired")
+        return result
+    return result
+
+
+def structured_stream(name, registry=None, max_retries=1, on_value=None, **params):
+    """
+    Streaming structured_response: each attempt is parsed and validated while
+    it streams (see json_stream.parse_stream) and stopped at the first invalid
+    value. A syntax error doesn't stop the stream; the complete output is
+    repaired locally instead (see json_stream.parse_stream(repair=True)).
+    on_value(path, value) sees completed values of every attempt.
+    Returns {"value", "text", "attempts", "repairs", "error", "aborted"}.
+    """
+    registry = registry or schemas
+    result = {"value": None, "text": None, "attempts": 0, "repairs": [], "error": None, "aborted": False}
+    registry.record(name, "requests")
+    request = _request(name, params, registry)
+    validator = registry.validator(name)
+    while result["attempts"] <= max_retries:
+        if result["attempts"]:
+            registry.record(name, "retries")
+        result["attempts"] += 1
+        try:
+            parsed = parse_stream(llm_client.stream_response(**request), validator, on_value, repair=True)
+        except openai.BadRequestError as e:
+            if not _is_format_rejection(e) or "text" not in request:
+                raise
+            registry.unsupported_models.add(request["model"])
+            request.pop("text")
+            parsed = parse_stream(llm_client.stream_response(**request), validator, on_value, repair=True)
+        result.update(value=parsed["value"], text=parsed["text"], repairs=parsed["repairs"],
+                      error=parsed["error"], aborted=parsed["aborted"])
+        if parsed["error"] is None:
+            registry.record(name, "valid")
+            if parsed["repairs"]:
+                registry.record(name, "repaired")
+            return result
+        registry.record(name, "invalid")
+        request = dict(request, input=_retry_input(request, parsed["text"], parsed["error"]))
+    return result
+
@@ -0,0 +1,326 @@
+"""
+Tool registry and parallel dispatch for ReAct agents
+
+Tools are plain functions registered by name. The registry:
+- describes them for the prompt (name, signature and docstring)
+- parses every `Action: name(arguments)` line of a model turn with one
+  compiled regex, reading the real arguments as Python literals
+- runs all actions of a turn concurrently and formats their results as a
+  single observation message, so one model iteration can do several lookups
+- caches results of tools declared @cacheable(ttl=...) per normalized
+  arguments, with invalidate() for when the data behind them changes
+
+    registry = ToolRegistry.from_object(CustomerServiceTools())
+    calls = registry.parse_actions(assistant_message)
+    observation = registry.format_observations(registry.dispatch(calls))
+"""
+import ast
+import asyncio
+import contextvars
+import inspect
+import json
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+from instrumentation import span
+
+# One action per line: "Action: tool_name(arguments)" (markdown emphasis tolerated)
+ACTION_PATTERN = re.compile(r"^[\s*_`>-]*Action[\s*_`]*:[\s*_`]*(\w+)\s*\((.*)\)[\s*_`.]*$", re.MULTILINE)
+
+
+class ToolCall:
+    """One parsed action: tool name plus positional and keyword arguments"""
+
+    def __init__(self, name, args=(), kwargs=None, text=""):
+        self.name = name
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.text = text
+
+    def __repr__(self):
+        arguments = [repr(arg) for arg in self.args] + [f"{key}={value!r}" for key, value in self.kwargs.items()]
+        return f"{self.name}({', '.join(arguments)})"
+
+    def key(self):
+        """Hashable identity of the call (same tool, same arguments)"""
+        return self.name, json.dumps([self.args, self.kwargs], sort_keys=True, default=str)
+
+
+def _literal(node, source):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        # Bare words such as lookup_order(SM-2026-12345) are taken as strings
+        return ast.get_source_segment(source, node).strip()
+
+
+def parse_arguments(text):
+    """Parse `'a', ["b"], key=1` into (args, kwargs); unparseable text is one string"""
+    text = text.strip()
+    if not text:
+        return (), {}
+    source = f"f({text})"
+    try:
+        call = ast.parse(source, mode="eval").body
+    except SyntaxError:
+        return (text.strip("'\""),), {}
+    args = tuple(_literal(arg, source) for arg in call.args)
+    kwargs = {keyword.arg: _literal(keyword.value, source) for keyword in call.keywords if keyword.arg}
+    return args, kwargs
+
+
+def cacheable(ttl):
+    """Declare a tool's results safe to reuse for `ttl` seconds (per arguments)"""
+    def decorate(function):
+        target = function.__func__ if isinstance(function, staticmethod) else function
+        target.cache_ttl = ttl
+        return function
+    return decorate
+
+
+class ToolCache:
+    """
+    TTL cache of tool results keyed by tool name and normalized arguments
+
+    Results carrying an "error" key are never stored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # tool -> {arguments json: (expires, arguments, result)}
+        self._stats = {}  # tool -> {"hits", "misses", "invalidations"}
+
+    def _count(self, tool, kind, value=1):
+        stats = self._stats.setdefault(tool, {"hits": 0, "misses": 0, "invalidations": 0})
+        stats[kind] += value
+
+    def get(self, tool, arguments):
+        """(True, result) on a fresh hit, else (False, None)"""
+        key = json.dumps(arguments, sort_keys=True, default=str)
+        with self._lock:
+            entry = self._entries.get(tool, {}).get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[tool][key]
+                entry = None
+            self._count(tool, "misses" if entry is None else "hits")
+            return (False, None) if entry is None else (True, entry[2])
+
+    def put(self, tool, arguments, result, ttl):
+        if isinstance(result, dict) and "error" in result:
+            return
+        key = json.dumps(arguments, sort_keys=True, default=str)
+        with self._lock:
+            self._entries.setdefault(tool, {})[key] = (time.monotonic() + ttl, arguments, result)
+
+    def invalidate(self, tool=None, **arguments):
+        """
+        Drop cached results of `tool` (all tools if None) whose arguments match
+        every given value; returns the number of entries dropped
+        """
+        dropped = 0
+        with self._lock:
+            for name in [tool] if tool is not None else list(self._entries):
+                entries = self._entries.get(name, {})
+                stale = [key for key, (_, cached, _) in entries.items()
+                         if all(cached.get(arg) == value for arg, value in arguments.items())]
+                for key in stale:
+                    del entries[key]
+                if stale:
+                    self._count(name, "invalidations", len(stale))
+                dropped += len(stale)
+        return dropped
+
+    def stats(self):
+        """{tool: {"hits", "misses", "invalidations", "entries", "hit_rate"}}"""
+        with self._lock:
+            report = {}
+            for tool, stats in self._stats.items():
+                lookups = stats["hits"] + stats["misses"]
+                report[tool] = dict(stats, entries=len(self._entries.get(tool, {})),
+                                    hit_rate=stats["hits"] / lookups if lookups else 0.0)
+            return report
+
+
+_caches = weakref.WeakSet()
+
+
+def _tool_cache_metrics():
+    stats = {}
+    for cache in list(_caches):
+        for tool, tool_stats in cache.stats().items():
+            totals = stats.setdefault(tool, {"hits": 0, "misses": 0, "invalidations": 0})
+            for kind in totals:
+                totals[kind] += tool_stats[kind]
+    if not stats:
+        return []
+    return [
+        ("tool_cache_lookups_total", "counter", "Tool result cache lookups by result",
+         [({"tool": tool, "result": result}, s[result]) for tool, s in stats.items() for result in ("hits", "misses")]),
+        ("tool_cache_invalidations_total", "counter", "Cached tool results dropped by invalidate()",
+         [({"tool": tool}, s["invalidations"]) for tool, s in stats.items()]),
+        ("tool_cache_hit_rate", "gauge", "Tool result cache hit rate",
+         [({"tool": tool}, s["hits"] / (s["hits"] + s["misses"]) if s["hits"] + s["misses"] else 0.0)
+          for tool, s in stats.items()]),
+    ]
+
+
+instrumentation.metrics.register_collector(_tool_cache_metrics)
+
+
+class ToolRegistry:
+    """
+    Named tools with parsing and concurrent dispatch
+
+    Parameters:
+    - max_workers: Threads used to run sync tools of one turn in parallel
+    - cache: Reuse results of @cacheable tools until their TTL expires
+    """
+
+    def __init__(self, max_workers=8, cache=True):
+        self.tools = {}
+        self.max_workers = max_workers
+        self.cache = ToolCache() if cache else None
+        if self.cache is not None:
+            _caches.add(self.cache)
+        self._pool = None
+
+    @classmethod
+    def from_object(cls, tools, **options):
+        """Register every public function / static method of a class or object"""
+        registry = cls(**options)
+        for name, function in inspect.getmembers(tools, callable):
+            if not name.startswith("_") and not inspect.isclass(function):
+                registry.register(function, name)
+        return registry
+
+    def register(self, function, name=None, description=None, cache_ttl=None):
+        """Add a tool; cache_ttl overrides the TTL declared with @cacheable"""
+        name = name or function.__name__
+        self.tools[name] = {
+            "function": function,
+            "signature": inspect.signature(function),
+            "description": description or (inspect.getdoc(function) or "").split("\n")[0],
+            "cache_ttl": cache_ttl if cache_ttl is not None else getattr(function, "cache_ttl", None),
+        }
+        return function
+
+    def invalidate(self, tool=None, **arguments):
+        """Drop cached results, e.g. invalidate("check_inventory", product_name="Wireless Mouse")"""
+        return self.cache.invalidate(tool, **arguments) if self.cache is not None else 0
+
+    def describe(self):
+        """Tool list for the prompt, e.g. "- lookup_order(order_id): Simulate order lookup" """
+        lines = ["Available Actions:"]
+        for name, tool in self.tools.items():
+            lines.append(f"- {name}{tool['signature']}: {tool['description']}")
+        return "\n".join(lines)
+
+    # ---- Parsing -------------------------------------------------------
+
+    def parse_actions(self, text):
+        """Every `Action: tool(...)` line of a model turn, in order (unknown tools included)"""
+        return [ToolCall(match.group(1), *parse_arguments(match.group(2)), text=match.group(0).strip())
+                for match in ACTION_PATTERN.finditer(text)]
+
+    # ---- Dispatch ------------------------------------------------------
+
+    def _check(self, call):
+        tool = self.tools.get(call.name)
+        if tool is None:
+            return f"Unknown tool {call.name}; available: {', '.join(self.tools)}"
+        try:
+            tool["signature"].bind(*call.args, **call.kwargs)
+        except TypeError as e:
+            return f"Bad arguments for {call.name}{tool['signature']}: {e}"
+        return None
+
+    def _cached(self, call):
+        """(arguments, hit, result) for a cacheable tool; arguments is None otherwise"""
+        tool = self.tools[call.name]
+        if self.cache is None or tool["cache_ttl"] is None:
+            return None, False, None
+        bound = tool["signature"].bind(*call.args, **call.kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        return (arguments,) + self.cache.get(call.name, arguments)
+
+    def call(self, call):
+        """Run one call; errors are returned as {"error": ...} so the model can react"""
+        error = self._check(call)
+        if error:
+            return {"error": error}
+        arguments, hit, result = self._cached(call)
+        with span(f"tool: {call.name}", kind="tool", tool=call.name, cached=hit):
+            if hit:
+                return result
+            try:
+                result = self.tools[call.name]["function"](*call.args, **call.kwargs)
+                if inspect.isawaitable(result):
+                    result = asyncio.run(result)
+            except Exception as e:
+                return {"error": f"{type(e).__name__}: {e}"}
+        if arguments is not None:
+            self.cache.put(call.name, arguments, result, self.tools[call.name]["cache_ttl"])
+        return result
+
+    async def acall(self, call):
+        """Async version of call(); sync tools run in a worker thread"""
+        error = self._check(call)
+        if error:
+            return {"error": error}
+        function = self.tools[call.name]["function"]
+        arguments, hit, result = self._cached(call)
+        with span(f"tool: {call.name}", kind="tool", tool=call.name, cached=hit):
+            if hit:
+                return result
+            try:
+                if inspect.iscoroutinefunction(function):
+                    result = await function(*call.args, **call.kwargs)
+                else:
+                    result = await asyncio.to_thread(function, *call.args, **call.kwargs)
+            except Exception as e:
+                return {"error": f"{type(e).__name__}: {e}"}
+        if arguments is not None:
+            self.cache.put(call.name, arguments, result, self.tools[call.name]["cache_ttl"])
+        return result
+
+    def dispatch(self, calls):
+        """
+        Run the calls of one turn concurrently
+
+        Identical calls run once. Returns [(call, result)] in the order requested.
+        """
+        unique = {}
+        for call in calls:
+            unique.setdefault(call.key(), call)
+        if len(unique) <= 1:
+            results = {key: self.call(call) for key, call in unique.items()}
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+            # Copy the caller's context so tool spans nest under the current iteration
+            futures = {key: self._pool.submit(contextvars.copy_context().run, self.call, call)
+                       for key, call in unique.items()}
+            results = {key: future.result() for key, future in futures.items()}
+        return [(call, results[call.key()]) for call in calls]
+
+    async def adispatch(self, calls):
+        """Async version of dispatch()"""
+        unique = {}
+        for call in calls:
+            unique.setdefault(call.key(), call)
+        values = await asyncio.gather(*(self.acall(call) for call in unique.values()))
+        results = dict(zip(unique, values))
+        return [(call, results[call.key()]) for call in calls]
+
+    @staticmethod
+    def format_observations(results):
+        """All results of a turn as one observation message"""
+        lines = []
+        for call, result in results:
+            lines.append(f"Observation: {call!r} returned:\n{json.dumps(result, indent=2, default=str)}")
+        return "\n\n".join(lines)
@@ -0,0 +1,146 @@
+"""
+Adaptive early-stopping vote engine for self-consistency
+
+Draws samples through sampling.py and counts votes as they land. Only as many
+samples are kept in flight as could still settle the vote (a strict majority
+to start with), and sampling stops as soon as either:
+- the leading answer can no longer be overtaken (or tied) by the samples left, or
+- the Bayesian probability that the leader holds the majority passes a threshold
+
+Requests still in flight are cancelled and the result reports how many calls
+were saved compared with always drawing `max_samples`.
+"""
+from collections import Counter
+from math import comb
+
+import llm_client
+from sampling import asample_concurrently
+
+
+def majority_posterior(leader_votes, other_votes):
+    """
+    P(leader's true vote share > 50%) with a uniform Beta(1, 1) prior
+
+    Uses the Beta/Binomial identity: for Beta(a+1, b+1),
+    P(p > 0.5) = P(Binomial(a + b + 1, 0.5) <= a).
+    """
+    n = leader_votes + other_votes + 1
+    return sum(comb(n, k) for k in range(leader_votes + 1)) / 2 ** n
+
+
+def stop_reason(votes, completed, max_samples, confidence_threshold=None, min_samples=1):
+    """
+    Decide whether more samples can still change the outcome
+
+    Parameters:
+    - votes: Counter of answers so far
+    - completed: Samples finished so far (including ones with no answer)
+    - max_samples: Sampling budget
+    - confidence_threshold: Stop once majority_posterior reaches this (None = off)
+    - min_samples: Never stop on confidence before this many samples
+
+    Returns "decided", "confident" or None (keep sampling, or budget used up).
+    """
+    if not votes or completed >= max_samples:
+        return None
+
+    ranked = votes.most_common(2)
+    leader_votes = ranked[0][1]
+    runner_up_votes = ranked[1][1] if len(ranked) > 1 else 0
+    remaining = max_samples - completed
+
+    if leader_votes - runner_up_votes > remaining:
+        return "decided"
+
+    if confidence_threshold is not None and completed >= min_samples:
+        other_votes = sum(votes.values()) - leader_votes
+        if majority_posterior(leader_votes, other_votes) >= confidence_threshold:
+            return "confident"
+
+    return None
+
+
+def samples_to_settle(votes, completed, max_samples):
+    """
+    Fewest further samples that could make the leader unbeatable
+
+    If the next k samples all agree with the leader, the lead is L + k - R with
+    N - completed - k samples left, so we need k > (N - completed - L + R) / 2.
+    """
+    ranked = votes.most_common(2)
+    leader_votes = ranked[0][1] if ranked else 0
+    runner_up_votes = ranked[1][1] if len(ranked) > 1 else 0
+    return (max_samples - completed - leader_votes + runner_up_votes) // 2 + 1
+
+
+async def aadaptive_vote(params, extract, max_samples, on_vote=None, max_concurrency=None,
+                         confidence_threshold=None, min_samples=3):
+    """
+    Sample until the vote is settled, then cancel the rest
+
+    Parameters:
+    - params: `responses.create` arguments shared by every sample
+    - extract: Function mapping response text to an answer (None = no vote)
+    - max_samples: Maximum samples to draw
+    - on_vote: Called as on_vote(index, answer) as each sample lands
+    - max_concurrency: Upper bound on requests in flight (None = no extra cap).
+      Within it, only samples_to_settle() samples are sent at a time, so a
+      unanimous vote is settled by the first wave and the rest are never sent
+    - confidence_threshold: Also stop once P(leader is the majority) reaches this
+    - min_samples: Minimum samples before the confidence rule may stop sampling
+
+    Returns a dict with the winning answer, the vote Counter, samples used and
+    calls saved (samples never sent or cancelled in flight; the in-flight ones
+    are also counted separately as calls_cancelled).
+    """
+    votes = Counter()
+    completed = 0
+    result = {"stop_reason": "exhausted"}
+
+    def record(index, response):
+        nonlocal completed
+        completed += 1
+        answer = extract(response.output_text)
+        if answer is not None:
+            votes[answer] += 1
+        if on_vote is not None:
+            on_vote(index, answer)
+
+        reason = stop_reason(votes, completed, max_samples, confidence_threshold, min_samples)
+        if reason:
+            result["stop_reason"] = reason
+            return True
+        return False
+
+    stats = {}
+    await asample_concurrently(
+        params,
+        max_samples,
+        on_sample=record,
+        max_concurrency=max_concurrency,
+        stats=stats,
+        wanted=lambda: samples_to_settle(votes, completed, max_samples),
+    )
+
+    answer = votes.most_common(1)[0][0] if votes else None
+    leader_votes = votes[answer] if votes else 0
+    result.update(
+        answer=answer,
+        votes=votes,
+        samples_used=completed,
+        confidence=leader_votes / completed if completed else 0.0,
+        posterior=majority_posterior(leader_votes, sum(votes.values()) - leader_votes),
+        calls_sent=stats["sent"],
+        calls_cancelled=stats["cancelled"],
+        calls_saved=max_samples - stats["completed"],
+        max_samples=max_samples,
+    )
+    return result
+
+
+def adaptive_vote(params, extract, max_samples, on_vote=None, max_concurrency=None,
+                  confidence_threshold=None, min_samples=3):
+    """Sync wrapper around aadaptive_vote (same parameters)"""
+    return llm_client.run_async(aadaptive_vote(
+        params, extract, max_samples, on_vote, max_concurrency, confidence_threshold, min_samples
+    ))